@@ -48,11 +48,24 @@ REST_FRAMEWORK = {
   "DEFAULT_AUTHENTICATION_CLASSES": [
     "rest_framework.authentication.TokenAuthentication",
   ],
+  "DEFAULT_RENDERER_CLASSES": [
+    "tools.Json.FastJSONRenderer",
+    "rest_framework.renderers.BrowsableAPIRenderer",
+  ],
+  "DEFAULT_PARSER_CLASSES": [
+    "tools.Json.FastJSONParser",
+    "rest_framework.parsers.FormParser",
+    "rest_framework.parsers.MultiPartParser",
+  ],
   "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema"
 }
 
 MIDDLEWARE = [
+    "tools.Metrics.MetricsMiddleware",
+    "tools.Profiler.ProfilerMiddleware",
+    "tools.Tracing.TracingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "tools.Compression.ThresholdGZipMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -99,6 +112,73 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Every process keeps its own cache by default. Point these settings at a
+# memcached server to share a single cache between processes, for example
+# "django.core.cache.backends.memcached.PyMemcacheCache" and "memcached:11211".
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND",
+                             "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "reachable"),
+    }
+}
+
+# The maximum number of seconds to keep the public details of a form link.
+FORM_LINK_CACHE_TIMEOUT = int(os.getenv("FORM_LINK_CACHE_TIMEOUT", 300))
+
+# The maximum number of form schemas that every process keeps in memory to
+# validate and label responses.
+FORM_SCHEMA_CACHE_SIZE = int(os.getenv("FORM_SCHEMA_CACHE_SIZE", 1024))
+
+# The number of seconds that browsers and the proxy may use the public details
+# of a form link before they should check if they have changed.
+FORM_LINK_MAX_AGE = int(os.getenv("FORM_LINK_MAX_AGE", 10))
+
+# Older clients expect the details of a form link as a JSON encoded string
+# inside the JSON response. Newer clients accept both.
+FORM_LINK_LEGACY_JSON = os.getenv("FORM_LINK_LEGACY_JSON") == "True"
+
+# The minimum size in bytes of a response before we compress it.
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 1024))
+
+# Serve the public form endpoints with async views. This only helps when the
+# API is served over ASGI, which the production server then does as well.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS") == "True"
+
+# The maximum number of threads per process in which async views talk to the
+# database. Any number of requests can wait for one of them.
+ASYNC_THREADS = int(os.getenv("ASYNC_THREADS", 32))
+
+# The directory to write profiles of requests to. Requests are only profiled
+# when this is set.
+PROFILE_DIRECTORY = os.getenv("PROFILE_DIRECTORY")
+
+# The share of all requests that is profiled, between 0 and 1. Requests with a
+# header that is signed with the secret key are always profiled.
+PROFILE_RATE = float(os.getenv("PROFILE_RATE", 0))
+
+# The number of milliseconds between two samples of a profiled request.
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 5))
+
+# The directory to write traces to. Requests, database commands, templates and
+# emails are only traced when this is set.
+TRACE_DIRECTORY = os.getenv("TRACE_DIRECTORY")
+
+# The name of this service in the traces.
+TRACE_SERVICE = os.getenv("TRACE_SERVICE", "reachable-api")
+
+# The number of days that we keep links after they have expired. Visitors of an
+# expired link are told that it has expired until it is removed.
+LINK_RETENTION = int(os.getenv("LINK_RETENTION", 30))
+
+# The number of days that we keep forms that were never confirmed, together
+# with their links, their inputs and their unverified owner.
+FORM_RETENTION = int(os.getenv("FORM_RETENTION", 30))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -148,13 +228,37 @@ STATIC_ROOT = os.path.join(PROJECT_ROOT, "static")
 # Declare where we"re hosting the static files for this project.
 STATIC_URL = "/api/static/"
 
+# The file in which we remember what the startup steps looked at when they
+# last ran, so that they can be skipped when nothing has changed.
+STARTUP_STATE = os.getenv("STARTUP_STATE",
+                          os.path.join(BASE_DIR, ".startup.json"))
+
 # Email settings.
 # https://docs.djangoproject.com/en/3.2/topics/email/
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = "tools.Smtp.PooledEmailBackend"
 EMAIL_HOST = os.getenv("SMTP_HOST")
-EMAIL_PORT = os.getenv("SMTP_PORT")
+EMAIL_PORT = int(os.getenv("SMTP_PORT", 25))
 EMAIL_USE_SSL = EMAIL_PORT == 465
 EMAIL_USE_TLS = EMAIL_PORT == 587
 EMAIL_HOST_USER = os.getenv("SMTP_USERNAME")
 EMAIL_HOST_PASSWORD = os.getenv("SMTP_PASSWORD")
 DEFAULT_FROM_EMAIL = os.getenv("SMTP_FROM")
+
+# The maximum number of connections we keep open to the mail server per
+# process, and the number of seconds an unused connection is kept alive.
+EMAIL_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+EMAIL_POOL_IDLE = int(os.getenv("SMTP_POOL_IDLE", 60))
+
+# The number of background threads per process that deliver queued emails.
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", 2))
+
+# The number of seconds a worker may hold on to an email in the outbox before
+# another worker is allowed to try to deliver it.
+OUTBOX_LEASE = int(os.getenv("OUTBOX_LEASE", 300))
+
+# The number of times we try to deliver an email before we give up on it.
+OUTBOX_ATTEMPTS = int(os.getenv("OUTBOX_ATTEMPTS", 8))
+
+# The number of seconds to wait before the first retry. Every retry after that
+# waits twice as long as the one before.
+OUTBOX_BACKOFF = int(os.getenv("OUTBOX_BACKOFF", 30))
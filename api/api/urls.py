@@ -18,10 +18,13 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from .views import MetricsView, ReadyView
 
 urlpatterns = [
   path("api/", include("forms.urls"), name="forms"),
   path("api/admin/", admin.site.urls),
+  path("api/ready/", ReadyView.as_view(), name="ready"),
+  path("api/metrics/", MetricsView.as_view(), name="metrics"),
   path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
   path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"),
        name="docs"),
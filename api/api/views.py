@@ -0,0 +1,54 @@
+# Import dependencies.
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import permissions, response, status, views
+from tools.Metrics import exposition
+from tools.Startup import warmup
+from tools.Database import sharedClient
+
+
+class ReadyView(views.APIView):
+    """
+    This is the endpoint that tells if this process is ready to serve
+    requests. It is used to check the health of the API.
+    """
+
+    # Anyone may check if the API is ready, without having to log in.
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        """
+        Check if this process is warmed up and can reach the database.
+        """
+
+        # Make sure that this process has warmed up.
+        if not warmup.warm():
+            return response.Response(False,
+                                     status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # Make sure that the database can still be reached.
+        try:
+            sharedClient.database().command('ping')
+        except Exception:
+            return response.Response(False,
+                                     status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # Let the caller know that we're ready.
+        return response.Response(True)
+
+
+class MetricsView(View):
+    """
+    This is the endpoint that exposes the metrics of all processes to
+    Prometheus. The proxy does not expose it publicly.
+    """
+
+    def get(self, request):
+        """
+        Get the current metrics.
+        """
+
+        # Return the metrics in the format that Prometheus reads.
+        metrics, contentType = exposition()
+        return HttpResponse(metrics, content_type=contentType)
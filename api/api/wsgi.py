@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
 
 application = get_wsgi_application()
+
+# Prepare to serve requests right away. When the application is loaded once
+# and then forked, every forked process warms up again by itself.
+from tools.Startup import warmup
+warmup.warm()
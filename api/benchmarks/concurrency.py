@@ -0,0 +1,231 @@
+"""
+Benchmark that compares the sync and async versions of the public form
+endpoints while many requests are in flight at once. The sync versions are
+served by a fixed number of threads, like a single Gunicorn process, while the
+async versions are served by a single event loop. It creates a set of forms in
+the database that Django is configured to use, and removes them again when
+it's done. Emails are kept in memory instead of being sent.
+
+The database is usually so close that requests hardly wait for it. Use
+--delay to make every lookup of a form link wait a while longer, like it would
+for a busy or remote database.
+
+Run it from the API directory:
+    python -m benchmarks.concurrency
+"""
+
+# Import dependencies.
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import django
+
+# Set up Django before we import anything that needs it.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+django.setup()
+
+# Import the application.
+from django.conf import settings
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment
+from django.urls import path
+from django.utils import timezone
+from forms.models import Form, User
+from forms.provisioning import FormProvisioner
+from forms.repository import formRepository
+from forms.views import (
+    AsyncFormLinkView, AsyncFormResponseView, FormLinkView, FormResponseView
+)
+from tools.Database import database
+from tools.Mail import mailQueue
+
+# Serve both versions of both endpoints side by side.
+urlpatterns = [
+    path("sync/link/<key>", FormLinkView.as_view()),
+    path("sync/response/", FormResponseView.as_view()),
+    path("async/link/<key>", AsyncFormLinkView.as_view()),
+    path("async/response/", AsyncFormResponseView.as_view()),
+]
+
+
+def delayed(method, delay):
+    """
+    Function to make a method of the repository wait before it runs.
+    """
+
+    def wrapper(*args, **kwargs):
+        """
+        Function that waits, then calls the original method.
+        """
+
+        # Wait like we would for a slower database.
+        time.sleep(delay)
+        return method(*args, **kwargs)
+
+    # Return the slower method.
+    return wrapper
+
+
+def workload(endpoint, keys, total):
+    """
+    Function to get the arguments of every request to an endpoint.
+    """
+
+    # Spread the requests over all forms.
+    for index in range(total):
+        key = keys[index % len(keys)]
+
+        # Get the details of a form.
+        if endpoint == 'link':
+            yield 'get', f"/{{}}/link/{key}", {}
+
+        # Or respond to a form.
+        else:
+            yield 'post', "/{}/response/", {
+                'data': {'link': key, 'inputs': {'message': "Benchmark"}},
+                'content_type': 'application/json',
+            }
+
+
+def sync(endpoint, keys, total, threads):
+    """
+    Function to send requests to the sync version of an endpoint from a fixed
+    number of threads. Returns the time every request took in milliseconds,
+    and the total time.
+    """
+
+    # Every thread needs its own client.
+    local = threading.local()
+
+    def send(request):
+        """
+        Function to send a single request and time it.
+        """
+
+        # Get the client for this thread.
+        if not hasattr(local, 'client'):
+            local.client = Client()
+
+        # Send the request.
+        method, url, kwargs = request
+        start = time.perf_counter()
+        result = getattr(local.client, method)(url.format('sync'), **kwargs)
+        assert result.status_code == 200, result.status_code
+        return (time.perf_counter() - start) * 1e3
+
+    # Send all requests.
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        timings = list(executor.map(send, workload(endpoint, keys, total)))
+    return timings, time.perf_counter() - start
+
+
+async def concurrent(endpoint, keys, total, concurrency):
+    """
+    Function to send requests to the async version of an endpoint, with a
+    fixed number of requests in flight at once. Returns the time every request
+    took in milliseconds, and the total time.
+    """
+
+    # Limit the number of requests in flight.
+    slots = asyncio.Semaphore(concurrency)
+    client = AsyncClient()
+
+    async def send(request):
+        """
+        Function to send a single request and time it.
+        """
+
+        # Wait for a free slot, then send the request.
+        async with slots:
+            method, url, kwargs = request
+            start = time.perf_counter()
+            result = await getattr(client, method)(url.format('async'),
+                                                   **kwargs)
+            assert result.status_code == 200, result.status_code
+            return (time.perf_counter() - start) * 1e3
+
+    # Send all requests.
+    start = time.perf_counter()
+    timings = await asyncio.gather(*[send(request) for request
+                                     in workload(endpoint, keys, total)])
+    return timings, time.perf_counter() - start
+
+
+def report(name, timings, elapsed):
+    """
+    Function to print a summary of the timings of a run.
+    """
+
+    # Sort the timings so that we can find the percentiles.
+    timings = sorted(timings)
+    print(f"{name:>14}: {len(timings) / elapsed:8.1f} req/s, "
+          f"mean {statistics.mean(timings):8.1f} ms, "
+          f"p50 {timings[len(timings) // 2]:8.1f} ms, "
+          f"p95 {timings[int(len(timings) * 0.95)]:8.1f} ms, "
+          f"p99 {timings[int(len(timings) * 0.99)]:8.1f} ms")
+
+
+def main():
+    """
+    Function to run the benchmark and report the results.
+    """
+
+    # Allow for tuning the size of the benchmark.
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--forms', type=int, default=20,
+                        help="The number of forms to create.")
+    parser.add_argument('--requests', type=int, default=2000,
+                        help="The number of requests per endpoint.")
+    parser.add_argument('--threads', type=int, default=4,
+                        help="The number of threads serving sync requests.")
+    parser.add_argument('--concurrency', type=int, default=500,
+                        help="The number of async requests in flight.")
+    parser.add_argument('--delay', type=float, default=0,
+                        help="Milliseconds that every lookup waits extra.")
+    options = parser.parse_args()
+
+    # Serve the endpoints from this module, allow the test client, and keep
+    # emails in memory.
+    settings.ROOT_URLCONF = __name__
+    setup_test_environment()
+
+    # Make the lookups slower if we're asked to.
+    if options.delay:
+        for name in ('link', 'form', 'inputs', 'inputTimestamps'):
+            setattr(formRepository, name, delayed(
+                getattr(formRepository, name), options.delay / 1e3))
+
+    # Create confirmed forms for a single owner that we can easily remove
+    # again.
+    owner = f"benchmark-{uuid.uuid4().hex}@example.com"
+    provisioner = FormProvisioner()
+    provisioned = [provisioner.provision(owner, 'Benchmark')
+                   for form in range(options.forms)]
+    Form.objects.filter(pk__in=[item.form.pk for item in provisioned]) \
+                .update(confirmed=timezone.now())
+    keys = [item.link.key for item in provisioned]
+
+    try:
+
+        # Measure both versions of both endpoints on the same forms.
+        for endpoint in ('link', 'response'):
+            report(f"sync {endpoint}",
+                   *sync(endpoint, keys, options.requests, options.threads))
+            report(f"async {endpoint}", *asyncio.run(concurrent(
+                endpoint, keys, options.requests, options.concurrency)))
+
+    # Always remove the forms and their emails again.
+    finally:
+        mailQueue.messages.join()
+        database().forms_outboxmail.delete_many({'recipients': owner})
+        User.objects.filter(email=owner).delete()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+"""
+Benchmark that measures the throughput and latency of the API's endpoints
+under load. It runs the API the same way as in production, against a
+throwaway MongoDB server and a mail server that keeps every email in memory.
+Then it sends a realistic mix of requests from a fixed number of clients at
+once: creating forms, viewing them, confirming them and responding to them.
+
+The results are printed, and written as JSON so that they can be compared with
+the results of another commit.
+
+Run it from the API directory:
+    python -m benchmarks.load --concurrency 1 8 32
+    python -m benchmarks.load --compare benchmarks/results/load-abc1234.json
+"""
+
+# Import dependencies.
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from benchmarks.services import (
+    ApiServer, Mongod, SmtpSink, confirmationKeys
+)
+
+# How often every type of request is sent, relative to each other. Most
+# visitors only look at a form, some respond to it, and only a few create or
+# confirm one.
+MIX = {'link': 60, 'respond': 25, 'create': 10, 'confirm': 5}
+
+
+class Workload:
+    """
+    Class that keeps track of the forms that the clients can use, and that
+    decides which request every client sends next.
+    """
+
+    def __init__(self, sink, mix):
+        """
+        Constructor for the workload. Accepts the mail server that receives
+        the confirmation emails, and how often every type of request is sent.
+        """
+
+        # Remember where the confirmation emails end up.
+        self.sink = sink
+
+        # Remember how often every type of request is sent.
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+
+        # Keep track of the forms that can be viewed, the forms that can be
+        # responded to, and the confirmation links that were not used yet.
+        self.links = []
+        self.confirmed = []
+        self.confirmations = []
+        self.seen = 0
+        self.lock = threading.Lock()
+
+    def collect(self):
+        """
+        Method to pick up the confirmation links from all emails that arrived
+        since we last looked.
+        """
+
+        # Only look at emails that we have not seen yet.
+        messages = self.sink.received()
+        with self.lock:
+            fresh, self.seen = messages[self.seen:], len(messages)
+            self.confirmations += confirmationKeys(fresh)
+
+    def next(self):
+        """
+        Method to decide which request to send next. Returns the type of
+        request and the key of the link to use, if it needs one.
+        """
+
+        # Pick a type of request.
+        name = random.choices(self.names, self.weights)[0]
+
+        with self.lock:
+
+            # Confirm a form if there is one that still needs it.
+            if name == 'confirm' and self.confirmations:
+                return name, self.confirmations.pop()
+
+            # Respond to a form that was confirmed.
+            if name == 'respond' and self.confirmed:
+                return name, random.choice(self.confirmed)
+
+            # View any form.
+            if name == 'link' and self.links:
+                return name, random.choice(self.links)
+
+        # Otherwise, create a new form.
+        return 'create', None
+
+
+class Client:
+    """
+    Class that sends requests to the API over a single connection that is
+    kept alive, and that measures every request.
+    """
+
+    def __init__(self, url, workload):
+        """
+        Constructor for the client. Accepts the URL of the API and the
+        workload to take part in.
+        """
+
+        # Remember where to send requests to.
+        self.url = urlsplit(url)
+        self.workload = workload
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        """
+        Method to send a single request. Returns the response's status, its
+        headers and its content.
+        """
+
+        # Set up a connection if we don't have one.
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.url.hostname, self.url.port, timeout=30)
+
+        # Send the request and read the entire response.
+        headers = {'Content-Type': 'application/json'} if body else {}
+        try:
+            self.connection.request(method, path, body=body and json.dumps(
+                body), headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.headers, response.read()
+
+        # Set up a new connection for the next request if this one failed.
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+    def send(self, name, key):
+        """
+        Method to send a single request of a given type. Returns whether the
+        request succeeded.
+        """
+
+        # Create a new form for a new owner.
+        if name == 'create':
+            status, headers, content = self.request('POST', '/api/forms/', {
+                'email': f"owner-{uuid.uuid4().hex}@example.com",
+                'name': "Load test",
+            })
+            if status == 200:
+                with self.workload.lock:
+                    self.workload.links.append(json.loads(content))
+            return status == 200
+
+        # View a form.
+        if name == 'link':
+            status, headers, content = self.request(
+                'GET', f"/api/forms/link/{key}")
+            return status == 200
+
+        # Confirm a form, which redirects to the form's share page.
+        if name == 'confirm':
+            status, headers, content = self.request(
+                'GET', f"/api/forms/confirm/{key}")
+            if status == 302:
+                with self.workload.lock:
+                    self.workload.confirmed.append(
+                        headers['Location'].rstrip('/').rsplit('/', 1)[1])
+            return status == 302
+
+        # Respond to a form.
+        status, headers, content = self.request('POST', '/api/forms/response/',
+                                                {'link': key, 'inputs': {
+                                                    'message': "Load test"}})
+        return status == 200 and json.loads(content) is True
+
+    def run(self, deadline, results):
+        """
+        Method to keep sending requests until the deadline. Adds the duration
+        of every request, in milliseconds, to the results per type of request.
+        """
+
+        # Keep going until we run out of time.
+        while time.monotonic() < deadline:
+
+            # Decide what to do, and time it.
+            name, key = self.workload.next()
+            start = time.perf_counter()
+            try:
+                success = self.send(name, key)
+            except (OSError, http.client.HTTPException, ValueError):
+                success = False
+            duration = (time.perf_counter() - start) * 1e3
+
+            # Record the result.
+            timings, errors = results.setdefault(name, ([], [0]))
+            timings.append(duration)
+            if not success:
+                errors[0] += 1
+
+
+def percentile(timings, share):
+    """
+    Function to get a percentile from a sorted list of timings.
+    """
+
+    # Use the nearest rank.
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+def summarize(results, elapsed):
+    """
+    Function to summarize the timings of every type of request.
+    """
+
+    # Summarize every type of request.
+    summary = {}
+    for name, (timings, errors) in sorted(results.items()):
+        timings = sorted(timings)
+        summary[name] = {
+            'requests': len(timings),
+            'errors': errors[0],
+            'rps': round(len(timings) / elapsed, 1),
+            'mean': round(statistics.mean(timings), 2),
+            'p50': round(percentile(timings, 0.50), 2),
+            'p95': round(percentile(timings, 0.95), 2),
+            'p99': round(percentile(timings, 0.99), 2),
+        }
+
+    # Return the summary.
+    return summary
+
+
+def level(url, workload, concurrency, duration):
+    """
+    Function to run the workload with a fixed number of clients at once.
+    Returns the summary per type of request.
+    """
+
+    # Every client records its own timings, which we combine afterwards.
+    deadline = time.monotonic() + duration
+    clients = [Client(url, workload) for index in range(concurrency)]
+    results = [{} for client in clients]
+    threads = [threading.Thread(target=client.run, args=(deadline, result))
+               for client, result in zip(clients, results)]
+
+    # Keep picking up confirmation links while the clients are busy.
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        workload.collect()
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - start
+
+    # Combine the timings of all clients.
+    combined = {}
+    for result in results:
+        for name, (timings, errors) in result.items():
+            total = combined.setdefault(name, ([], [0]))
+            total[0].extend(timings)
+            total[1][0] += errors[0]
+
+    # Summarize the timings.
+    return summarize(combined, elapsed)
+
+
+def seed(url, workload, forms):
+    """
+    Function to create and confirm a number of forms before we start
+    measuring, so that every type of request has something to work with.
+    """
+
+    # Create the forms.
+    client = Client(url, workload)
+    for index in range(forms):
+        client.send('create', None)
+
+    # Wait for their confirmation emails, then confirm them.
+    deadline = time.monotonic() + 30
+    while len(workload.confirmations) < forms and \
+            time.monotonic() < deadline:
+        time.sleep(0.1)
+        workload.collect()
+    while workload.confirmations:
+        client.send('confirm', workload.confirmations.pop())
+
+
+def commit():
+    """
+    Function to get the commit that we're measuring.
+    """
+
+    # Ask git, if we can.
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(current, previous):
+    """
+    Function to print how the results changed compared to earlier results.
+    """
+
+    # Compare every level and type of request that both runs measured.
+    print(f"\nCompared with {previous['commit']}:")
+    for concurrency, summary in current['levels'].items():
+        for name, now in summary.items():
+            before = previous['levels'].get(concurrency, {}).get(name)
+            if before is None:
+                continue
+            print(f"{concurrency:>5} {name:>8}: "
+                  f"rps {now['rps'] - before['rps']:+8.1f}, "
+                  f"p50 {now['p50'] - before['p50']:+8.2f} ms, "
+                  f"p99 {now['p99'] - before['p99']:+8.2f} ms")
+
+
+def main():
+    """
+    Function to run the benchmark and report the results.
+    """
+
+    # Allow for tuning the benchmark.
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+',
+                        default=[1, 8, 32],
+                        help="The numbers of clients to run at once.")
+    parser.add_argument('--duration', type=float, default=20,
+                        help="Seconds to measure every level.")
+    parser.add_argument('--forms', type=int, default=20,
+                        help="The number of forms to create up front.")
+    parser.add_argument('--server', choices=['gunicorn', 'runserver'],
+                        default='gunicorn',
+                        help="The server to run the API with.")
+    parser.add_argument('--workers', type=int, default=2,
+                        help="The number of server processes.")
+    parser.add_argument('--mongod', default='mongod',
+                        help="The MongoDB server to start.")
+    parser.add_argument('--database', default=None,
+                        help="Use a running database at host:port instead.")
+    parser.add_argument('--output', default=None,
+                        help="Where to write the results. Defaults to "
+                             "benchmarks/results/load-<commit>.json.")
+    parser.add_argument('--compare', default=None,
+                        help="Earlier results to compare with.")
+    options = parser.parse_args()
+
+    # Start the stand-ins for the database and the mail server.
+    mongod = None
+    if options.database:
+        host, port = options.database.rsplit(':', 1)
+        database = (host, int(port))
+    else:
+        mongod = Mongod(options.mongod)
+        database = mongod.start()
+    sink = SmtpSink()
+    api = ApiServer(database, sink.start(), server=options.server,
+                    workers=options.workers)
+
+    try:
+
+        # Start the API and give it some forms to work with.
+        url = api.start()
+        workload = Workload(sink, MIX)
+        seed(url, workload, options.forms)
+
+        # Measure every level of concurrency.
+        levels = {}
+        for concurrency in options.concurrency:
+            levels[str(concurrency)] = level(url, workload, concurrency,
+                                             options.duration)
+
+            # Report the results of this level.
+            for name, summary in levels[str(concurrency)].items():
+                print(f"{concurrency:>5} {name:>8}: "
+                      f"{summary['rps']:8.1f} req/s, "
+                      f"p50 {summary['p50']:8.2f} ms, "
+                      f"p95 {summary['p95']:8.2f} ms, "
+                      f"p99 {summary['p99']:8.2f} ms, "
+                      f"{summary['errors']} error(s)")
+
+    # Always stop everything that we've started.
+    finally:
+        api.stop()
+        sink.stop()
+        if mongod is not None:
+            mongod.stop()
+
+    # Write the results so that they can be compared later.
+    results = {
+        'commit': commit(),
+        'date': datetime.now(timezone.utc).isoformat(),
+        'options': {'server': options.server, 'workers': options.workers,
+                    'duration': options.duration, 'mix': MIX},
+        'emails': len(sink.received()),
+        'levels': levels,
+    }
+    output = options.output or os.path.join(
+        'benchmarks', 'results', f"load-{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"\nWrote the results to {output}.")
+
+    # Compare with earlier results if we're asked to.
+    if options.compare:
+        with open(options.compare, 'r') as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""
+Benchmark that measures the throughput of the mail pipeline: rendering an
+email, storing it in the outbox and delivering it to the mail server. It sends
+confirmation and response emails to a local mail server that keeps every email
+in memory, and that can be made to greet new connections slowly, accept
+emails slowly, and refuse a share of them.
+
+Every sender configuration runs in its own process, so that its CPU time and
+memory are measured on their own. The pipeline is measured in two modes:
+"queue" delivers every email right away through the background senders, like
+the API does, and "outbox" stores every email first and then delivers them in
+batches, like the send_outbox command does.
+
+Run it from the API directory:
+    python -m benchmarks.mail --workers 1 2 4 --pool 1 4 --handshake 50
+"""
+
+# Import dependencies.
+import argparse
+import itertools
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from benchmarks.services import Mongod, SmtpSink
+
+
+def rss():
+    """
+    Function to get the memory that this process currently uses, in bytes.
+    """
+
+    # Linux tells us the current size of the process.
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    # Elsewhere, we fall back to the largest size so far.
+    except OSError:
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def measure(kind, mode, messages, workers, batch):
+    """
+    Function that runs in the child process. It sends a number of emails of
+    one kind through the pipeline and returns what it measured.
+    """
+
+    # Set up Django before we import anything that needs it.
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+    django.setup()
+
+    # Import the application.
+    from django.utils import timezone
+    from forms.models import Form, OutboxMail, User
+    from forms.provisioning import FormProvisioner
+    from tools.Database import database
+    from tools.Mail import (
+        FormConfirmationMail, FormResponseMail, mailQueue, outbox
+    )
+
+    # Create a confirmed form for an owner that we can easily remove again.
+    owner = f"benchmark-{uuid.uuid4().hex}@example.com"
+    provisioned = FormProvisioner().provision(owner, 'Benchmark')
+    Form.objects.filter(pk=provisioned.form.pk).update(
+        confirmed=timezone.now())
+
+    # Decide how to render the emails of this kind.
+    if kind == 'confirmation':
+        mail = FormConfirmationMail()
+        render = lambda: mail.message(provisioned.user, provisioned.link,
+                                      provisioned.confirmationLink)
+    else:
+        mail = FormResponseMail()
+        render = lambda: mail.message(provisioned.link,
+                                      {'message': "Benchmark"})
+
+    def drain():
+        """
+        Function that runs in every sender thread of the outbox mode. It keeps
+        delivering batches until the outbox is empty.
+        """
+
+        # Stop as soon as there is nothing left to claim.
+        while outbox.drain(batch):
+            pass
+
+    def deliver(count, timings=None):
+        """
+        Function to send a number of emails through the pipeline and wait
+        until all of them were handled.
+        """
+
+        # Render and store every email. Only the queue mode hands them to the
+        # background senders right away.
+        for index in range(count):
+            start = time.perf_counter()
+            message = render()
+            rendered = time.perf_counter()
+            pk = outbox.add(message)
+            stored = time.perf_counter()
+            if mode == 'queue':
+                mailQueue.put(pk)
+
+            # Remember how long every step took, in milliseconds.
+            if timings is not None:
+                timings['render'].append((rendered - start) * 1e3)
+                timings['store'].append((stored - rendered) * 1e3)
+
+        # Wait until the background senders have handled every email.
+        if mode == 'queue':
+            mailQueue.messages.join()
+            return
+
+        # Or deliver the outbox with a number of senders at once.
+        threads = [threading.Thread(target=drain) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    try:
+
+        # Warm up, so that the template is loaded and the connections to the
+        # database and the mail server are set up.
+        deliver(min(10, messages))
+
+        # Measure the pipeline.
+        timings = {'render': [], 'store': []}
+        memory, cpu = rss(), time.process_time()
+        start = time.perf_counter()
+        deliver(messages, timings)
+        elapsed = time.perf_counter() - start
+        cpu, memory = time.process_time() - cpu, rss() - memory
+
+        # Find out what happened to the emails.
+        counts = {status: database().forms_outboxmail.count_documents(
+            {'recipients': owner, 'status': status})
+            for status in (OutboxMail.SENT, OutboxMail.PENDING)}
+
+    # Always remove the form and its emails again.
+    finally:
+        mailQueue.stop()
+        database().forms_outboxmail.delete_many({'recipients': owner})
+        User.objects.filter(email=owner).delete()
+
+    # Report what we measured, leaving the warm up out of the counts.
+    warmup = min(10, messages)
+    return {
+        'messages': messages,
+        'delivered': counts[OutboxMail.SENT] - warmup,
+        'retrying': counts[OutboxMail.PENDING],
+        'elapsed': round(elapsed, 3),
+        'rate': round(messages / elapsed, 1),
+        'render': round(statistics.mean(timings['render']), 3),
+        'store': round(statistics.mean(timings['store']), 3),
+        'cpu': round(cpu / messages * 1e3, 3),
+        'memory': round(memory / 1024),
+    }
+
+
+def environment(database, smtp, workers, pool):
+    """
+    Function to get the environment variables to run a sender configuration
+    with.
+    """
+
+    # Start from our own environment, and point the API to the stand-ins.
+    environment = dict(os.environ)
+    environment.update({
+        'CLIENT_URL': "http://client.invalid/",
+        'API_URL': "http://api.invalid/api/",
+        'DATABASE_HOST': database[0],
+        'DATABASE_PORT': str(database[1]),
+        'DATABASE_NAME': 'benchmark',
+        'SMTP_HOST': smtp[0],
+        'SMTP_PORT': str(smtp[1]),
+        'SMTP_FROM': 'benchmark@example.com',
+        'SMTP_POOL_SIZE': str(pool),
+        'MAIL_WORKERS': str(workers),
+        'DEBUG': 'False',
+        'SECRET': 'benchmark',
+    })
+    return environment
+
+
+def run(configuration, database, smtp):
+    """
+    Function to run a single sender configuration in its own process. Returns
+    what it measured.
+    """
+
+    # Let the child process do the work, and read its results.
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.mail', '--child',
+         json.dumps(configuration)],
+        env=environment(database, smtp, configuration['workers'],
+                        configuration['pool']),
+        capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    """
+    Function to run the benchmark and report the results.
+    """
+
+    # Allow for tuning the benchmark.
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--messages', type=int, default=500,
+                        help="The number of emails per configuration.")
+    parser.add_argument('--kinds', nargs='+',
+                        choices=['confirmation', 'response'],
+                        default=['confirmation', 'response'],
+                        help="The kinds of emails to send.")
+    parser.add_argument('--modes', nargs='+', choices=['queue', 'outbox'],
+                        default=['queue', 'outbox'],
+                        help="How to deliver the emails.")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4],
+                        help="The numbers of sender threads.")
+    parser.add_argument('--pool', type=int, nargs='+', default=[4],
+                        help="The sizes of the connection pool.")
+    parser.add_argument('--batch', type=int, default=100,
+                        help="The number of emails claimed at once by the "
+                             "outbox mode.")
+    parser.add_argument('--handshake', type=float, default=0,
+                        help="Milliseconds before a new connection is "
+                             "greeted.")
+    parser.add_argument('--delay', type=float, default=0,
+                        help="Milliseconds it takes to accept an email.")
+    parser.add_argument('--failures', type=float, default=0,
+                        help="The share of emails that is refused.")
+    parser.add_argument('--mongod', default='mongod',
+                        help="The MongoDB server to start.")
+    parser.add_argument('--database', default=None,
+                        help="Use a running database at host:port instead.")
+    parser.add_argument('--output', default=None,
+                        help="Where to write the results as JSON.")
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    # When we are the child process, we only measure a single configuration.
+    if options.child:
+        configuration = json.loads(options.child)
+        print(json.dumps(measure(
+            configuration['kind'], configuration['mode'],
+            configuration['messages'], configuration['workers'],
+            configuration['batch'])))
+        return
+
+    # Start the stand-ins for the database and the mail server.
+    mongod = None
+    if options.database:
+        host, port = options.database.rsplit(':', 1)
+        database = (host, int(port))
+    else:
+        mongod = Mongod(options.mongod)
+        database = mongod.start()
+    sink = SmtpSink(handshake=options.handshake / 1e3,
+                    delay=options.delay / 1e3, failures=options.failures)
+    smtp = sink.start()
+
+    # Keep the state of the startup steps separate from any other.
+    state = tempfile.mkdtemp(prefix='reachable-mail-')
+    results = []
+    try:
+
+        # Prepare the database, just like we do in production.
+        subprocess.run([sys.executable, 'manage.py', 'startup'],
+                       env={**environment(database, smtp, 1, 1),
+                            'STARTUP_STATE': os.path.join(state,
+                                                          'startup.json')},
+                       check=True, stdout=subprocess.DEVNULL)
+
+        # Measure every combination of settings.
+        for kind, mode, workers, pool in itertools.product(
+                options.kinds, options.modes, options.workers, options.pool):
+            configuration = {
+                'kind': kind, 'mode': mode, 'workers': workers, 'pool': pool,
+                'batch': options.batch, 'messages': options.messages,
+            }
+
+            # Count the connections that this configuration sets up.
+            connections = sink.connections
+            result = run(configuration, database, smtp)
+            result['connections'] = sink.connections - connections
+            results.append({**configuration, **result})
+
+            # Report the results of this configuration.
+            print(f"{kind:>12} {mode:>6} workers {workers:>2} pool {pool:>2}: "
+                  f"{result['rate']:8.1f} msg/s, "
+                  f"render {result['render']:6.2f} ms, "
+                  f"store {result['store']:6.2f} ms, "
+                  f"cpu {result['cpu']:6.2f} ms/msg, "
+                  f"memory {result['memory']:+6d} KiB, "
+                  f"{result['connections']} connection(s), "
+                  f"{result['retrying']} retrying")
+
+    # Always stop everything that we've started.
+    finally:
+        shutil.rmtree(state, ignore_errors=True)
+        sink.stop()
+        if mongod is not None:
+            mongod.stop()
+
+    # Write the results if we're asked to.
+    if options.output:
+        with open(options.output, 'w') as file:
+            json.dump({'handshake': options.handshake, 'delay': options.delay,
+                       'failures': options.failures, 'results': results},
+                      file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
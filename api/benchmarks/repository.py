@@ -0,0 +1,107 @@
+"""
+Benchmark that compares reading a form link, its form and its inputs through
+Djongo with reading them straight from the database. It creates a set of
+forms in the database that Django is configured to use, and removes them
+again when it's done.
+
+Run it from the API directory:
+    python -m benchmarks.repository
+"""
+
+# Import dependencies.
+import argparse
+import os
+import statistics
+import time
+import uuid
+import django
+
+# Set up Django before we import anything that needs it.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+django.setup()
+
+# Import the application.
+from forms.models import FormLink, User
+from forms.provisioning import FormProvisioner
+from forms.repository import formRepository
+
+
+def orm(key):
+    """
+    Function to read a form link, its form and its inputs through Djongo.
+    """
+
+    # Get the link, its form and the form's inputs.
+    link = FormLink.objects.get(key=key)
+    form = link.form
+    return form.confirmed, form.disabled, list(form.inputs.all())
+
+
+def direct(key):
+    """
+    Function to read a form link, its form and its inputs straight from the
+    database.
+    """
+
+    # Get the link, its form and the form's inputs.
+    link = formRepository.link(key, FormLink.linkType)
+    form = formRepository.form(link.form)
+    return form.confirmed, form.disabled, formRepository.inputs(link.form)
+
+
+def measure(lookup, keys, rounds):
+    """
+    Function to measure the time that every lookup takes, in microseconds.
+    """
+
+    # Time every single lookup.
+    timings = []
+    for round in range(rounds):
+        for key in keys:
+            start = time.perf_counter()
+            lookup(key)
+            timings.append((time.perf_counter() - start) * 1e6)
+
+    # Return all timings.
+    return timings
+
+
+def main():
+    """
+    Function to run the benchmark and report the results.
+    """
+
+    # Allow for tuning the size of the benchmark.
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--forms', type=int, default=100,
+                        help="The number of forms to create.")
+    parser.add_argument('--rounds', type=int, default=5,
+                        help="The number of times to read every form.")
+    options = parser.parse_args()
+
+    # Create the forms for a single owner that we can easily remove again.
+    owner = f"benchmark-{uuid.uuid4().hex}@example.com"
+    provisioner = FormProvisioner()
+    keys = [provisioner.provision(owner, 'Benchmark').link.key
+            for form in range(options.forms)]
+
+    try:
+
+        # Make sure that both paths are connected before we measure.
+        orm(keys[0])
+        direct(keys[0])
+
+        # Measure both paths on the same forms.
+        for name, lookup in [('djongo', orm), ('direct', direct)]:
+            timings = sorted(measure(lookup, keys, options.rounds))
+            print(f"{name:>8}: mean {statistics.mean(timings):8.1f} us, "
+                  f"p50 {timings[len(timings) // 2]:8.1f} us, "
+                  f"p95 {timings[int(len(timings) * 0.95)]:8.1f} us")
+
+    # Always remove the forms again.
+    finally:
+        User.objects.filter(email=owner).delete()
+
+
+if __name__ == '__main__':
+    main()
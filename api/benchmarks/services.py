@@ -0,0 +1,398 @@
+"""
+Stand-ins for the services that the API depends on, so that benchmarks can
+run the API without touching a real database or a real mail server.
+"""
+
+# Import dependencies.
+import asyncio
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+
+def freePort():
+    """
+    Function to find a port on this machine that nothing is listening on.
+    """
+
+    # Let the operating system pick a port for us.
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def waitFor(check, timeout, what):
+    """
+    Function to wait until a check succeeds. Raises a RuntimeError if it does
+    not succeed in time.
+    """
+
+    # Keep checking until we run out of time.
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+
+    # Let the caller know that we gave up.
+    raise RuntimeError(f"{what} did not start within {timeout} seconds.")
+
+
+class Mongod:
+    """
+    Class to run a throwaway MongoDB server. Its data lives in a temporary
+    directory that is removed when the server stops.
+    """
+
+    def __init__(self, binary='mongod'):
+        """
+        Constructor for the server. Accepts the path to the MongoDB server.
+        """
+
+        # Remember how to start the server.
+        self.binary = binary
+        self.process = None
+
+    def start(self):
+        """
+        Method to start the server. Returns its host and port.
+        """
+
+        # Make sure that we can find the server.
+        if shutil.which(self.binary) is None:
+            raise RuntimeError(f"Cannot find '{self.binary}'. Install MongoDB "
+                               "or point to an existing database instead.")
+
+        # Keep the data in a fresh directory, and keep the cache small as we
+        # only store a little data.
+        self.directory = tempfile.mkdtemp(prefix='reachable-mongod-')
+        self.port = freePort()
+        self.process = subprocess.Popen([
+            self.binary, '--bind_ip', '127.0.0.1', '--port', str(self.port),
+            '--dbpath', self.directory, '--nounixsocket', '--quiet',
+            '--wiredTigerCacheSizeGB', '0.25',
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        # Wait until the server accepts connections.
+        waitFor(lambda: socket.create_connection(('127.0.0.1', self.port),
+                                                 timeout=1).close() is None,
+                30, "MongoDB")
+
+        # Let the caller know where to find the server.
+        return '127.0.0.1', self.port
+
+    def stop(self):
+        """
+        Method to stop the server and remove its data.
+        """
+
+        # Stop the server if it is running.
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(30)
+            self.process = None
+
+        # Remove the data.
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class SmtpSink:
+    """
+    Class to run a mail server that accepts every email and keeps it in
+    memory. It can make new connections, every command and every email wait a
+    while, and fail a share of all emails, to act like a slow or unreliable
+    mail server.
+    """
+
+    def __init__(self, latency=0, failures=0, disconnects=0, handshake=0,
+                 delay=0):
+        """
+        Constructor for the sink. Accepts the number of seconds that every
+        command waits, the share of emails that are refused with a temporary
+        error, the share of emails after which the connection is dropped, the
+        number of seconds before a new connection is greeted, and the number
+        of seconds it takes to accept an email.
+        """
+
+        # Remember how the sink should behave.
+        self.latency = latency
+        self.handshake = handshake
+        self.delay = delay
+        self.failures = failures
+        self.disconnects = disconnects
+
+        # Keep every email that we receive, with a lock as the sink runs in its
+        # own thread.
+        self.messages = []
+        self.lock = threading.Lock()
+
+        # Keep count of what happened.
+        self.connections = 0
+        self.refused = 0
+        self.dropped = 0
+
+    def start(self):
+        """
+        Method to start the sink in a background thread. Returns its host and
+        port.
+        """
+
+        # Run the sink in its own event loop.
+        self.port = freePort()
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            """
+            Function that runs the event loop of the sink.
+            """
+
+            # Start listening, then keep serving until we're stopped.
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(asyncio.start_server(
+                self.session, '127.0.0.1', self.port))
+            started.set()
+            self.loop.run_forever()
+
+        # Start the thread and wait until the sink listens.
+        self.thread = threading.Thread(target=run, name='smtp-sink',
+                                       daemon=True)
+        self.thread.start()
+        started.wait(10)
+
+        # Let the caller know where to find the sink.
+        return '127.0.0.1', self.port
+
+    def stop(self):
+        """
+        Method to stop the sink.
+        """
+
+        # Stop the event loop from its own thread.
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+
+    def received(self):
+        """
+        Method to get a copy of all emails that were received so far.
+        """
+
+        # Copy the list while no one is adding to it.
+        with self.lock:
+            return list(self.messages)
+
+    async def reply(self, writer, line):
+        """
+        Method to send a reply to the client, after the configured latency.
+        """
+
+        # Act like a slow server if we should.
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        # Send the reply.
+        writer.write(line.encode() + b'\r\n')
+        await writer.drain()
+
+    async def session(self, reader, writer):
+        """
+        Method to handle a single connection from a client.
+        """
+
+        # Greet the client, after a while if we should.
+        self.connections += 1
+        if self.handshake:
+            await asyncio.sleep(self.handshake)
+        await self.reply(writer, "220 sink ESMTP")
+
+        # Keep track of the email that is being sent.
+        recipients, data = [], None
+
+        # Handle every command until the client quits.
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+
+                # Collect the content of the email until its last line.
+                if data is not None:
+                    if line == b'.\r\n':
+                        await self.deliver(writer, recipients, b''.join(data))
+                        recipients, data = [], None
+                    else:
+                        data.append(line[1:] if line.startswith(b'..')
+                                    else line)
+                    continue
+
+                # Handle a command.
+                command = line.decode(errors='replace').strip()
+                verb = command[:4].upper()
+                if verb == 'EHLO':
+                    await self.reply(writer, "250-sink\r\n250 8BITMIME")
+                elif verb == 'RCPT':
+                    recipients.append(command.partition(':')[2].strip('<> '))
+                    await self.reply(writer, "250 OK")
+                elif verb == 'DATA':
+                    data = []
+                    await self.reply(writer, "354 End data with <CR><LF>."
+                                             "<CR><LF>")
+                elif verb == 'QUIT':
+                    await self.reply(writer, "221 Bye")
+                    return
+                elif verb == 'RSET':
+                    recipients, data = [], None
+                    await self.reply(writer, "250 OK")
+                else:
+                    await self.reply(writer, "250 OK")
+
+        # Drop the connection when we're asked to.
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    async def deliver(self, writer, recipients, data):
+        """
+        Method to accept or refuse a single email.
+        """
+
+        # Drop the connection for some emails, without accepting them.
+        if random.random() < self.disconnects:
+            self.dropped += 1
+            raise ConnectionResetError("Dropped by the sink.")
+
+        # Refuse some emails with a temporary error.
+        if random.random() < self.failures:
+            self.refused += 1
+            await self.reply(writer, "451 Try again later")
+            return
+
+        # Accept all other emails, after a while if we should.
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        with self.lock:
+            self.messages.append((recipients, data.decode(errors='replace')))
+        await self.reply(writer, "250 OK")
+
+
+class ApiServer:
+    """
+    Class to run the API in its own processes, just like it runs in
+    production, against the given database and mail server.
+    """
+
+    def __init__(self, database, smtp, server='gunicorn', workers=2,
+                 environment=None):
+        """
+        Constructor for the API server. Accepts the host and port of the
+        database and of the mail server, the server to run the API with, the
+        number of worker processes, and any extra environment variables.
+        """
+
+        # Remember how to run the API.
+        self.database = database
+        self.smtp = smtp
+        self.server = server
+        self.workers = workers
+        self.extra = environment or {}
+        self.process = None
+
+    def environment(self):
+        """
+        Method to get the environment variables to run the API with.
+        """
+
+        # Keep the state of this run separate from any other.
+        self.directory = tempfile.mkdtemp(prefix='reachable-api-')
+
+        # Start from our own environment, and point the API to the stand-ins.
+        environment = dict(os.environ)
+        environment.update({
+            'API_URL': f"http://127.0.0.1:{self.port}/api/",
+            'CLIENT_URL': "http://client.invalid/",
+            'DATABASE_HOST': self.database[0],
+            'DATABASE_PORT': str(self.database[1]),
+            'DATABASE_NAME': 'benchmark',
+            'SMTP_HOST': self.smtp[0],
+            'SMTP_PORT': str(self.smtp[1]),
+            'SMTP_FROM': 'benchmark@example.com',
+            'DEBUG': 'False',
+            'SECRET': 'benchmark',
+            'STARTUP_STATE': os.path.join(self.directory, 'startup.json'),
+            'PROMETHEUS_MULTIPROC_DIR': os.path.join(self.directory,
+                                                     'metrics'),
+            'GUNICORN_BIND': f"127.0.0.1:{self.port}",
+            'GUNICORN_WORKERS': str(self.workers),
+        })
+        environment.update(self.extra)
+
+        # Make sure that the directory for the metrics exists.
+        os.makedirs(environment['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+        return environment
+
+    def start(self):
+        """
+        Method to prepare and start the API. Returns the URL of the API.
+        """
+
+        # Prepare the database, just like we do in production.
+        self.port = freePort()
+        environment = self.environment()
+        subprocess.run([sys.executable, 'manage.py', 'startup'],
+                       env=environment, check=True,
+                       stdout=subprocess.DEVNULL)
+
+        # Start the server.
+        if self.server == 'gunicorn':
+            command = ['gunicorn', 'api.wsgi:application']
+        else:
+            command = [sys.executable, 'manage.py', 'runserver', '--noreload',
+                       f"127.0.0.1:{self.port}"]
+        self.process = subprocess.Popen(command, env=environment,
+                                        stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL)
+
+        # Wait until every process is ready.
+        url = f"http://127.0.0.1:{self.port}"
+        waitFor(lambda: urllib.request.urlopen(f"{url}/api/ready/",
+                                               timeout=1).status == 200,
+                60, "The API")
+
+        # Let the caller know where to find the API.
+        return url
+
+    def stop(self):
+        """
+        Method to stop the API.
+        """
+
+        # Stop the server if it is running.
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(30)
+            self.process = None
+
+        # Remove the state of this run.
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def confirmationKeys(messages):
+    """
+    Function to find the keys of all confirmation links in a list of emails.
+    """
+
+    # Every confirmation email links to the confirmation endpoint.
+    return re.findall(r'forms/confirm/([\w-]+)',
+                      '\n'.join(text for recipients, text in messages))
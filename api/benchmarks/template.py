@@ -0,0 +1,110 @@
+"""
+Micro-benchmark that compares the precompiled transactional template with the
+previous implementation, which ran a separate regular expression over the
+entire template for every placeholder.
+
+Run it from the API directory:
+    python -m benchmarks.template
+"""
+
+# Import dependencies.
+import argparse
+import os
+import re
+import timeit
+import tracemalloc
+import django
+
+# Set up Django before we import anything that needs it.
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api.settings')
+django.setup()
+
+# Import the application.
+from tools.Template import TransactionalTemplate
+
+# The content of a typical response email.
+REPLACEMENTS = {
+    'preheader': "You just received a new response for your 'Form' form!",
+    'title_text': "Hey there, form builder!",
+    'title_link': "https://reachable.joelbosch.nl/",
+    'content': "You just received a new response for your 'Form' form:"
+               "<br/><br/><i>Message</i><br/>" + "Hello there! " * 20,
+    'button_text': "TRY CUSTOM FORM",
+    'button_link': "https://reachable.joelbosch.nl/form/custom",
+    'disable_link': "https://reachable.joelbosch.nl/api/forms/disable/key",
+    'home_link': "https://reachable.joelbosch.nl/",
+}
+
+
+def legacy(replacements):
+    """
+    Function that renders the template like we used to: one case insensitive
+    regular expression per placeholder, each scanning and copying the template.
+    """
+
+    # Start from the raw template.
+    html = TransactionalTemplate.html
+
+    # Replace the placeholders one by one.
+    for placeholder, replacement in replacements.items():
+        html = re.sub(rf'{{{{{placeholder}}}}}', replacement, html,
+                      flags=re.IGNORECASE)
+
+    # Return the rendered template.
+    return html
+
+
+def compiled(replacements):
+    """
+    Function that renders the template with the precompiled template.
+    """
+
+    # Render the template in a single pass.
+    template = TransactionalTemplate()
+    template.replaceAll(replacements)
+    return template.html
+
+
+def allocated(render, replacements):
+    """
+    Function to measure the peak number of bytes allocated by a single render.
+    """
+
+    # Measure the allocation peak of a single render.
+    tracemalloc.start()
+    render(replacements)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Return the peak in bytes.
+    return peak
+
+
+def main():
+    """
+    Function to run the benchmark and report the results.
+    """
+
+    # Allow for tuning the number of renders.
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=10000,
+                        help="The number of renders per measurement.")
+    options = parser.parse_args()
+
+    # Make sure that both implementations produce the same email.
+    assert legacy(REPLACEMENTS) == compiled(REPLACEMENTS)
+
+    # Measure both implementations.
+    for name, render in [('legacy', legacy), ('compiled', compiled)]:
+
+        # Take the best of a few runs to reduce noise.
+        seconds = min(timeit.repeat(lambda: render(REPLACEMENTS),
+                                    number=options.number, repeat=5))
+
+        # Report the time and memory needed per email.
+        print(f"{name:>10}: {seconds / options.number * 1e6:8.2f} us/email, "
+              f"{allocated(render, REPLACEMENTS) / 1024:8.1f} KiB peak/email")
+
+
+if __name__ == '__main__':
+    main()
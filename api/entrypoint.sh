@@ -1,18 +1,30 @@
 #!/bin/bash
 # This file is used to start up the Django server.
 
-# Collect static files.
-echo "Collecting static files..."
-python manage.py collectstatic --noinput
+# Collect static files, apply migrations and check the database indexes. Every
+# step is skipped when nothing has changed since the last start.
+echo "Preparing to start..."
+python manage.py startup || exit 1
 
-# Create database migrations.
-echo "Creating database migrations..."
-python manage.py makemigrations
+# In development, use Django's own server, which reloads whenever the code
+# changes.
+if [ "$DEBUG" = "True" ]; then
+  echo "Starting Django development server..."
+  exec python manage.py runserver 0.0.0.0:3000
+fi
 
-# Apply database migrations.
-echo "Applying database migrations..."
-python manage.py migrate
+# Otherwise, use the application server with the settings in gunicorn.conf.py.
+# It replaces this script, so that it receives all signals. Send it SIGHUP to
+# gracefully replace all of its processes. Async views are served over ASGI.
+echo "Starting Gunicorn server..."
 
-# Start the server.
-echo "Starting Django server..."
-python manage.py runserver 0.0.0.0:3000
+# Every process writes its metrics to this directory, so that they can be
+# combined. Metrics from a previous run should not be counted.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/metrics}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+if [ "$ASYNC_VIEWS" = "True" ]; then
+  exec gunicorn api.asgi:application
+fi
+exec gunicorn api.wsgi:application
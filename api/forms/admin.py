@@ -1,8 +1,8 @@
 from django.contrib import admin
 
 # Get the models definitions.
-from .models import User, Form, Link, Input
-models = [User, Form, Link, Input]
+from .models import User, Form, Link, Input, OutboxMail
+models = [User, Form, Link, Input, OutboxMail]
 
 # Register your models here.
 admin.site.register(models)
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class FormsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'forms'
+
+    def ready(self):
+        """
+        Connect the signal handlers once all models are loaded.
+        """
+
+        # Importing the signals connects them.
+        from . import signals
+
+        # Start measuring and tracing database commands before any connection
+        # is made.
+        import tools.Metrics
+        import tools.Tracing
@@ -0,0 +1,84 @@
+# Import dependencies.
+from django.conf import settings
+from django.core.cache import cache
+from tools.Metrics import formLinkCacheResults
+
+
+class FormLinkCache:
+    """
+    Read-through cache for the public details of form links. Every visitor of
+    a shared form asks for these details, while they only change when the form
+    or its inputs change. The cache is cleared by signals whenever that
+    happens.
+    """
+
+    def __init__(self, timeout=300):
+        """
+        Constructor for the cache. Accepts the maximum number of seconds to
+        keep the details of a form link.
+        """
+
+        # Remember how long we may keep details.
+        self.timeout = timeout
+
+    def cacheKey(self, key):
+        """
+        Method to get the cache key for the details of a form link.
+        """
+
+        # Use a prefix to avoid clashes with anything else in the cache.
+        return f"formlink:{key}"
+
+    def get(self, key, build, version=None):
+        """
+        Method to get the details of a form link. Accepts the link's key and a
+        function that builds the details if they are not in the cache. That
+        function should return a dictionary with the link's expire date and
+        its payload, or None if the link does not exist. Optionally accepts the
+        version of the details that we expect, in which case any other version
+        in the cache is ignored. Returns the details and whether they came from
+        the cache.
+        """
+
+        # Try to get the details from the cache.
+        entry = cache.get(self.cacheKey(key))
+
+        # Ignore outdated details. This can happen when another process changed
+        # the form, and this process has its own cache.
+        if entry is not None and version is not None \
+                and entry.get('version') != version:
+            entry = None
+
+        # Keep count of how often the cache could be used, so that we can
+        # verify that it actually helps.
+        formLinkCacheResults.labels('miss' if entry is None else 'hit').inc()
+
+        # Use the cached details if we have them.
+        if entry is not None:
+            return entry, True
+
+        # Otherwise, build the details.
+        entry = build(key)
+
+        # Remember which version of the details we've built.
+        if entry is not None:
+            entry['version'] = version
+
+        # Store the details for the next visitor.
+        if entry is not None:
+            cache.set(self.cacheKey(key), entry, self.timeout)
+
+        # Return the fresh details.
+        return entry, False
+
+    def invalidate(self, keys):
+        """
+        Method to remove the details of a list of form links from the cache.
+        """
+
+        # Remove all of them at once.
+        cache.delete_many([self.cacheKey(key) for key in keys])
+
+
+# Create a single cache that is shared by all views in this process.
+formLinkCache = FormLinkCache(timeout=settings.FORM_LINK_CACHE_TIMEOUT)
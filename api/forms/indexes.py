@@ -0,0 +1,105 @@
+# Import dependencies.
+from bson import ObjectId
+from django.conf import settings
+from django.utils import timezone
+from pymongo import ASCENDING, DESCENDING
+from .models import Form, Input, Link, OutboxMail, User
+
+# The indexes that our queries need, per collection. Every index is described
+# by its fields and the options to create it with. Djongo creates some of
+# these itself, possibly under another name, so indexes are matched by their
+# fields rather than by their names.
+INDEXES = {
+    Link._meta.db_table: [
+
+        # Links are found by their key.
+        ([('key', ASCENDING)], {'unique': True}),
+
+        # Form links are found by their form.
+        ([('form_id', ASCENDING)], {}),
+
+        # Confirmation and disable links are found by their form link, and
+        # the disable link that stays valid the longest is used.
+        ([('formLink_id', ASCENDING), ('type', ASCENDING),
+          ('expires', DESCENDING)], {}),
+
+        # The database removes links by itself once they have expired long
+        # enough ago.
+        ([('expires', ASCENDING)], {
+            'expireAfterSeconds': settings.LINK_RETENTION * 24 * 60 * 60,
+        }),
+    ],
+    Form._meta.db_table: [
+
+        # Form names are unique per user, and are looked up per user.
+        ([('user_id', ASCENDING), ('name', ASCENDING)], {'unique': True}),
+
+        # Forms that were never confirmed are removed after a while.
+        ([('confirmed', ASCENDING), ('created', ASCENDING)], {}),
+    ],
+    Input._meta.db_table: [
+
+        # Input names are unique per form, and inputs are found by their form.
+        ([('form_id', ASCENDING), ('name', ASCENDING)], {'unique': True}),
+    ],
+    User._meta.db_table: [
+
+        # Users are identified by their email address.
+        ([('email', ASCENDING)], {'unique': True}),
+    ],
+    OutboxMail._meta.db_table: [
+
+        # Workers claim emails that are ready to be delivered.
+        ([('status', ASCENDING), ('available', ASCENDING)], {}),
+
+        # Workers claim emails whose claim has run out. Only emails that are
+        # being delivered have a claim.
+        ([('leased', ASCENDING)], {
+            'partialFilterExpression': {'status': OutboxMail.SENDING},
+        }),
+
+        # Delivered emails are removed after a week.
+        ([('sent', ASCENDING)], {'expireAfterSeconds': 7 * 24 * 60 * 60}),
+    ],
+}
+
+
+def queries():
+    """
+    Function to get the queries that our views run on every request. Every
+    query is described by a name, the collection it runs on, its filter and
+    how it is sorted.
+    """
+
+    # Use sample values. The query planner does not depend on them.
+    key, pk, now = 'fexample', ObjectId(), timezone.now()
+
+    # Return all queries.
+    return [
+        ("link by key", Link._meta.db_table,
+         {'key': key, 'type': 'form'}, None),
+        ("links by form", Link._meta.db_table,
+         {'form_id': pk, 'type': 'form'}, None),
+        ("disable link by form link", Link._meta.db_table,
+         {'formLink_id': pk, 'type': 'disable', 'expires': {'$gt': now}},
+         [('expires', DESCENDING)]),
+        ("form by id", Form._meta.db_table,
+         {'_id': pk}, None),
+        ("form names by user", Form._meta.db_table,
+         {'user_id': pk, 'name': {'$regex': '^Form'}}, None),
+        ("abandoned forms", Form._meta.db_table,
+         {'confirmed': None, 'created': {'$lt': now}}, None),
+        ("expired links", Link._meta.db_table,
+         {'expires': {'$lt': now}}, None),
+        ("inputs by form", Input._meta.db_table,
+         {'form_id': pk}, None),
+        ("input by name", Input._meta.db_table,
+         {'form_id': pk, 'name': 'message'}, None),
+        ("user by email", User._meta.db_table,
+         {'email': 'owner@example.com'}, None),
+        ("outbox claim", OutboxMail._meta.db_table,
+         {'$or': [
+             {'status': OutboxMail.PENDING, 'available': {'$lte': now}},
+             {'status': OutboxMail.SENDING, 'leased': {'$lt': now}},
+         ]}, [('available', ASCENDING)]),
+    ]
@@ -0,0 +1,94 @@
+# Import dependencies.
+from itertools import groupby
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from forms.models import FormDisableLink
+
+
+class Command(BaseCommand):
+    """
+    Command that removes duplicate disable links. We used to create a new
+    disable link for every email, but now a single disable link is shared by
+    all emails for the same form link.
+    """
+
+    help = "Collapse duplicate disable links into one per form link."
+
+    def add_arguments(self, parser):
+        """
+        Method to add the command's arguments.
+        """
+
+        # Allow for tuning the number of links that are deleted at once.
+        parser.add_argument('--batch', type=int, default=500,
+                            help="The number of links to delete at once.")
+
+        # Disable links that have not yet expired could still be in someone's
+        # inbox, so we only remove them when explicitly asked to.
+        parser.add_argument('--include-active', action='store_true',
+                            help="Also remove duplicates that have not yet "
+                                 "expired. Their emails can then no longer "
+                                 "be used to disable the form.")
+
+        # Allow for checking what would happen first.
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report what would be removed.")
+
+    def handle(self, *args, **options):
+        """
+        Method to run the command.
+        """
+
+        # Get the current time.
+        now = timezone.now()
+
+        # Go through all disable links, grouped per form link, with the link
+        # that stays valid the longest first. The links are read a batch at a
+        # time, so that we never keep all of them in memory.
+        links = FormDisableLink.objects \
+            .order_by('formLink', '-expires') \
+            .values_list('pk', 'formLink', 'expires') \
+            .iterator(chunk_size=options['batch'])
+
+        # Remove the duplicates as we find them, in batches to keep every query
+        # small.
+        found = 0
+        batch = []
+        for formLink, group in groupby(links, key=lambda link: link[1]):
+
+            # Always keep the disable link that stays valid the longest.
+            next(group)
+
+            # Remove the others if they're expired or if we're asked to.
+            for pk, formLink, expires in group:
+                if not (options['include_active'] or expires < now):
+                    continue
+                found += 1
+                batch.append(pk)
+
+                # Remove a full batch right away.
+                if len(batch) >= options['batch']:
+                    self.remove(batch, options['dry_run'])
+                    batch = []
+
+        # Remove the last batch.
+        self.remove(batch, options['dry_run'])
+
+        # Report what we've done.
+        if options['dry_run']:
+            self.stdout.write(f"Found {found} duplicate disable links.")
+        else:
+            self.stdout.write(f"Removed {found} duplicate disable links.")
+
+    def remove(self, batch, dryRun=False):
+        """
+        Method to remove a batch of disable links, unless we should not change
+        anything.
+        """
+
+        # There is nothing to do without links, or if we should only look.
+        if not batch or dryRun:
+            return
+
+        # Remove the links at once.
+        FormDisableLink.objects.filter(pk__in=batch).delete()
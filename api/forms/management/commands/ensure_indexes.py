@@ -0,0 +1,128 @@
+# Import dependencies.
+from django.core.management.base import BaseCommand, CommandError
+from tools.Database import database
+from forms.indexes import INDEXES, queries
+
+
+class Command(BaseCommand):
+    """
+    Command that makes sure that the database has all indexes that our queries
+    need, and that none of those queries has to scan an entire collection.
+    """
+
+    help = "Create missing indexes and check that queries use them."
+
+    def add_arguments(self, parser):
+        """
+        Method to add the command's arguments.
+        """
+
+        # Allow for only checking the indexes.
+        parser.add_argument('--check', action='store_true',
+                            help="Report missing indexes without creating "
+                                 "them.")
+
+        # Allow for only warning about queries that scan an entire collection,
+        # for example while starting up.
+        parser.add_argument('--warn', action='store_true',
+                            help="Warn about queries that scan an entire "
+                                 "collection, rather than failing.")
+
+    def handle(self, *args, **options):
+        """
+        Method to run the command.
+        """
+
+        # Get direct access to the database.
+        db = database()
+
+        # Collect everything that is wrong.
+        problems = []
+
+        # Make sure that every collection has the indexes it needs.
+        for name, indexes in INDEXES.items():
+
+            # Get the indexes that already exist, by their fields.
+            existing = {tuple(info['key']): info for info
+                        in db[name].index_information().values()}
+
+            # Check every index that we need.
+            for keys, index in indexes:
+
+                # Check if an index on the same fields already exists.
+                info = existing.get(tuple(keys))
+                if info is not None:
+
+                    # Make sure that it has the right options.
+                    for option, value in index.items():
+                        if info.get(option) == value:
+                            continue
+
+                        # We can change how long documents are kept without
+                        # rebuilding the index.
+                        if (option == 'expireAfterSeconds'
+                                and option in info and not options['check']):
+                            db.command('collMod', name, index={
+                                'keyPattern': dict(keys),
+                                'expireAfterSeconds': value,
+                            })
+                            self.stdout.write(f"Changed {option} of index on "
+                                              f"{keys} on {name} to {value}.")
+                            continue
+
+                        # Otherwise, report the difference.
+                        problems.append(f"{name} index on {keys} has "
+                                        f"{option}={info.get(option)}, "
+                                        f"expected {value}")
+                    continue
+
+                # Report missing indexes if we should not create them.
+                if options['check']:
+                    problems.append(f"{name} is missing an index on {keys}")
+                    continue
+
+                # Otherwise, create the index without blocking the collection.
+                created = db[name].create_index(keys, background=True,
+                                                **index)
+                self.stdout.write(f"Created index {created} on {name}.")
+
+        # Make sure that none of our queries scans an entire collection.
+        scans = []
+        for description, name, query, sort in queries():
+
+            # Ask the database how it would run the query.
+            cursor = db[name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = cursor.explain()['queryPlanner']['winningPlan']
+
+            # Report queries that scan an entire collection.
+            if self.scans(plan):
+                scans.append(f"Query '{description}' on {name} scans the "
+                             "entire collection")
+            else:
+                self.stdout.write(f"Query '{description}' uses an index.")
+
+        # Only warn about those queries if we're asked to.
+        if options['warn']:
+            for scan in scans:
+                self.stderr.write(f"Warning: {scan}")
+        else:
+            problems += scans
+
+        # Fail loudly if anything is wrong.
+        if problems:
+            raise CommandError("\n".join(problems))
+
+    def scans(self, plan):
+        """
+        Method to check if a query plan scans an entire collection.
+        """
+
+        # Check this stage of the plan.
+        if plan.get('stage') == 'COLLSCAN':
+            return True
+
+        # Check all stages that feed into this stage.
+        children = [plan.get('inputStage')] + plan.get('inputStages', [])
+        return any(self.scans(child) for child in children if child)
@@ -0,0 +1,99 @@
+# Import dependencies.
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from tools.Database import database
+
+# The collections that every type of link used to be stored in, with the type
+# of link and the field that the link is tied to.
+CHILDREN = [
+    ('forms_formlink', 'form', 'form_id'),
+    ('forms_formconfirmationlink', 'confirmation', 'formLink_id'),
+    ('forms_formdisablelink', 'disable', 'formLink_id'),
+]
+
+
+class Command(BaseCommand):
+    """
+    Command that moves links from their old layout to their new layout. Every
+    type of link used to store its own fields in its own collection, next to
+    the shared fields in the links collection. Now, all fields of all links
+    are stored in the links collection.
+
+    This command only adds fields to the links collection, which the old
+    layout ignores. That means that it is safe to run while the previous
+    version is still serving requests, and it is safe to run again to move any
+    links that were created in the meantime.
+    """
+
+    help = "Move all links into a single collection."
+
+    def add_arguments(self, parser):
+        """
+        Method to add the command's arguments.
+        """
+
+        # Allow for tuning the number of links that are moved at once.
+        parser.add_argument('--batch', type=int, default=1000,
+                            help="The number of links to move at once.")
+
+        # Allow for cleaning up the old collections once we no longer need
+        # them.
+        parser.add_argument('--drop', action='store_true',
+                            help="Drop the old collections once every link "
+                                 "was moved.")
+
+    def handle(self, *args, **options):
+        """
+        Method to run the command.
+        """
+
+        # Get direct access to the database.
+        db = database()
+
+        # Get the collections that exist.
+        existing = set(db.list_collection_names())
+
+        # Move the links of every type.
+        for name, linkType, field in CHILDREN:
+
+            # There is nothing to do if this collection no longer exists.
+            if name not in existing:
+                continue
+
+            # Copy the fields of every link into the links collection.
+            moved = 0
+            updates = []
+            for child in db[name].find({}, {'link_ptr_id': 1, field: 1}):
+
+                # The link in the links collection shares its identifier.
+                updates.append(UpdateOne(
+                    {'_id': child['link_ptr_id']},
+                    {'$set': {'type': linkType, field: child.get(field)}},
+                ))
+
+                # Write the updates in batches.
+                if len(updates) >= options['batch']:
+                    moved += db.forms_link.bulk_write(
+                        updates, ordered=False).matched_count
+                    updates = []
+
+            # Write the remaining updates.
+            if updates:
+                moved += db.forms_link.bulk_write(
+                    updates, ordered=False).matched_count
+
+            # Report what we've done.
+            self.stdout.write(f"Moved {moved} {linkType} link(s).")
+
+            # Drop the old collection only if every link has been moved.
+            if options['drop']:
+                missing = db.forms_link.count_documents({
+                    '_id': {'$in': db[name].distinct('link_ptr_id')},
+                    'type': {'$ne': linkType},
+                })
+                if missing:
+                    self.stderr.write(f"Keeping {name}, {missing} link(s) "
+                                      "were not moved.")
+                else:
+                    db.drop_collection(name)
+                    self.stdout.write(f"Dropped {name}.")
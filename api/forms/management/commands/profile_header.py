@@ -0,0 +1,30 @@
+# Import dependencies.
+from django.core.management.base import BaseCommand
+from tools.Profiler import HEADER, header
+
+
+class Command(BaseCommand):
+    """
+    Command that signs a header that asks the API to profile a request to a
+    path. Only the API's own secret key can sign it, and it is only valid for
+    a few minutes.
+    """
+
+    help = "Sign a header that asks the API to profile a request."
+
+    def add_arguments(self, parser):
+        """
+        Method to add the command's arguments.
+        """
+
+        # The path of the request that should be profiled.
+        parser.add_argument('path', help="The full path of the request, "
+                                         "like /api/forms/response/.")
+
+    def handle(self, *args, **options):
+        """
+        Method to run the command.
+        """
+
+        # Print the header so that it can be added to a request.
+        self.stdout.write(f"{HEADER}: {header(options['path'])}")
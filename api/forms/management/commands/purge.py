@@ -0,0 +1,77 @@
+# Import dependencies.
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from tools.Database import database
+from forms.retention import Retention
+
+
+class Command(BaseCommand):
+    """
+    Command that removes data that we no longer need: forms that were never
+    confirmed, links that have expired long ago, and everything that depended
+    on them. It removes small batches at a time, so it is safe to run while
+    the API is serving requests.
+    """
+
+    help = "Remove abandoned forms, expired links and everything tied to them."
+
+    def add_arguments(self, parser):
+        """
+        Method to add the command's arguments.
+        """
+
+        # Allow for tuning the number of documents removed at once.
+        parser.add_argument('--batch', type=int, default=500,
+                            help="The number of documents to remove at once.")
+
+        # Allow for tuning how much of a break the database gets.
+        parser.add_argument('--pause', type=float, default=0.5,
+                            help="Seconds to wait between two batches.")
+
+        # Allow for purging periodically.
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Keep purging, with this many seconds in "
+                                 "between. Purges only once by default.")
+
+    def handle(self, *args, **options):
+        """
+        Method to run the command.
+        """
+
+        # We should stop after the current run when we're asked to stop.
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Configure how long to keep everything.
+        retention = Retention(
+            database(),
+            links=settings.LINK_RETENTION,
+            forms=settings.FORM_RETENTION,
+            batch=options['batch'],
+            pause=options['pause'],
+        )
+
+        # Keep purging until we're asked to stop.
+        while self.running:
+
+            # Remove everything that we no longer need and report it.
+            for name, removed in retention.purge().items():
+                self.stdout.write(f"Removed {removed} {name}.")
+
+            # Stop if we only needed to purge once.
+            if options['interval'] is None:
+                break
+
+            # Otherwise, wait until the next run.
+            time.sleep(options['interval'])
+
+    def stop(self, signum, frame):
+        """
+        Method to stop the command after the current run.
+        """
+
+        # Let the main loop know that it should stop.
+        self.running = False
@@ -0,0 +1,76 @@
+# Import dependencies.
+import signal
+import time
+from django.core.management.base import BaseCommand
+from prometheus_client import start_http_server
+from tools.Mail import outbox
+
+
+class Command(BaseCommand):
+    """
+    Command that keeps delivering emails from the outbox. Any number of copies
+    of this command can run at the same time, as every email is claimed by a
+    single worker before it is delivered.
+    """
+
+    help = "Deliver all emails that are waiting in the outbox."
+
+    def add_arguments(self, parser):
+        """
+        Method to add the command's arguments.
+        """
+
+        # Allow for tuning the number of emails claimed at once.
+        parser.add_argument('--batch', type=int, default=50,
+                            help="The number of emails to claim at once.")
+
+        # Allow for tuning how long to wait when the outbox is empty.
+        parser.add_argument('--interval', type=float, default=5,
+                            help="Seconds to wait when the outbox is empty.")
+
+        # Allow for emptying the outbox just once.
+        parser.add_argument('--once', action='store_true',
+                            help="Stop as soon as the outbox is empty.")
+
+        # Allow Prometheus to read the metrics of this process, as it does not
+        # serve the API's metrics endpoint.
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help="Serve metrics for Prometheus on this port.")
+
+    def handle(self, *args, **options):
+        """
+        Method to run the command.
+        """
+
+        # Expose the metrics of the deliveries if we're asked to.
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
+
+        # We should stop after the current batch when we're asked to stop.
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Keep delivering emails until we're asked to stop.
+        while self.running:
+
+            # Deliver the next batch of emails.
+            claimed = outbox.drain(options['batch'])
+            if claimed:
+                self.stdout.write(f"Processed {claimed} email(s).")
+                continue
+
+            # Stop if we only needed to empty the outbox once.
+            if options['once']:
+                break
+
+            # Otherwise, wait a while before checking again.
+            time.sleep(options['interval'])
+
+    def stop(self, signum, frame):
+        """
+        Method to stop the command after the current batch.
+        """
+
+        # Let the main loop know that it should stop.
+        self.running = False
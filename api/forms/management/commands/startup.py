@@ -0,0 +1,107 @@
+# Import dependencies.
+import os
+import time
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from tools.Startup import (
+    Fingerprints, commandSource, databaseIdentity, digest, indexSources,
+    migrationSources, staticSources
+)
+
+
+class Command(BaseCommand):
+    """
+    Command that prepares everything the API needs before it can start. Every
+    step is only taken when something has changed since the last time it ran,
+    and all steps run in this one process, so that a restart without any
+    changes is nearly instant.
+    """
+
+    help = "Collect static files, migrate and check indexes when needed."
+
+    def add_arguments(self, parser):
+        """
+        Method to add the command's arguments.
+        """
+
+        # Allow for running every step regardless.
+        parser.add_argument('--force', action='store_true',
+                            help="Run every step, even if nothing changed.")
+
+    def handle(self, *args, **options):
+        """
+        Method to run the command.
+        """
+
+        # Remember what every step looked at when it last ran.
+        self.fingerprints = Fingerprints(settings.STARTUP_STATE)
+        self.force = options['force']
+
+        # Only collect static files when they have changed, or when the
+        # collected files are missing.
+        self.step('collectstatic', lambda: digest(staticSources()),
+                  lambda: call_command('collectstatic', interactive=False,
+                                       verbosity=0),
+                  missing=not os.path.isdir(settings.STATIC_ROOT))
+
+        # Only look for new migrations when the models have changed. The
+        # fingerprint is taken after the step, so that it includes the
+        # migrations that were just created.
+        self.step('makemigrations', lambda: digest(migrationSources()),
+                  lambda: call_command('makemigrations', verbosity=0))
+
+        # Only migrate when there are migrations that were not applied yet. The
+        # database itself knows best which ones those are.
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        self.step('migrate', None,
+                  lambda: call_command('migrate', interactive=False,
+                                       verbosity=0),
+                  missing=bool(plan))
+
+        # Move links that were stored in the old layout. This only needs to
+        # happen again when the layout or the database changes. Links that the
+        # previous version stores in the old layout after this step has run
+        # are moved by running the command by hand.
+        self.step('flatten_links',
+                  lambda: digest([commandSource('flatten_links')] +
+                                 migrationSources(), databaseIdentity()),
+                  lambda: call_command('flatten_links'))
+
+        # Make sure that the database has all indexes that our queries need,
+        # when the indexes, the models or the database changed. Queries that
+        # scan an entire collection are only reported, so that a change in
+        # how the database runs a query does not stop the API from starting.
+        self.step('ensure_indexes',
+                  lambda: digest(indexSources(), settings.LINK_RETENTION,
+                                 databaseIdentity()),
+                  lambda: call_command('ensure_indexes', verbosity=0,
+                                       warn=True))
+
+    def step(self, name, fingerprint, run, missing=False):
+        """
+        Method to take a single step, but only when needed. Accepts the name
+        of the step, a function that calculates the fingerprint of everything
+        the step looks at, a function that takes the step, and whether the
+        step is needed regardless of its fingerprint.
+        """
+
+        # Check if anything changed since the last time.
+        changed = fingerprint is not None and \
+            self.fingerprints.changed(name, fingerprint())
+        if not (self.force or missing or changed):
+            self.stdout.write(f"Skipping {name}, nothing changed.")
+            return
+
+        # Take the step and report how long it took.
+        start = time.monotonic()
+        run()
+        self.stdout.write(f"Finished {name} in "
+                          f"{time.monotonic() - start:.2f}s.")
+
+        # Remember what the step looked at.
+        if fingerprint:
+            self.fingerprints.remember(name, fingerprint())
@@ -1,8 +1,11 @@
 import secrets
 import os
 from djongo import models
+from django.core.cache import cache
+from django.db import DatabaseError
 from django.utils import timezone
 from datetime import timedelta
+from tools.Database import isDuplicateKey
 
 
 class Entity(models.Model):
@@ -52,6 +55,9 @@ class User(TimeStamped):
     # verified.
     verified = models.DateTimeField(null=True)
 
+    # We need access to the collection to create users efficiently.
+    objects = models.DjongoManager()
+
     def __str__(self):
         """
         Converts the user model to a string representation.
@@ -83,6 +89,9 @@ class Form(TimeStamped):
     # Flag to record if this form is disabled by the owner.
     disabled = models.BooleanField(default=False)
 
+    # We need access to the collection to find names efficiently.
+    objects = models.DjongoManager()
+
     class Meta:
         """
         Extra settings for the Form class.
@@ -101,35 +110,120 @@ class Form(TimeStamped):
         return self.name + ':' + str(self.user)
 
 
+class LinkManager(models.DjongoManager):
+    """
+    Manager for links. All types of links are stored in the same collection,
+    so every type of link only gets to see the links of its own type.
+    """
+
+    def get_queryset(self):
+        """
+        Method to get the links that this manager manages.
+        """
+
+        # Get all links.
+        queryset = super().get_queryset()
+
+        # The base link model can see all types of links.
+        if self.model.linkType is None:
+            return queryset
+
+        # Otherwise, only return links of the model's own type.
+        return queryset.filter(type=self.model.linkType)
+
+
 class Link(TimeStamped):
     """
     This base model represents a link. This base class holds a unique URL-safe
     key that can be used to link to something. Typically, you'll use an
     extending class to link to something useful.
+
+    All types of links are stored in the same collection, so that a link can
+    be found by its key with a single lookup. Every type of link is a proxy of
+    this model that stores its own type with the link.
     """
 
-    def generate_key():
-        """
-        Function to generate a unique key for this link.
-        """
+    # The type of link that a proxy model represents.
+    linkType = None
+
+    # Every link knows what type of link it is.
+    type = models.CharField(max_length=16, blank=True, default='')
+
+    # Form links are tied to a single form.
+    form = models.ForeignKey(Form, related_name='links', null=True,
+                             blank=True, on_delete=models.CASCADE)
+
+    # Confirmation and disable links are tied to the form link they act on.
+    formLink = models.ForeignKey('FormLink', related_name='+', null=True,
+                                 blank=True, on_delete=models.CASCADE)
 
-        # While unlikely, it is possible that the first key we create is not
-        # unique. In such a case, we want to keep trying.
-        while True:
+    # Every type of link should only find links of its own type.
+    objects = LinkManager()
 
-            # We want to use the key in a URL, so it should be URL
-            # safe. It needs to be long enough to be hard to guess and
-            # short enough to be practical in a URL.
-            key = secrets.token_urlsafe(secrets.choice(range(16, 128)))
+    # The number of random bytes in every key. This is long enough to be
+    # impossible to guess, while keeping keys short enough to fit in a URL and
+    # to keep the index on keys small.
+    keyBytes = 16
 
-            # Make sure that there is no other link that uses this key.
-            if (not Link.objects.filter(key=key).exists()):
-                return key
+    # Every type of link starts its keys with its own prefix.
+    keyPrefix = ''
+
+    # The number of times we try a new key when a key is already in use.
+    keyAttempts = 5
 
     # A link is identified by this key. Every link should be unique, regardless
     # of the form it is attached to. It should have a reasonable length to fit
-    # a URL.
-    key = models.CharField(max_length=128, unique=True, default=generate_key)
+    # a URL. A key is generated when the link is first saved.
+    key = models.CharField(max_length=128, unique=True, blank=True)
+
+    def generateKey(self):
+        """
+        Method to generate a new random key for this link.
+        """
+
+        # We want to use the key in a URL, so it should be URL safe.
+        return self.keyPrefix + secrets.token_urlsafe(self.keyBytes)
+
+    def prepare(self):
+        """
+        Method to prepare a new link to be stored. Returns whether a key was
+        generated for the link.
+        """
+
+        # Make sure that we remember what type of link this is.
+        if self.linkType is not None:
+            self.type = self.linkType
+
+        # Only generate a key if the link does not have one yet.
+        generated = not self.key
+        if generated:
+            self.key = self.generateKey()
+
+        # Let the caller know if we generated a key.
+        return generated
+
+    def save(self, *args, **kwargs):
+        """
+        Method to save the link. Generates a key for new links. We don't check
+        if a key is already in use before we save, as that would cost an extra
+        query for every link. Instead, we rely on the unique index and simply
+        try again with another key in the unlikely case of a collision.
+        """
+
+        # Make sure that the link has a type and a key.
+        generated = self.prepare()
+
+        # Keep trying until we find a key that is not in use.
+        for attempt in range(self.keyAttempts):
+            try:
+                return super().save(*args, **kwargs)
+
+            # We can only try another key if we generated the key ourselves.
+            except DatabaseError as error:
+                if (not generated or attempt == self.keyAttempts - 1
+                        or not isDuplicateKey(error, 'key')):
+                    raise
+                self.key = self.generateKey()
 
     def default_expire_date():
         """
@@ -167,9 +261,18 @@ class FormLink(Link):
     multiple links to allow users to identify different types of traffic.
     """
 
-    # A link is always tied to a single form.
-    form = models.ForeignKey(Form, related_name='links',
-                             on_delete=models.CASCADE)
+    # This is the type of link we store.
+    linkType = 'form'
+
+    # Keys for form links start with their own prefix.
+    keyPrefix = 'f'
+
+    class Meta:
+        """
+        Store form links with all other links.
+        """
+
+        proxy = True
 
     def url(self):
         """
@@ -208,9 +311,21 @@ class FormConfirmationLink(Link):
     If this is a user's first form, the user will also be verified.
     """
 
+    # This is the type of link we store.
+    linkType = 'confirmation'
+
+    # Keys for confirmation links start with their own prefix.
+    keyPrefix = 'c'
+
     # A FormConfirmationLink is always linked to a specific form link that it
-    # will redirect to if successful.
-    formLink = models.ForeignKey(FormLink, on_delete=models.CASCADE)
+    # will redirect to if successful. It is stored in the formLink field.
+
+    class Meta:
+        """
+        Store confirmation links with all other links.
+        """
+
+        proxy = True
 
     def url(self):
         """
@@ -238,8 +353,80 @@ class FormDisableLink(Link):
     with which the owner can disable the form.
     """
 
-    # A FormDisableLink is always linked to a specific FormLink.
-    formLink = models.ForeignKey(FormLink, on_delete=models.CASCADE)
+    # This is the type of link we store.
+    linkType = 'disable'
+
+    # Keys for disable links start with their own prefix.
+    keyPrefix = 'd'
+
+    # A FormDisableLink is always linked to a specific FormLink. It is stored
+    # in the formLink field.
+
+    class Meta:
+        """
+        Store disable links with all other links.
+        """
+
+        proxy = True
+
+    # A single disable link is shared by all emails for the same form link. We
+    # replace it with a new one once it gets close to expiring, so that every
+    # email we send contains a link that stays valid for at least this long.
+    rotation = timedelta(30)
+
+    @staticmethod
+    def cacheKey(formLinkId):
+        """
+        Method to get the key under which we keep the current disable link for
+        a form link in the cache.
+        """
+
+        # Use a prefix to avoid clashes with anything else in the cache.
+        return f"formdisablelink:{formLinkId}"
+
+    @classmethod
+    def reusable(cls, formLink):
+        """
+        Method to get the disable link that should be added to emails for a
+        form link. Creates a new disable link only when there is no disable
+        link that stays valid long enough.
+        """
+
+        # Use the cached disable link if we have one. The cache forgets about
+        # the disable link as soon as it should be replaced.
+        cached = cache.get(cls.cacheKey(formLink.pk))
+        if cached is not None:
+            pk, key, expires = cached
+            return cls(id=pk, key=key, expires=expires, formLink=formLink)
+
+        # Otherwise, look for a disable link that stays valid long enough.
+        link = cls.objects.filter(
+            formLink=formLink,
+            expires__gt=timezone.now() + cls.rotation,
+        ).order_by('-expires').first()
+
+        # Create a new disable link if there is none.
+        if link is None:
+            link = cls.objects.create(formLink=formLink)
+
+        # Remember the disable link for the next email.
+        link.remember()
+
+        # Return the disable link.
+        return link
+
+    def remember(self):
+        """
+        Method to remember this disable link as the one that should be added to
+        emails for its form link, until it should be replaced.
+        """
+
+        # Calculate how long we can use this disable link.
+        timeout = (self.expires - self.rotation - timezone.now()).total_seconds()
+
+        # Store it in the cache for that long.
+        cache.set(self.cacheKey(self.formLink_id),
+                  (self.pk, self.key, self.expires), timeout)
 
     def url(self):
         """
@@ -299,3 +486,85 @@ class Input(TimeStamped):
         # We can combine the input's name and the form, as this should be a
         # unique combination.
         return self.name + ':' + str(self.form)
+
+
+class OutboxMail(TimeStamped):
+    """
+    This model represents a single rendered email in the outbox. Every email is
+    stored here before it is delivered, so that no mail is lost when the API
+    restarts. Delivery workers claim emails from the outbox, retry them with an
+    increasing delay when sending fails, and eventually give up on them by
+    marking them as dead.
+    """
+
+    # The email is waiting to be delivered.
+    PENDING = 'pending'
+
+    # A worker has claimed the email and is trying to deliver it.
+    SENDING = 'sending'
+
+    # The email was delivered.
+    SENT = 'sent'
+
+    # We've given up on delivering the email.
+    DEAD = 'dead'
+
+    # The delivery status of the email.
+    status = models.CharField(max_length=16, default=PENDING)
+
+    # The email's subject line.
+    subject = models.CharField(max_length=998)
+
+    # The email's plain text version.
+    body = models.TextField()
+
+    # The email's HTML version.
+    html = models.TextField(blank=True, null=True)
+
+    # The address to send the email from. We use the default FROM address if
+    # this is not set.
+    sender = models.CharField(max_length=320, blank=True, null=True)
+
+    # The list of addresses to send the email to.
+    recipients = models.JSONField()
+
+    # The number of times a worker has tried to deliver the email.
+    attempts = models.IntegerField(default=0)
+
+    # The email should not be delivered before this moment.
+    available = models.DateTimeField(default=timezone.now)
+
+    # Until this moment, the email is claimed by a single worker. If that
+    # worker dies, another worker can claim it after this moment.
+    leased = models.DateTimeField(null=True)
+
+    # The moment that the email was delivered.
+    sent = models.DateTimeField(null=True)
+
+    # The last error that occurred when trying to deliver the email.
+    error = models.TextField(blank=True, null=True)
+
+    # The trace of the request that sent the email, so that its delivery can
+    # join the same trace.
+    trace = models.JSONField(blank=True, null=True)
+
+    # We need access to the collection to atomically claim emails.
+    objects = models.DjongoManager()
+
+    class Meta:
+        """
+        Extra settings for the OutboxMail class.
+        """
+
+        # Workers look for emails by their status and availability.
+        indexes = [
+            models.Index(fields=['status', 'available']),
+        ]
+
+    def __str__(self):
+        """
+        Converts an outbox email to a string representation.
+        """
+
+        # We can combine the status and the subject.
+        return self.status + ':' + self.subject
@@ -0,0 +1,269 @@
+# Import dependencies.
+import re
+from collections import namedtuple
+from bson import ObjectId
+from django.core.exceptions import ValidationError as ModelValidationError
+from django.db import DatabaseError
+from django.utils import timezone
+from pymongo import ReturnDocument
+from rest_framework.exceptions import ValidationError
+from tools.Database import instance, isDuplicateKey
+from .models import (
+  User, Form, Link, FormLink, FormConfirmationLink, FormDisableLink, Input
+)
+
+# Everything that is created for a new form.
+Provisioned = namedtuple('Provisioned', [
+    'user', 'form', 'link', 'confirmationLink', 'disableLink'
+])
+
+
+class FormProvisioner:
+    """
+    Class to create a new form with everything it needs: its owner, its inputs
+    and its links. We want to do this with as few round trips to the database
+    as possible. All identifiers are generated up front, so that the inputs
+    and the links can each be stored with a single write.
+
+    MongoDB only supports transactions on replica sets, and Djongo does not
+    use them. Instead, we remove the new form again if we cannot store
+    everything it needs, together with its owner if we've just created that
+    owner for it.
+    """
+
+    # The number of times we try another name when a form name was taken
+    # while we were creating the form.
+    nameAttempts = 5
+
+    # The number of times we try new keys when a key was already in use.
+    keyAttempts = 5
+
+    def provision(self, email, name, description=None):
+        """
+        Method to create a new form for the owner of an email address.
+        """
+
+        # Get the owner of the form.
+        user, created = self.user(email)
+
+        # Store the form itself. Remove the owner again if that fails and we
+        # have just created it, so that we don't leave an owner without forms
+        # behind.
+        try:
+            form = self.form(user, name, description)
+        except BaseException:
+            if created:
+                self.removeUser(user)
+            raise
+
+        # Store everything else that the form needs. Remove the form again if
+        # that fails, so that we don't leave a half created form behind.
+        try:
+            self.inputs(form)
+            link, confirmationLink, disableLink = self.links(form)
+        except BaseException:
+            form.delete()
+            if created:
+                self.removeUser(user)
+            raise
+
+        # Every email for this form can use the new disable link.
+        disableLink.remember()
+
+        # Return everything that was created.
+        return Provisioned(user, form, link, confirmationLink, disableLink)
+
+    def user(self, email):
+        """
+        Method to get the user with an email address. Creates the user if it
+        does not exist yet, with a single round trip. Returns the user and
+        whether it was created.
+        """
+
+        # Make sure that the email address fits.
+        self.clean(User(email=email), ['email'])
+
+        # Get the current time, and the identifier for the user if we have to
+        # create it. We can tell that we created the user by its identifier.
+        now = timezone.now()
+        pk = ObjectId()
+
+        # Another request could create the same user at the same time. In that
+        # case, the second attempt will find that user.
+        for attempt in range(2):
+            try:
+                document = User.objects.mongo_find_one_and_update(
+                    {'email': email},
+                    {'$setOnInsert': {
+                        '_id': pk,
+                        'email': email,
+                        'verified': None,
+                        'created': now,
+                        'updated': now,
+                    }},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                return instance(User, document), document['_id'] == pk
+
+            # Only try again if the user was created in the meantime.
+            except DatabaseError as error:
+                if attempt or not isDuplicateKey(error, 'email'):
+                    raise
+
+    def removeUser(self, user):
+        """
+        Method to remove a user that we've just created for a form that could
+        not be created. Keeps the user if another request has given it a form
+        in the meantime, or if it was verified.
+        """
+
+        # Keep the user if it has any forms.
+        if Form.objects.filter(user=user).exists():
+            return
+
+        # Otherwise, remove only the user itself. Removing it through Django
+        # would also remove any forms that were created since we've looked.
+        User.objects.mongo_delete_one({'_id': user.pk, 'verified': None})
+
+    def form(self, user, name, description):
+        """
+        Method to store a new form with a unique name for a user.
+        """
+
+        # Construct the form.
+        form = Form(id=ObjectId(), user=user, name=name,
+                    description=description)
+
+        # Another request may take the same name while we're creating this
+        # form. In that case, we simply try again with the next name.
+        for attempt in range(self.nameAttempts):
+
+            # Make sure that the form's name is unique.
+            form.name = self.uniqueFormname(name, user)
+
+            # Make sure that the form fits.
+            self.clean(form, ['name', 'description'])
+
+            # Store the form. Storing it in bulk does not trigger any signals,
+            # which we don't need for a new form.
+            try:
+                Form.objects.bulk_create([form])
+                return form
+
+            # Only try again if the name was taken.
+            except DatabaseError as error:
+                if (attempt == self.nameAttempts - 1
+                        or not isDuplicateKey(error, 'name')):
+                    raise
+
+    def uniqueFormname(self, name, user):
+        """
+        Make sure that a form name is unique.
+        """
+
+        # Regex to find the number in a name. We assume that this number
+        # has a format of '(0)' and is at the end of the name.
+        regex = r'\((\d+)\)$'
+
+        # Check if the name already ends in a number.
+        match = re.search(regex, name)
+
+        # Split the name into the base name and the number it ends with.
+        base = name[:match.start()] if match else name
+        number = int(match.group(1), base=10) if match else 0
+
+        # Get all names that this user already uses that start with the same
+        # base name. A regular expression that is anchored to the start of the
+        # name can use the index on the user and the name.
+        taken = {form['name'] for form in Form.objects.mongo_find(
+            {'user_id': user.pk, 'name': {'$regex': '^' + re.escape(base)}},
+            {'name': True, '_id': False},
+        )}
+
+        # Keep adding 1 to the number until we find a name that is not taken.
+        while name in taken:
+            number += 1
+            name = f"{base}({number})"
+
+        # Return the unique name.
+        return name
+
+    def inputs(self, form):
+        """
+        Method to store the default inputs of a new form.
+        """
+
+        # Add a message input to the form.
+        # @todo: We currently only support this input field, but we can make
+        # this app much more powerful when we don't!
+        inputs = [Input(
+            id=ObjectId(),
+            form=form,
+            name="message",
+            label="Message",
+            hint="Add a message to send to the owner of this form.",
+            required=True,
+            type='textarea',
+        )]
+
+        # Store all inputs at once.
+        Input.objects.bulk_create(inputs)
+        return inputs
+
+    def links(self, form):
+        """
+        Method to store the links of a new form: the link to the form itself,
+        and the links to confirm and disable it.
+        """
+
+        # Construct the links.
+        link = FormLink(id=ObjectId(), form=form)
+        confirmationLink = FormConfirmationLink(id=ObjectId(), formLink=link)
+        disableLink = FormDisableLink(id=ObjectId(), formLink=link)
+        links = [link, confirmationLink, disableLink]
+
+        # In the unlikely case that a key is already in use, we simply try
+        # again with new keys.
+        for attempt in range(self.keyAttempts):
+
+            # Give every link its type and a fresh key.
+            for each in links:
+                each.key = ''
+                each.prepare()
+
+            # Store all links at once.
+            try:
+                Link.objects.bulk_create(links)
+                return links
+
+            # Only try again if a key was already in use.
+            except DatabaseError as error:
+                if (attempt == self.keyAttempts - 1
+                        or not isDuplicateKey(error, 'key')):
+                    raise
+
+                # Remove any links that were stored before the collision.
+                Link.objects.filter(pk__in=[each.pk for each in links]) \
+                            .delete()
+
+    def clean(self, model, fields):
+        """
+        Method to check that the values that a client provided fit the fields
+        of a model, without asking the database. Raises a ValidationError that
+        lets the client know what is wrong.
+        """
+
+        # Only check the fields that the client provided.
+        try:
+            model.clean_fields(exclude=[field.name for field
+                                        in model._meta.fields
+                                        if field.name not in fields])
+
+        # Let the client know what is wrong.
+        except ModelValidationError as error:
+            raise ValidationError(error.message_dict)
+
+
+# Create a single provisioner that is shared by all views in this process.
+formProvisioner = FormProvisioner()
@@ -0,0 +1,133 @@
+# Import dependencies.
+from collections import namedtuple
+from datetime import datetime
+from django.utils import timezone
+from tools.Database import sharedClient
+from .models import Form, Input, Link
+
+# Lightweight records for the documents that we read.
+LinkRecord = namedtuple('LinkRecord', [
+    'id', 'key', 'type', 'form', 'formLink', 'expires', 'updated'
+])
+FormRecord = namedtuple('FormRecord', [
+    'id', 'user', 'name', 'description', 'confirmed', 'disabled', 'updated'
+])
+InputRecord = namedtuple('InputRecord', [
+    'id', 'name', 'label', 'hint', 'required', 'type', 'updated'
+])
+
+
+class FormRepository:
+    """
+    Class to read forms, their links and their inputs straight from the
+    database. Djongo translates every query to SQL and then from SQL to a
+    MongoDB query, which costs a lot of time for simple lookups. On the paths
+    that every visitor of a form takes, we can skip all of that and ask the
+    database directly.
+    """
+
+    def __init__(self, client):
+        """
+        Constructor for the repository. Accepts the shared database client.
+        """
+
+        # Remember how to reach the database.
+        self.client = client
+
+    def collection(self, model):
+        """
+        Method to get the collection that a model is stored in.
+        """
+
+        # Djongo stores every model in a collection named after its table.
+        return self.client.database()[model._meta.db_table]
+
+    def value(self, value):
+        """
+        Method to convert a value that we've read from the database to the
+        value that Django would have given us.
+        """
+
+        # The database driver does not know about time zones, but Django does.
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            return timezone.make_aware(value, timezone.utc)
+
+        # All other values can be used as they are.
+        return value
+
+    def record(self, record, document, columns):
+        """
+        Method to construct a record from a document. Accepts the type of
+        record, the document and the columns to read the record's fields from.
+        """
+
+        # Read the value of every field.
+        return record(*[self.value(document.get(column))
+                        for column in columns])
+
+    def link(self, key, linkType=None):
+        """
+        Method to get a link by its key. Optionally only finds links of a
+        single type. Returns None if there is no such link.
+        """
+
+        # Find the link by its key, which is indexed.
+        query = {'key': key}
+        if linkType is not None:
+            query['type'] = linkType
+
+        # Get only the fields that we need.
+        columns = ['_id', 'key', 'type', 'form_id', 'formLink_id', 'expires',
+                   'updated']
+        document = self.collection(Link).find_one(query, columns)
+
+        # Construct the record if we found the link.
+        return document and self.record(LinkRecord, document, columns)
+
+    def form(self, pk):
+        """
+        Method to get the state of a form by its primary key. Returns None if
+        there is no such form.
+        """
+
+        # Get only the fields that we need.
+        columns = ['_id', 'user_id', 'name', 'description', 'confirmed',
+                   'disabled', 'updated']
+        document = self.collection(Form).find_one({'_id': pk}, columns)
+
+        # Construct the record if we found the form.
+        return document and self.record(FormRecord, document, columns)
+
+    def inputs(self, formId):
+        """
+        Method to get all inputs of a form.
+        """
+
+        # Get only the fields that we need.
+        columns = ['_id', 'name', 'label', 'hint', 'required', 'type',
+                   'updated']
+        documents = self.collection(Input).find({'form_id': formId}, columns)
+
+        # Construct a record for every input.
+        return [self.record(InputRecord, document, columns)
+                for document in documents]
+
+    def inputTimestamps(self, formId):
+        """
+        Method to get the moments that the inputs of a form were last updated.
+        Inputs that were stored before they had a timestamp are included as
+        None.
+        """
+
+        # Only get the timestamps.
+        documents = self.collection(Input).find({'form_id': formId},
+                                                {'updated': True, '_id': False})
+
+        # Return them in a fixed order, with the missing timestamps first.
+        return sorted((self.value(document.get('updated'))
+                       for document in documents),
+                      key=lambda moment: (moment is not None, moment))
+
+
+# Create a single repository that is shared by all views in this process.
+formRepository = FormRepository(sharedClient)
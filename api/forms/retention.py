@@ -0,0 +1,235 @@
+# Import dependencies.
+import time
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from pymongo import WriteConcern
+from .cache import formLinkCache
+from .models import Form, FormDisableLink, Input, Link, User
+
+
+class Retention:
+    """
+    Class to remove data that we no longer need. The database removes expired
+    links by itself, but it cannot remove the documents that depend on them,
+    and it cannot tell if a form was abandoned. Everything is removed in small
+    batches with a pause in between, so that the database can keep serving
+    requests in the meantime.
+    """
+
+    def __init__(self, database, links=30, forms=30, batch=500, pause=0.5):
+        """
+        Constructor for the retention. Accepts the database, the number of days
+        to keep links after they have expired, the number of days to keep forms
+        that were never confirmed, the maximum number of documents to remove at
+        once, and the number of seconds to wait between batches.
+        """
+
+        # Remember how long we should keep things.
+        self.links = timedelta(links)
+        self.forms = timedelta(forms)
+
+        # Remember how fast we may remove things.
+        self.batch = max(1, batch)
+        self.pause = pause
+
+        # Only consider a batch removed once it has reached the majority of the
+        # database servers, so that we never outpace replication.
+        concern = WriteConcern(w='majority')
+        self.collections = {
+            model: database.get_collection(model._meta.db_table,
+                                           write_concern=concern)
+            for model in (User, Form, Input, Link)
+        }
+
+    def purge(self):
+        """
+        Method to remove everything that we no longer need. Returns the number
+        of removed documents per type.
+        """
+
+        # Run all steps, in order.
+        return {
+            'abandoned forms': self.abandoned(),
+            'expired links': self.expired(),
+            'orphaned links': self.orphans(Link, 'form_id', Form) +
+                              self.orphans(Link, 'formLink_id', Link),
+            'orphaned inputs': self.orphans(Input, 'form_id', Form),
+        }
+
+    def wait(self):
+        """
+        Method to give the database a break between two batches.
+        """
+
+        # Simply wait for a while.
+        if self.pause:
+            time.sleep(self.pause)
+
+    def batches(self, model, query, fields=()):
+        """
+        Method to find the documents that match a query, one batch at a time.
+        Every batch should be removed before the next batch is requested.
+        """
+
+        # Keep going until nothing matches any more.
+        while True:
+
+            # Get the next batch.
+            batch = list(self.collections[model].find(
+                query, {field: 1 for field in fields}, limit=self.batch))
+
+            # Stop when there is nothing left.
+            if not batch:
+                return
+
+            # Hand over the batch, then give the database a break.
+            yield batch
+            self.wait()
+
+    def abandoned(self):
+        """
+        Method to remove forms that were never confirmed, together with their
+        links, their inputs and their owner if the owner has no other forms and
+        never verified their email address. Returns the number of removed
+        forms.
+        """
+
+        # Find the moment before which forms should have been confirmed.
+        cutoff = timezone.now() - self.forms
+
+        # Remove the forms in batches.
+        removed = 0
+        for batch in self.batches(Form, {
+            'confirmed': None, 'created': {'$lt': cutoff},
+        }, ['user_id']):
+
+            # Remove the forms first, but only if they were not confirmed in
+            # the meantime. Anything that depends on the forms is removed
+            # afterwards. If we're interrupted before that, the orphans are
+            # removed during the next run.
+            ids = [form['_id'] for form in batch]
+            removed += self.collections[Form].delete_many({
+                '_id': {'$in': ids}, 'confirmed': None,
+            }).deleted_count
+
+            # Find out which forms were actually removed.
+            kept = {form['_id'] for form in self.collections[Form].find(
+                {'_id': {'$in': ids}}, {'_id': 1})}
+            ids = [pk for pk in ids if pk not in kept]
+
+            # Remove the links to the forms, and the links that act on those.
+            links = list(self.collections[Link].find(
+                {'form_id': {'$in': ids}}, {'key': 1}))
+            self.removeLinks(links)
+
+            # Remove the forms' inputs.
+            self.collections[Input].delete_many({'form_id': {'$in': ids}})
+
+            # Remove the owners that have nothing left, unless they've verified
+            # their email address.
+            owners = {form['user_id'] for form in batch
+                      if form['_id'] in ids}
+            owners -= set(self.collections[Form].distinct(
+                'user_id', {'user_id': {'$in': list(owners)}}))
+            self.collections[User].delete_many({
+                '_id': {'$in': list(owners)}, 'verified': None,
+            })
+
+        # Report how many forms were removed.
+        return removed
+
+    def expired(self):
+        """
+        Method to remove links that have expired long enough ago. The database
+        normally does this by itself, but not as long as the index that it
+        needs is still being built. Returns the number of removed links.
+        """
+
+        # Find the moment before which links should have expired.
+        cutoff = timezone.now() - self.links
+
+        # Remove the links in batches.
+        removed = 0
+        for batch in self.batches(Link, {'expires': {'$lt': cutoff}},
+                                  ['key']):
+            removed += self.removeLinks(batch)
+
+        # Report how many links were removed.
+        return removed
+
+    def orphans(self, model, field, parent):
+        """
+        Method to remove documents that refer to a parent that no longer
+        exists. Walks through the documents in the order they were created, so
+        that every document is looked at only once. Returns the number of
+        removed documents.
+        """
+
+        # Start at the oldest document.
+        removed, last = 0, None
+        while True:
+
+            # Get the next batch of documents that refer to a parent.
+            query = {field: {'$ne': None}}
+            if last is not None:
+                query['_id'] = {'$gt': last}
+            batch = list(self.collections[model].find(
+                query, {field: 1, 'key': 1}, sort=[('_id', 1)],
+                limit=self.batch))
+
+            # Stop when we've looked at every document.
+            if not batch:
+                return removed
+            last = batch[-1]['_id']
+
+            # Find the parents that still exist.
+            parents = {document['_id'] for document in
+                       self.collections[parent].find(
+                           {'_id': {'$in': list({document[field]
+                                                 for document in batch})}},
+                           {'_id': 1})}
+
+            # Remove the documents whose parent no longer exists.
+            orphans = [document for document in batch
+                       if document[field] not in parents]
+            if model is Link:
+                removed += self.removeLinks(orphans)
+            elif orphans:
+                removed += self.collections[model].delete_many({
+                    '_id': {'$in': [orphan['_id'] for orphan in orphans]},
+                }).deleted_count
+
+            # Give the database a break.
+            self.wait()
+
+    def removeLinks(self, links):
+        """
+        Method to remove a list of links, together with the links that act on
+        them. Clears them from the cache of this process, or from the shared
+        cache if there is one. Returns the number of removed links.
+        """
+
+        # There is nothing to do without links.
+        if not links:
+            return 0
+
+        # Remove the links, and the confirmation and disable links that act on
+        # them.
+        ids = [link['_id'] for link in links]
+        removed = self.collections[Link].delete_many({
+            '_id': {'$in': ids},
+        }).deleted_count
+        self.collections[Link].delete_many({'formLink_id': {'$in': ids}})
+
+        # Clear the cached details of the removed links. This only reaches the
+        # API when the cache is shared, as the default cache belongs to this
+        # process alone. The API does not depend on it though: it looks up the
+        # link in the database to check its version before it uses the cache,
+        # so it never serves the details of a link that no longer exists. The
+        # cached disable links belong to form links that were removed too.
+        formLinkCache.invalidate([link['key'] for link in links])
+        cache.delete_many([FormDisableLink.cacheKey(pk) for pk in ids])
+
+        # Report how many links were removed.
+        return removed
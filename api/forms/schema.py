@@ -0,0 +1,123 @@
+# Import dependencies.
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+
+class FormSchema:
+    """
+    Class that describes the inputs of a single form. This is everything we
+    need to know to validate and label a response to the form.
+    """
+
+    def __init__(self, inputs):
+        """
+        Constructor for the schema. Accepts the inputs of the form.
+        """
+
+        # Remember the details of every input by its name.
+        self.inputs = {input.name: {
+            'label': input.label,
+            'required': input.required,
+            'type': input.type,
+        } for input in inputs}
+
+    def label(self, name):
+        """
+        Method to get the label of an input. Falls back to the input's name if
+        it does not have a label.
+        """
+
+        # Use the label if the input has one.
+        return self.inputs[name]['label'] or name
+
+    def validate(self, responses):
+        """
+        Method to validate a response to the form. Returns the response with
+        all values as strings, in the order of the form's inputs. Raises a
+        ValidationError if the response does not fit the form.
+        """
+
+        # A response should map the names of inputs to their values.
+        if not isinstance(responses, dict):
+            raise ValidationError({'inputs': ["Expected a dictionary."]})
+
+        # Collect everything that is wrong with the response.
+        errors = {}
+
+        # We cannot accept values for inputs that the form does not have.
+        for name in responses:
+            if name not in self.inputs:
+                errors[name] = ["This input does not exist."]
+
+        # We need a value for all required inputs. Only a missing value or an
+        # empty string counts as no value, so zero and false are accepted.
+        for name, input in self.inputs.items():
+            if input['required'] and responses.get(name) in (None, ''):
+                errors[name] = ["This input is required."]
+
+        # Let the client know what is wrong.
+        if errors:
+            raise ValidationError(errors)
+
+        # Return all values that were provided.
+        return {name: str(responses[name]) for name in self.inputs
+                if responses.get(name) is not None}
+
+
+class FormSchemaCache:
+    """
+    Cache that keeps the schemas of the most recently used forms in this
+    process. A schema is only rebuilt when its form has been updated since.
+    """
+
+    def __init__(self, size=1024):
+        """
+        Constructor for the cache. Accepts the maximum number of schemas to
+        keep.
+        """
+
+        # Remember how many schemas we may keep.
+        self.size = size
+
+        # Keep the schemas in the order that they were last used.
+        self.schemas = OrderedDict()
+
+        # We need a lock to safely use the cache from multiple threads.
+        self.lock = threading.Lock()
+
+    def get(self, form):
+        """
+        Method to get the schema of a form.
+        """
+
+        with self.lock:
+
+            # Try to get the schema from the cache.
+            cached = self.schemas.get(form.pk)
+
+            # Use it if it is still up to date.
+            if cached is not None and cached[0] == form.updated:
+                self.schemas.move_to_end(form.pk)
+                return cached[1]
+
+        # Otherwise, build the schema with a single query.
+        schema = FormSchema(form.inputs.all())
+
+        with self.lock:
+
+            # Store the schema for the next response.
+            self.schemas[form.pk] = (form.updated, schema)
+            self.schemas.move_to_end(form.pk)
+
+            # Forget about the least recently used schemas if we have too many.
+            while len(self.schemas) > self.size:
+                self.schemas.popitem(last=False)
+
+        # Return the fresh schema.
+        return schema
+
+
+# Create a single cache that is shared by all views in this process.
+formSchemas = FormSchemaCache(size=settings.FORM_SCHEMA_CACHE_SIZE)
@@ -129,6 +129,9 @@ class FormLinkSerializer(LinkSerializer):
         fields = LinkSerializer.Meta.fields + [
             "form",
         ]
+        extra_kwargs = {
+            "form": { "required": True, "allow_null": False },
+        }
 
 
 class FormConfirmationLinkSerializer(LinkSerializer):
@@ -145,6 +148,9 @@ class FormConfirmationLinkSerializer(LinkSerializer):
         fields = LinkSerializer.Meta.fields + [
             "formLink",
         ]
+        extra_kwargs = {
+            "formLink": { "required": True, "allow_null": False },
+        }
 
 
 class FormDisableLinkSerializer(LinkSerializer):
@@ -161,6 +167,9 @@ class FormDisableLinkSerializer(LinkSerializer):
         fields = LinkSerializer.Meta.fields + [
             "formLink",
         ]
+        extra_kwargs = {
+            "formLink": { "required": True, "allow_null": False },
+        }
 
 
 class InputSerializer(TimeStampedSerializer):
@@ -0,0 +1,55 @@
+# Import dependencies.
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .cache import formLinkCache
+from .models import Form, FormLink, Input, Link
+
+
+def invalidateForm(formId):
+    """
+    Function to remove the details of all links to a form from the cache.
+    """
+
+    # Find the keys of all links to the form.
+    keys = FormLink.objects.filter(form_id=formId) \
+                           .values_list('key', flat=True)
+
+    # Remove their details from the cache.
+    formLinkCache.invalidate(keys)
+
+
+@receiver([post_save, post_delete], sender=Form)
+def formChanged(sender, instance, **kwargs):
+    """
+    Function that is called whenever a form is saved or deleted.
+    """
+
+    # The form's details are part of the details of all its links.
+    invalidateForm(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Input)
+def inputChanged(sender, instance, **kwargs):
+    """
+    Function that is called whenever an input is saved or deleted.
+    """
+
+    # The inputs are part of the form, so the form has been updated as well.
+    # Updating it directly does not trigger any signals for the form.
+    Form.objects.filter(pk=instance.form_id).update(updated=timezone.now())
+
+    # The inputs are part of the details of all links to their form.
+    invalidateForm(instance.form_id)
+
+
+@receiver([post_save, post_delete], sender=Link)
+@receiver([post_save, post_delete], sender=FormLink)
+def linkChanged(sender, instance, **kwargs):
+    """
+    Function that is called whenever a link is saved or deleted.
+    """
+
+    # Only form links have details in the cache.
+    if instance.type == FormLink.linkType:
+        formLinkCache.invalidate([instance.key])
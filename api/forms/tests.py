@@ -1,3 +1,404 @@
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from pymongo import monitoring
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from tools.Database import CommandCounter, documentsExamined
+from .models import (
+  Form, FormLink, FormConfirmationLink, FormDisableLink, Input, User
+)
+from .provisioning import FormProvisioner
+from .repository import formRepository
+from .schema import FormSchema
 
-# Create your tests here.
+# Record the commands that are sent to the database. Listeners only apply to
+# connections that are made after they're registered, so we have to register
+# before the test database is set up.
+commands = CommandCounter()
+monitoring.register(commands)
+
+
+class FormProvisionerTest(TestCase):
+    """
+    Tests for creating new forms.
+    """
+
+    # The maximum number of round trips to the database to create a form.
+    budget = 5
+
+    def test_creates_everything_a_form_needs(self):
+        """
+        A new form should have an owner, an input, and all of its links.
+        """
+
+        # Create a new form.
+        provisioned = FormProvisioner().provision(
+            'owner@example.com', 'Form', 'Description')
+
+        # Make sure that everything was stored.
+        form = Form.objects.get(pk=provisioned.form.pk)
+        self.assertEqual(form.user.email, 'owner@example.com')
+        self.assertEqual([input.name for input in form.inputs.all()],
+                         ['message'])
+        self.assertTrue(FormLink.objects.filter(
+            key=provisioned.link.key, form=form).exists())
+        self.assertTrue(FormConfirmationLink.objects.filter(
+            key=provisioned.confirmationLink.key).exists())
+        self.assertTrue(FormDisableLink.objects.filter(
+            key=provisioned.disableLink.key).exists())
+
+    def test_reuses_the_owner_and_numbers_names(self):
+        """
+        A second form with the same name for the same owner should get a
+        number, and should belong to the same user.
+        """
+
+        # Create two forms with the same name.
+        first = FormProvisioner().provision('owner@example.com', 'Form')
+        second = FormProvisioner().provision('owner@example.com', 'Form')
+
+        # Make sure that they share their owner, but not their name.
+        self.assertEqual(first.user.pk, second.user.pk)
+        self.assertEqual(second.form.name, 'Form(1)')
+
+    def test_round_trips(self):
+        """
+        Creating a form should take a fixed, small number of round trips.
+        """
+
+        # Create a form for an existing owner, to include the name lookup.
+        FormProvisioner().provision('owner@example.com', 'Form')
+
+        # Count the round trips it takes to create another form.
+        with commands.record() as recorded:
+            FormProvisioner().provision('owner@example.com', 'Form')
+
+        # Report the round trips that were made.
+        self.assertLessEqual(len(recorded), self.budget,
+                             f"{len(recorded)} round trips: {recorded}")
+
+    def test_removes_a_new_owner_when_it_fails(self):
+        """
+        A new owner should be removed again if its form could not be
+        created, while an existing owner should be kept.
+        """
+
+        # Create an owner that already has a form.
+        FormProvisioner().provision('owner@example.com', 'Form')
+
+        # Fail to store the links of new forms.
+        with mock.patch.object(FormProvisioner, 'links',
+                               side_effect=DatabaseError):
+            for email in ('owner@example.com', 'new@example.com'):
+                with self.assertRaises(DatabaseError):
+                    FormProvisioner().provision(email, 'Failing')
+
+        # Make sure that only the new owner and the failed forms are gone.
+        self.assertTrue(User.objects.filter(
+            email='owner@example.com').exists())
+        self.assertFalse(User.objects.filter(
+            email='new@example.com').exists())
+        self.assertFalse(Form.objects.filter(name='Failing').exists())
+
+
+class FormRepositoryTest(TestCase):
+    """
+    Tests for reading forms straight from the database.
+    """
+
+    def test_input_timestamps_without_timestamps(self):
+        """
+        Inputs that were stored without a timestamp should not stop us from
+        getting the timestamps of the others.
+        """
+
+        # Create a form with a second input, and remove the timestamp of the
+        # first input, like inputs that were stored before we had them.
+        provisioned = FormProvisioner().provision('owner@example.com', 'Form')
+        Input.objects.create(form=provisioned.form, name='extra')
+        formRepository.collection(Input).update_one(
+            {'form_id': provisioned.form.pk, 'name': 'message'},
+            {'$unset': {'updated': ''}})
+
+        # Make sure that the missing timestamp comes first.
+        timestamps = formRepository.inputTimestamps(provisioned.form.pk)
+        self.assertEqual(len(timestamps), 2)
+        self.assertIsNone(timestamps[0])
+        self.assertIsNotNone(timestamps[1])
+
+
+class FormSchemaTest(SimpleTestCase):
+    """
+    Tests for validating responses to forms.
+    """
+
+    def test_accepts_falsy_values_for_required_inputs(self):
+        """
+        Zero and false are values, so they should satisfy a required input.
+        """
+
+        # Describe a form with a single required input.
+        schema = FormSchema([Input(name='count', required=True)])
+
+        # Make sure that falsy values are accepted.
+        self.assertEqual(schema.validate({'count': 0}), {'count': '0'})
+        self.assertEqual(schema.validate({'count': False}),
+                         {'count': 'False'})
+
+    def test_requires_a_value_for_required_inputs(self):
+        """
+        A missing value or an empty string should not satisfy a required
+        input.
+        """
+
+        # Describe a form with a single required input.
+        schema = FormSchema([Input(name='count', required=True)])
+
+        # Make sure that those responses are refused.
+        for responses in ({}, {'count': None}, {'count': ''}):
+            with self.assertRaises(ValidationError):
+                schema.validate(responses)
+
+
+class ViewBudgetTest(TestCase):
+    """
+    Tests that every endpoint stays within its budget of commands that it
+    sends to the database, and of documents that the database examines to run
+    them. Raise a budget only when an endpoint really needs more work.
+    """
+
+    # The maximum number of commands and examined documents per endpoint.
+    budgets = {
+
+        # Store the owner, the form, its inputs, its links and its email.
+        'create': (6, 2),
+
+        # Get the link, the form and the timestamps and details of its inputs.
+        'link': (4, 4),
+
+        # Get the link, the form and the timestamps of its inputs to check the
+        # version of the cached details.
+        'cachedLink': (3, 3),
+
+        # Get the link, its form, its inputs and its owner, and store the
+        # email.
+        'response': (5, 4),
+
+        # Get the confirmation link, its form link and its form, check the
+        # form's name, store the form, clear the cache of its links, and get
+        # and store its owner.
+        'confirm': (8, 8),
+
+        # Get the disable link, its form link and its form, check the form's
+        # name, store the form and clear the cache of its links.
+        'disable': (6, 6),
+
+        # Get the form, and the names of its inputs and the keys of its links.
+        # The serializer looks up every relation with a command of its own.
+        'form': (3, 3),
+
+        # Get the token with its account, and every form link. Links are not
+        # filtered by their type with an index, so every link is examined.
+        'formLinks': (2, 5),
+
+        # Get the token with its account, and the form link by its key.
+        'formLink': (2, 3),
+
+        # Get every input.
+        'inputs': (1, 1),
+
+        # Get the input.
+        'input': (1, 1),
+    }
+
+    def setUp(self):
+        """
+        Create a form to use the endpoints with.
+        """
+
+        # Every test gets a fresh form, so that nothing is cached yet.
+        self.provisioned = FormProvisioner().provision(
+            'budget@example.com', 'Budget')
+
+        # Some endpoints only work for an account with a token.
+        account = get_user_model().objects.create_user('budget')
+        self.token = Token.objects.create(user=account)
+
+    def authenticated(self):
+        """
+        Get the headers that authenticate a request with the token.
+        """
+
+        # The token is sent the way the REST framework expects it.
+        return {'HTTP_AUTHORIZATION': f"Token {self.token.key}"}
+
+    def confirm(self):
+        """
+        Confirm the form without using the endpoint.
+        """
+
+        # Update the form directly.
+        Form.objects.filter(pk=self.provisioned.form.pk) \
+                    .update(confirmed=timezone.now())
+
+    def assertWithinBudget(self, endpoint, request):
+        """
+        Send a request and make sure that it stays within the budget of its
+        endpoint. Returns the response.
+        """
+
+        # Record every command that the request sends.
+        with commands.record() as recorded:
+            response = request()
+
+        # Ask the database how much work those commands were.
+        examined = documentsExamined(recorded)
+
+        # Report the commands that were sent when a budget is exceeded.
+        queries, documents = self.budgets[endpoint]
+        self.assertLessEqual(len(recorded), queries,
+                             f"{endpoint}: {len(recorded)} commands: "
+                             f"{recorded}")
+        self.assertLessEqual(examined, documents,
+                             f"{endpoint}: {examined} documents examined "
+                             f"by {recorded}")
+        return response
+
+    def test_create(self):
+        """
+        Creating a form should stay within its budget.
+        """
+
+        # Create a form for a new owner.
+        response = self.assertWithinBudget('create', lambda: self.client.post(
+            '/api/forms/', {'email': 'new@example.com', 'name': 'Budget'},
+            content_type='application/json'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_link(self):
+        """
+        Getting the details of a form link that are not cached yet should
+        stay within its budget.
+        """
+
+        # Get the details of the form.
+        response = self.assertWithinBudget('link', lambda: self.client.get(
+            f"/api/forms/link/{self.provisioned.link.key}"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_link(self):
+        """
+        Getting the details of a form link that are cached should stay within
+        its budget.
+        """
+
+        # Get the details of the form once, so that they're cached.
+        path = f"/api/forms/link/{self.provisioned.link.key}"
+        self.client.get(path)
+
+        # Get the details again.
+        response = self.assertWithinBudget('cachedLink',
+                                           lambda: self.client.get(path))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_response(self):
+        """
+        Responding to a form should stay within its budget.
+        """
+
+        # Only confirmed forms accept responses.
+        self.confirm()
+
+        # Respond to the form.
+        data = {'link': self.provisioned.link.key,
+                'inputs': {'message': "Budget"}}
+        response = self.assertWithinBudget(
+            'response', lambda: self.client.post(
+                '/api/forms/response/', data, content_type='application/json'))
+        self.assertEqual(response.json(), True)
+
+    def test_confirm(self):
+        """
+        Confirming a form should stay within its budget.
+        """
+
+        # Confirm the form.
+        response = self.assertWithinBudget('confirm', lambda: self.client.get(
+            f"/api/forms/confirm/{self.provisioned.confirmationLink.key}"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_disable(self):
+        """
+        Disabling a form should stay within its budget.
+        """
+
+        # Disable the form.
+        response = self.assertWithinBudget('disable', lambda: self.client.get(
+            f"/api/forms/disable/{self.provisioned.disableLink.key}"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_form(self):
+        """
+        Getting a form should stay within its budget.
+        """
+
+        # Get the form.
+        response = self.assertWithinBudget('form', lambda: self.client.get(
+            f"/api/forms/{self.provisioned.form.pk}"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['links'],
+                         [self.provisioned.link.key])
+
+    def test_form_links(self):
+        """
+        Listing form links should stay within its budget.
+        """
+
+        # List the form links.
+        response = self.assertWithinBudget(
+            'formLinks', lambda: self.client.get(
+                '/api/links/', **self.authenticated()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([link['key'] for link in response.json()],
+                         [self.provisioned.link.key])
+
+    def test_form_link(self):
+        """
+        Getting a form link should stay within its budget.
+        """
+
+        # Get the form link.
+        response = self.assertWithinBudget(
+            'formLink', lambda: self.client.get(
+                f"/api/links/{self.provisioned.link.key}",
+                **self.authenticated()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['form'],
+                         str(self.provisioned.form.pk))
+
+    def test_inputs(self):
+        """
+        Listing inputs should stay within its budget.
+        """
+
+        # List the inputs.
+        response = self.assertWithinBudget('inputs', lambda: self.client.get(
+            '/api/inputs/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([input['name'] for input in response.json()],
+                         ['message'])
+
+    def test_input(self):
+        """
+        Getting an input should stay within its budget.
+        """
+
+        # Get the input of the form.
+        input = Input.objects.get(form=self.provisioned.form.pk)
+        response = self.assertWithinBudget('input', lambda: self.client.get(
+            f"/api/inputs/{input.pk}"))
+        self.assertEqual(response.status_code, 200)
@@ -1,16 +1,26 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# The public endpoints that every visitor of a form uses can be served
+# asynchronously.
+if settings.ASYNC_VIEWS:
+    responseView = views.AsyncFormResponseView.as_view()
+    linkView = views.AsyncFormLinkView.as_view()
+else:
+    responseView = views.FormResponseView.as_view()
+    linkView = views.FormLinkView.as_view()
+
 # This is where we list our API endpoints.
 urlpatterns = [
     path("forms/", views.FormListView.as_view()),
-    path("forms/response/", views.FormResponseView.as_view()),
-    path("forms/<int:pk>", views.FormDetailView.as_view()),
-    path("forms/link/<key>", views.FormLinkView.as_view()),
+    path("forms/response/", responseView),
+    path("forms/<pk>", views.FormDetailView.as_view()),
+    path("forms/link/<key>", linkView),
     path("forms/confirm/<key>", views.FormConfirmationView.as_view()),
     path("forms/disable/<key>", views.FormDisableView.as_view()),
     path("links/", views.FormLinkListView.as_view()),
     path("links/<key>", views.FormLinkDetailView.as_view()),
     path("inputs/", views.InputListView.as_view()),
-    path("inputs/<int:pk>", views.InputDetailView.as_view()),
+    path("inputs/<pk>", views.InputDetailView.as_view()),
 ]
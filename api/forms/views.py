@@ -1,20 +1,33 @@
 # Import dependencies.
+import calendar
+import hashlib
 import json
 import os
 import datetime
-import re
 from html import escape
+from django.conf import settings
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponseRedirect, Http404
+from django.http import (
+  HttpResponse, HttpResponseRedirect, Http404, JsonResponse
+)
 from rest_framework import (
   generics, permissions, response
 )
+from rest_framework.exceptions import APIException, ParseError
 from tools.Mail import (
   FormConfirmationMail, FormResponseMail
 )
+from tools.Json import dumps, loads
+from tools.Offload import offloader
+from .cache import formLinkCache
+from .provisioning import formProvisioner
+from .repository import formRepository
+from .schema import formSchemas
 from .models import (
-  User, Form, FormLink, FormConfirmationLink, FormDisableLink, Input
+  Form, FormLink, FormConfirmationLink, FormDisableLink, Input
 )
 from .serializers import (
   UserSerializer, FormSerializer, FormLinkSerializer, InputSerializer
@@ -29,112 +42,61 @@ class FormListView(generics.CreateAPIView):
     # Everyone can create forms.
     permission_classes = [permissions.AllowAny]
 
-    def uniqueFormname(self, name, user):
-        """
-        Make sure that a form name is unique.
-        """
-
-        # We may have to try getting a unique name multiple times.
-        while True:
-
-            # First check if this form name is already for this user.
-            if (not Form.objects.filter(name=name, user=user).exists()):
-
-                # If so, simply return it.
-                return name
-
-            # Regex to find the number in a name. We assume that this number
-            # has a format of '(0)' and is at the end of the name.
-            regex = r'(?<=\()\d+(?=\)$)'
-
-            # Check if the name already ends in a number.
-            match = re.search(regex, name)
-
-            # Did we find a number?
-            if match:
-
-                # Extract the number, convert to integer and add 1.
-                newNumber = int(match.group(0), base=10) + 1
-
-                # Insert the new number into the name.
-                name = re.sub(regex, str(newNumber), name)
-
-            # Otherwise, we need to add a number.
-            else:
-                name += '(1)'
-
     def post(self, request):
         """
         Create a new form.
         """
 
-        # Create a serializer for the user.
-        userSerializer = UserSerializer(data={
-            'email': request.data['email']
-        })
-
-        # If the serializer is valid, that means that a user with this email
-        # address does not yet exist.
-        if userSerializer.is_valid():
-
-            # We should create the user if we don't have it yet.
-            user = userSerializer.save()
-
-        # Get access to the user object.
-        user = get_object_or_404(User, email=request.data['email'])
-
-        # Create a new form.
-        formSerializer = FormSerializer(data={
-            'user': user.pk,
+        # Create the form with everything it needs.
+        provisioned = formProvisioner.provision(
+            email=request.data['email'],
+            name=request.data['name'],
+            description=request.data.get('description'),
+        )
 
-            # Make sure that the form's name is unique.
-            'name': self.uniqueFormname(request.data['name'], user),
-            'description': request.data['description']
-        })
+        # Send a confirmation email.
+        FormConfirmationMail().send(provisioned.user, provisioned.link,
+                                    provisioned.confirmationLink)
 
-        # If it is not a valid form request, let the client know.
-        formSerializer.is_valid(raise_exception=True)
+        # Send the link back to the client.
+        return response.Response(provisioned.link.key)
 
-        # Store the new form.
-        form = formSerializer.save()
 
-        # Add a message input to the form.
-        # @todo: We currently only support this input field, but we can make
-        # this app much more powerful when we don't!
-        inputSerializer = InputSerializer(data={
-            'name': "message",
-            'label': "Message",
-            'hint': "Add a message to send to the owner of this form.",
-            'required': True,
-            'type': 'textarea',
-            'form': form.pk
-        })
+class FormResponder:
+    """
+    Mixin for the endpoints that process a form response.
+    """
 
-        # If it is not a input form request, let the client know.
-        inputSerializer.is_valid(raise_exception=True)
+    def respond(self, key, inputs):
+        """
+        Process a response to the form behind a form link. Returns whether the
+        response was sent to the owner of the form.
+        """
 
-        # Otherwise, store it.
-        inputSerializer.save()
+        # Get the form.
+        formLink = get_object_or_404(FormLink, key=key)
 
-        # Create a new link for this form.
-        formLinkSerializer = FormLinkSerializer(data={
-            'form': form.pk
-        })
+        # Check if the owner has confirmed this form. We should not yet be
+        # sending responses if the form is not confirmed.
+        if type(formLink.form.confirmed) is not datetime.datetime:
+            return False
 
-        # If we cannot create a link, let the client know.
-        formLinkSerializer.is_valid(raise_exception=True)
+        # Check if the owner has disabled the form. We should no longer be
+        # sending responses if the form has been disabled.
+        if formLink.form.disabled:
+            return False
 
-        # Otherwise, store the link.
-        link = formLinkSerializer.save()
+        # Make sure that the response fits the form.
+        responses = formSchemas.get(formLink.form).validate(inputs)
 
-        # Send a confirmation email.
-        FormConfirmationMail().send(user, link)
+        # Send the response to the owner of the form.
+        FormResponseMail().send(formLink, responses)
 
-        # Send the link back to the client.
-        return response.Response(link.key)
+        # Let the caller know that the response was sent.
+        return True
 
 
-class FormResponseView(generics.CreateAPIView):
+class FormResponseView(FormResponder, generics.CreateAPIView):
     """
     This is the endpoint that processes a form response.
     """
@@ -147,24 +109,9 @@ class FormResponseView(generics.CreateAPIView):
         Respond to a form.
         """
 
-        # Get the form.
-        formLink = get_object_or_404(FormLink, key=request.data['link'])
-
-        # Check if the owner has confirmed this form. We should not yet be
-        # sending responses if the form is not confirmed.
-        if type(formLink.form.confirmed) is not datetime.datetime:
-            return response.Response(False)
-
-        # Check if the owner has disabled the form. We should no longer be
-        # sending responses if the form has been disabled.
-        if formLink.form.disabled:
-            return response.Response(False)
-
-        # Send the response to the owner of the form.
-        FormResponseMail().send(formLink, request.data['inputs'])
-
-        # Send back a success message.
-        return response.Response(True)
+        # Process the response, and let the client know if it was sent.
+        return response.Response(self.respond(request.data['link'],
+                                              request.data.get('inputs')))
 
 
 class FormConfirmationView(generics.RetrieveAPIView):
@@ -316,11 +263,155 @@ class FormLinkDetailView(generics.RetrieveUpdateDestroyAPIView):
     # We're using the Link serializer.
     serializer_class = FormLinkSerializer
 
+    # Links are found by their key.
+    lookup_field = 'key'
+
     # Only the user that owns them can modify them.
     permission_classes = [permissions.IsAuthenticated]
 
 
-class FormLinkView(generics.RetrieveAPIView):
+class FormLinkDetails:
+    """
+    Mixin for the endpoints that retrieve the details of a form link.
+    """
+
+    def validators(self, key):
+        """
+        Get the values that tell if a form link's details have changed. Only
+        looks at the moments that the link, its form and its inputs were last
+        updated.
+
+        This runs for every request, even when the details are in the cache,
+        so a cache hit only saves getting the inputs and building the details.
+        That is deliberate: every process keeps its own cache by default, and
+        the signals that clear it only reach the process that made a change.
+        Checking the version in the database makes sure that no process serves
+        the details of a form that changed elsewhere, or of a link that the
+        janitor removed.
+        """
+
+        # Get the link straight from the database.
+        link = formRepository.link(key, FormLink.linkType)
+
+        # There is nothing to validate if the link does not exist.
+        if link is None:
+            return None
+
+        # Get the form's state straight from the database.
+        form = formRepository.form(link.form)
+
+        # There is nothing to validate if the form does not exist.
+        if form is None:
+            return None
+
+        # Get the moments that the inputs were last updated. Removing an input
+        # does not update any of the others, so we need to count them too.
+        inputs = formRepository.inputTimestamps(link.form)
+
+        # Find the last moment that anything changed.
+        moments = [link.updated, form.updated] + inputs
+        modified = max((calendar.timegm(moment.utctimetuple())
+                        for moment in moments if moment is not None),
+                       default=0)
+
+        # Construct a tag that changes whenever anything changes.
+        fingerprint = ':'.join(str(moment) for moment in moments + [
+            link.expires, len(inputs)
+        ])
+        etag = quote_etag(hashlib.sha1(fingerprint.encode()).hexdigest())
+
+        # Return all values, with the link and the form so that we don't have
+        # to get them again.
+        return {'expires': link.expires, 'etag': etag, 'modified': modified,
+                'link': link, 'form': form}
+
+    def details(self, link, form):
+        """
+        Build the details of a form link that we can keep in the cache.
+        """
+
+        # Construct the response object. Make sure we escape all user generated
+        # strings.
+        payload = {
+
+            # Add the form's name.
+            'name': escape(form.name),
+
+            # Add the form's description.
+            'description': escape(form.description or ''),
+
+            # Pass on if the form's been disabled.
+            'disabled': form.disabled,
+
+            # Pass on if the form's been confirmed yet.
+            'confirmed': type(form.confirmed) is datetime.datetime,
+
+            # We need to know all inputs.
+            'inputs': [{
+                'name': escape(input.name),
+                'label': escape(input.label or ''),
+                'hint': escape(input.hint or ''),
+                'required': input.required,
+                'type': escape(input.type),
+            } for input in formRepository.inputs(form.id)]
+        }
+
+        # We need to know when the link expires to check if we can still
+        # use it.
+        return {'expires': link.expires, 'payload': payload}
+
+    def entry(self, key, validators):
+        """
+        Get the details of a form link, from the cache if we can. Returns the
+        details and whether they came from the cache.
+        """
+
+        # Build the details only if the cache does not have this version.
+        entry, hit = formLinkCache.get(
+            key,
+            lambda key: self.details(validators['link'], validators['form']),
+            version=validators['etag'],
+        )
+
+        # The link may have been removed in the meantime.
+        if entry is None:
+            raise Http404
+
+        # Return the details.
+        return entry, hit
+
+    def payload(self, entry):
+        """
+        Get the details of a form link in the shape that the client expects.
+        """
+
+        # Older clients expect the details to be encoded twice.
+        if settings.FORM_LINK_LEGACY_JSON:
+            return json.dumps(entry['payload'])
+
+        # Otherwise, we can simply send the details.
+        return entry['payload']
+
+    def cacheable(self, result, validators):
+        """
+        Add the headers to a response that tell the client and the proxy how
+        to cache the details of a form link.
+        """
+
+        # Tell the client and the proxy how to check if the details changed.
+        result['ETag'] = validators['etag']
+        result['Last-Modified'] = http_date(validators['modified'])
+
+        # Tell the client and the proxy how long they may use the details
+        # before they should check again.
+        patch_cache_control(result, public=True,
+                            max_age=settings.FORM_LINK_MAX_AGE)
+
+        # Return the response.
+        return result
+
+
+class FormLinkView(FormLinkDetails, generics.RetrieveAPIView):
     """
     This is the endpoint that allows for retrieving individual form links.
     """
@@ -339,42 +430,175 @@ class FormLinkView(generics.RetrieveAPIView):
         Get the details from a form link.
         """
 
-        # Get the link object.
-        formLink = get_object_or_404(FormLink, key=key)
+        # Find out when the link's details last changed. This is much cheaper
+        # than getting the details themselves.
+        validators = self.validators(key)
+
+        # Let the client know if the link does not exist.
+        if validators is None:
+            raise Http404
 
         # Check if the link has expired.
-        if formLink.hasExpired():
+        if validators['expires'] < timezone.now():
             return HttpResponseRedirect(redirect_to=
                 f"{os.getenv('CLIENT_URL')}/error/expired")
 
-        # Construct the response object. Make sure we escape all user generated
-        # strings.
-        result = {
+        # If the client already has the latest details, we can tell it to use
+        # those.
+        result = get_conditional_response(
+            request,
+            etag=validators['etag'],
+            last_modified=validators['modified'],
+        )
 
-            # Add the form's name.
-            'name': escape(formLink.form.name),
+        # Otherwise, get the link's details, from the cache if we can.
+        if result is None:
+            entry, hit = self.entry(key, validators)
 
-            # Add the form's description.
-            'description': escape(formLink.form.description),
+            # Return the dictionary as a JSON object.
+            result = response.Response(self.payload(entry))
 
-            # Pass on if the form's been disabled.
-            'disabled': formLink.form.disabled,
+            # Let the client know if the details came from the cache.
+            result['X-Cache'] = 'HIT' if hit else 'MISS'
 
-            # Pass on if the form's been confirmed yet.
-            'confirmed': type(formLink.form.confirmed) is datetime.datetime,
+        # Tell the client and the proxy how to cache the details.
+        return self.cacheable(result, validators)
 
-            # We need to know all inputs.
-            'inputs': [{
-                'name': escape(input.name),
-                'label': escape(input.label),
-                'hint': escape(input.hint),
-                'required': input.required,
-                'type': escape(input.type),
-            } for input in formLink.form.inputs.all()]
-        }
 
-        # Return the dictionary as a JSON object.
-        return response.Response(json.dumps(result))
+class AsyncView:
+    """
+    Base class for endpoints that handle requests asynchronously. All work
+    that blocks, like talking to the database, is handed to a bounded pool of
+    threads, so that a single process can wait for many requests at once.
+    These endpoints answer errors the same way as our other endpoints.
+    """
+
+    @classmethod
+    def as_view(cls):
+        """
+        Method to get the function that handles requests for this endpoint.
+        """
+
+        async def view(request, *args, **kwargs):
+            """
+            Function that handles a single request.
+            """
+
+            # Every request gets its own instance of the endpoint.
+            return await cls().dispatch(request, *args, **kwargs)
+
+        # These endpoints are public and do not use sessions, so there is
+        # nothing to protect from cross-site requests.
+        view.csrf_exempt = True
+
+        # Return the function.
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Method to handle a request with the method for its HTTP method.
+        """
+
+        # Find the method that handles this type of request.
+        handler = getattr(self, request.method.lower(), None)
+        if handler is None:
+            return JsonResponse(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status=405)
+
+        # Handle the request.
+        try:
+            return await handler(request, *args, **kwargs)
+
+        # Let the client know if something does not exist.
+        except Http404:
+            return JsonResponse({'detail': "Not found."}, status=404)
+
+        # Let the client know what is wrong with the request.
+        except APIException as error:
+            detail = error.detail
+            if not isinstance(detail, (dict, list)):
+                detail = {'detail': detail}
+            return JsonResponse(detail, status=error.status_code, safe=False)
+
+    def data(self, request):
+        """
+        Method to get the JSON data that was sent with a request.
+        """
+
+        # Try to read the data.
+        try:
+            return loads(request.body or b'{}')
+
+        # Let the client know if it did not send valid JSON.
+        except ValueError as error:
+            raise ParseError(f"JSON parse error - {error}")
+
+
+class AsyncFormResponseView(FormResponder, AsyncView):
+    """
+    This is the endpoint that processes a form response asynchronously.
+    """
+
+    async def post(self, request):
+        """
+        Respond to a form.
+        """
+
+        # Get the response.
+        data = self.data(request)
+
+        # Process the response in the background, and let the client know if
+        # it was sent. The email itself is delivered in the background too.
+        return JsonResponse(await offloader.run(self.respond,
+                                                data.get('link'),
+                                                data.get('inputs')),
+                            safe=False)
+
+
+class AsyncFormLinkView(FormLinkDetails, AsyncView):
+    """
+    This is the endpoint that retrieves individual form links asynchronously.
+    """
+
+    async def get(self, request, key):
+        """
+        Get the details from a form link.
+        """
+
+        # Find out when the link's details last changed.
+        validators = await offloader.run(self.validators, key)
+
+        # Let the client know if the link does not exist.
+        if validators is None:
+            raise Http404
+
+        # Check if the link has expired.
+        if validators['expires'] < timezone.now():
+            return HttpResponseRedirect(redirect_to=
+                f"{os.getenv('CLIENT_URL')}/error/expired")
+
+        # If the client already has the latest details, we can tell it to use
+        # those.
+        result = get_conditional_response(
+            request,
+            etag=validators['etag'],
+            last_modified=validators['modified'],
+        )
+
+        # Otherwise, get the link's details, from the cache if we can.
+        if result is None:
+            entry, hit = await offloader.run(self.entry, key, validators)
+
+            # Return the dictionary as a JSON object.
+            result = HttpResponse(dumps(self.payload(entry)),
+                                  content_type='application/json')
+
+            # Let the client know if the details came from the cache.
+            result['X-Cache'] = 'HIT' if hit else 'MISS'
+
+        # Tell the client and the proxy how to cache the details.
+        return self.cacheable(result, validators)
 
 
 class InputListView(generics.ListCreateAPIView):
@@ -0,0 +1,124 @@
+################################################################################
+#
+#   Gunicorn
+#     This is the file that configures the application server that serves the
+#     API in production. Gunicorn reads it automatically when it is started from
+#     this directory. Every setting can be tuned through environment variables.
+#
+################################################################################
+
+# Import dependencies.
+import multiprocessing
+import os
+
+# Serve the API at port 3000.
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:3000")
+
+# Run several processes so that we can use every core. By default, we use the
+# usual recommendation of two processes per core plus one.
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+
+# Every process handles several requests at once in threads, as most of the
+# time is spent waiting for the database. This type of worker is also needed
+# to keep connections alive. When the public endpoints are served
+# asynchronously, every process handles requests in an event loop instead.
+if os.getenv("ASYNC_VIEWS") == "True":
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Load the application once before forking the processes, so that every
+# process shares the same memory and starts serving right away. Note that a
+# reload only restarts the processes from the already loaded application, so
+# code changes require a restart when this is enabled.
+preload_app = os.getenv("GUNICORN_PRELOAD", "True") == "True"
+
+# The number of seconds to keep a connection from the proxy open while waiting
+# for its next request. This should be longer than the proxy keeps its unused
+# connections around, so that the proxy never reuses a connection that we've
+# just closed.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 75))
+
+# Replace every process after it has handled this many requests, to limit the
+# effect of any slow memory leaks. The jitter makes sure that not all processes
+# are replaced at the same time.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# The number of seconds a request may take before its process is replaced.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+# The number of seconds a process gets to finish its requests when it is
+# replaced, for example after a reload with SIGHUP.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# Write the access and error logs to the console.
+accesslog = "-"
+errorlog = "-"
+
+
+def pre_fork(server, worker):
+    """
+    Function that runs in the main process before every worker is forked.
+    Connections cannot be shared with a forked process, so we should not keep
+    any open connections that the worker could inherit.
+    """
+
+    # Only the preloaded application could have opened any connections.
+    if not server.cfg.preload_app:
+        return
+
+    # Close all database connections. Every process opens its own.
+    from django.db import connections
+    from tools.Database import sharedClient
+    connections.close_all()
+    sharedClient.close()
+
+
+def post_fork(server, worker):
+    """
+    Function that runs in every worker right after it was forked, before it
+    accepts any requests. Makes sure that the worker is warmed up, so that
+    the proxy only reaches workers that are ready.
+    """
+
+    # Only a preloaded application has not warmed up this worker yet.
+    if not server.cfg.preload_app:
+        return
+
+    # Connect to the database before the first request comes in.
+    from tools.Startup import warmup
+    warmup.warm()
+
+
+def child_exit(server, worker):
+    """
+    Function that runs in the main process whenever a worker has exited.
+    Makes sure that the metrics of processes that no longer exist are not
+    reported as if they were still running.
+    """
+
+    # Only metrics that are shared between processes need to be cleaned up.
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return
+
+    # Mark the worker as gone.
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """
+    Function that runs in a worker right before it exits. Gives the emails
+    that are still queued in this process a chance to be handed over to the
+    mail server, and the work of async views a chance to finish.
+    """
+
+    # Let the threads of async views finish their work.
+    from tools.Offload import offloader
+    offloader.shutdown()
+
+    # Stop the senders once they've delivered everything that was queued.
+    from tools.Mail import mailQueue
+    mailQueue.stop(timeout=server.cfg.graceful_timeout)
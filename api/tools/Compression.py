@@ -0,0 +1,25 @@
+# Import dependencies.
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class ThresholdGZipMiddleware(GZipMiddleware):
+    """
+    Middleware that compresses responses, but only when they are large enough
+    for compression to be worth the time it takes. Small responses fit in a
+    single network packet either way.
+    """
+
+    def process_response(self, request, response):
+        """
+        Method to compress a response if it is large enough.
+        """
+
+        # Leave small responses alone. Streams are always compressed, as we
+        # don't know their size.
+        if not response.streaming and \
+                len(response.content) < settings.GZIP_MIN_SIZE:
+            return response
+
+        # Otherwise, compress the response.
+        return super().process_response(request, response)
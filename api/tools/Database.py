@@ -0,0 +1,303 @@
+# Import dependencies.
+import contextvars
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from pymongo import MongoClient, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# This is the error code MongoDB uses when a write violates a unique index.
+DUPLICATE_KEY = 11000
+
+
+def database():
+    """
+    Function to get direct access to the MongoDB database that Django uses.
+    """
+
+    # Make sure that Django is connected to the database.
+    connection.ensure_connection()
+
+    # Djongo's connection is the database itself.
+    return connection.connection
+
+
+class SharedClient:
+    """
+    Class that keeps a single client for the database that is shared by all
+    threads in a process. Django gives every thread its own connection, while
+    the database driver can safely share a single pool of connections.
+    """
+
+    def __init__(self, alias='default'):
+        """
+        Constructor for the shared client. Accepts the name of the database in
+        Django's settings.
+        """
+
+        # Remember which database we should connect to.
+        self.alias = alias
+
+        # We need a lock to make sure that we only connect once.
+        self.lock = threading.Lock()
+
+        # We have not connected yet.
+        self.client = None
+        self.pid = None
+
+    def database(self):
+        """
+        Method to get the shared database.
+        """
+
+        with self.lock:
+
+            # A client cannot be shared with a forked process, so every process
+            # needs its own client.
+            if self.pid != os.getpid():
+                self.client = MongoClient(
+                    **settings.DATABASES[self.alias]['CLIENT'])
+                self.pid = os.getpid()
+
+        # Return the database that Django uses.
+        return self.client[settings.DATABASES[self.alias]['NAME']]
+
+    def close(self):
+        """
+        Method to close the shared client, for example before forking. The
+        next process to use it will connect again.
+        """
+
+        with self.lock:
+
+            # Only close a client that this process opened.
+            if self.client is not None and self.pid == os.getpid():
+                self.client.close()
+
+            # Forget about the client.
+            self.client = None
+            self.pid = None
+
+
+# Create a single client that is shared by all threads in this process.
+sharedClient = SharedClient()
+
+
+def isDuplicateKey(error, field=None):
+    """
+    Function to check if an error was caused by a write that violated a unique
+    index. Djongo wraps the errors from the database driver, so we follow the
+    chain of causes to find the original error. Optionally accepts the name of
+    a field to check if that field's unique index was violated.
+    """
+
+    # Follow the chain of errors until we find the database driver's error.
+    while error is not None:
+
+        # A single write can fail with a duplicate key error.
+        if isinstance(error, DuplicateKeyError):
+            details = [error.details or {}]
+
+        # Djongo writes in bulk, which reports every write that failed.
+        elif isinstance(error, BulkWriteError):
+            details = [write for write in error.details.get('writeErrors', [])
+                       if write.get('code') == DUPLICATE_KEY]
+
+        # Any other error could have been caused by another error.
+        else:
+            error = error.__cause__ or error.__context__
+            continue
+
+        # Check if any of the failed writes violated the right index.
+        return any(violates(write, field) for write in details)
+
+    # We did not find a duplicate key error.
+    return False
+
+
+def violates(write, field=None):
+    """
+    Function to check if a failed write violated the unique index of a field.
+    """
+
+    # Any unique index will do if we're not looking for a specific field.
+    if field is None:
+        return True
+
+    # The database tells us which fields were part of the violated index.
+    if write.get('keyPattern'):
+        return field in write['keyPattern']
+
+    # Older servers only mention the name of the index in the error message.
+    index = str(write.get('errmsg', '')).partition(' index: ')[2]
+    return field in index.split(' ')[0]
+
+
+def instance(model, document):
+    """
+    Function to construct a model instance from a document that we've read
+    from the database directly.
+    """
+
+    # Get the value of every field from the document.
+    fields = model._meta.concrete_fields
+    values = [document.get(field.column) for field in fields]
+
+    # The database driver does not know about time zones, but Django does.
+    if settings.USE_TZ:
+        values = [timezone.make_aware(value, timezone.utc)
+                  if isinstance(value, datetime) and timezone.is_naive(value)
+                  else value for value in values]
+
+    # Let Django construct the instance as if it read it itself.
+    return model.from_db(connection.alias,
+                         [field.attname for field in fields], values)
+
+
+# The commands that read documents, which the database can explain.
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'findAndModify',
+               'update', 'delete'}
+
+# The fields that the driver adds to commands, which explain does not accept.
+DRIVER_FIELDS = {'$db', '$clusterTime', '$readPreference', 'lsid',
+                 'txnNumber', 'readConcern', 'writeConcern'}
+
+
+class Command(namedtuple('Command', ['name', 'collection', 'database',
+                                     'document'])):
+    """
+    A single command that was sent to the database.
+    """
+
+    def __repr__(self):
+        """
+        Converts the command to a short string representation.
+        """
+
+        # The name and the collection tell most commands apart.
+        return f"{self.name}:{self.collection}"
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Listener that records every command that is sent to the database, so that
+    we can tell how many round trips some code makes. Only records commands
+    from the code that is recording, including the work that it hands to the
+    offload threads.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the listener.
+        """
+
+        # Every context records its own commands. Copies of the context, like
+        # the ones that the offloader uses, add to the same list.
+        self.commands = contextvars.ContextVar('commands', default=None)
+
+    @contextmanager
+    def record(self):
+        """
+        Method to record all commands that are sent while the context is open.
+        Provides a list that is filled with every command that was sent.
+        """
+
+        # Start with an empty list of commands.
+        commands = []
+        token = self.commands.set(commands)
+
+        # Record commands until the context is closed.
+        try:
+            yield commands
+        finally:
+            self.commands.reset(token)
+
+    def started(self, event):
+        """
+        Method that is called whenever a command is sent to the database.
+        """
+
+        # Only record commands while we're recording.
+        commands = self.commands.get()
+        if commands is None:
+            return
+
+        # Remember the command, the collection it was sent to, and the command
+        # itself so that it can be explained later.
+        commands.append(Command(event.command_name,
+                                event.command.get(event.command_name),
+                                event.database_name, dict(event.command)))
+
+    def succeeded(self, event):
+        """
+        Method that is called whenever a command succeeds.
+        """
+
+    def failed(self, event):
+        """
+        Method that is called whenever a command fails.
+        """
+
+
+def docsExamined(explained):
+    """
+    Function to count the documents examined in the output of explain, which
+    nests the statistics of every stage it runs.
+    """
+
+    # Use the statistics of the whole plan if we find them.
+    if isinstance(explained, dict):
+        statistics = explained.get('executionStats')
+        if isinstance(statistics, dict) and \
+                'totalDocsExamined' in statistics:
+            return statistics['totalDocsExamined']
+
+        # Otherwise, look at every stage.
+        return sum(docsExamined(value) for value in explained.values())
+
+    # Lists of stages are counted together.
+    if isinstance(explained, list):
+        return sum(docsExamined(value) for value in explained)
+
+    # Anything else has nothing to count.
+    return 0
+
+
+def documentsExamined(commands):
+    """
+    Function to ask the database how many documents it examines to run a list
+    of recorded commands. The commands are explained after they ran, so writes
+    are measured against the documents as they are now.
+    """
+
+    # Only commands that read documents can be explained.
+    total = 0
+    client = database().client
+    for command in commands:
+        if command.name not in EXPLAINABLE:
+            continue
+
+        # Leave out everything that the driver added.
+        document = {field: value for field, value in command.document.items()
+                    if field not in DRIVER_FIELDS}
+
+        # Explain can only handle a single update or delete at once, so we
+        # split them up.
+        statements = {'update': 'updates', 'delete': 'deletes'}.get(
+            command.name)
+        documents = [{**document, statements: [statement]}
+                     for statement in document[statements]] \
+            if statements else [document]
+
+        # Ask the database how much work the command is.
+        for each in documents:
+            total += docsExamined(client[command.database].command(
+                'explain', each, verbosity='executionStats'))
+
+    # Return the total for all commands.
+    return total
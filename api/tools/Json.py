@@ -0,0 +1,146 @@
+# Import dependencies.
+import codecs
+import json
+from bson import ObjectId
+from django.conf import settings
+from rest_framework import encoders, parsers, renderers
+from rest_framework.exceptions import ParseError
+
+# Use the much faster orjson library when it is installed. Otherwise, we fall
+# back to the standard library.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Some characters are valid in JSON, but not in JavaScript. We always escape
+# them, just like the default renderer does.
+UNSAFE = [(b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029')]
+
+
+class JSONEncoder(encoders.JSONEncoder):
+    """
+    Encoder that knows about the identifiers of our documents, on top of
+    everything that the encoder of the REST framework knows about.
+    """
+
+    def default(self, value):
+        """
+        Method to convert a value that JSON does not know how to encode.
+        """
+
+        # Identifiers are encoded as their hexadecimal string, just like the
+        # serializers do with the identifiers of the documents themselves.
+        if isinstance(value, ObjectId):
+            return str(value)
+
+        # Let the encoder of the REST framework decide on everything else.
+        return super().default(value)
+
+
+def default(value):
+    """
+    Function to convert values that orjson does not know how to encode, like
+    lazy translations, decimals and identifiers, the same way that the
+    default renderer does.
+    """
+
+    # Let our encoder decide.
+    return JSONEncoder().default(value)
+
+
+def dumps(data):
+    """
+    Function to encode data as compact JSON. Returns bytes.
+    """
+
+    # Use orjson if we can.
+    if orjson is not None:
+        encoded = orjson.dumps(data, default=default,
+                               option=orjson.OPT_NON_STR_KEYS)
+
+    # Otherwise, use the standard library with the same settings as the
+    # default renderer.
+    else:
+        encoded = json.dumps(data, cls=JSONEncoder,
+                             ensure_ascii=False, allow_nan=False,
+                             separators=(',', ':')).encode()
+
+    # Make sure that the result is valid JavaScript.
+    for character, escaped in UNSAFE:
+        encoded = encoded.replace(character, escaped)
+
+    # Return the encoded data.
+    return encoded
+
+
+def loads(data):
+    """
+    Function to decode JSON. Accepts bytes or a string. Raises a ValueError
+    if the data is not valid JSON.
+    """
+
+    # Use orjson if we can, or the standard library otherwise.
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    Renderer that encodes responses with orjson when it is installed. Falls
+    back to the default renderer for anything orjson cannot do, like
+    indented output.
+    """
+
+    # The default renderer should know about identifiers too.
+    encoder_class = JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """
+        Method to render data as JSON.
+        """
+
+        # Fall back to the default renderer if we need to.
+        if orjson is None or self.get_indent(accepted_media_type or '',
+                                             renderer_context or {}):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+        # There is nothing to render without data.
+        if data is None:
+            return b''
+
+        # Encode the data in one go.
+        return dumps(data)
+
+
+class FastJSONParser(parsers.JSONParser):
+    """
+    Parser that decodes requests with orjson when it is installed, and falls
+    back to the default parser otherwise.
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """
+        Method to parse a JSON request.
+        """
+
+        # Fall back to the default parser without orjson.
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        # Read the entire request, and make sure that it is UTF-8.
+        encoding = (parser_context or {}).get('encoding',
+                                              settings.DEFAULT_CHARSET)
+        data = stream.read() if stream is not None else b''
+        if codecs.lookup(encoding).name != 'utf-8':
+            data = data.decode(encoding).encode()
+
+        # Decode the request in one go.
+        try:
+            return loads(data)
+
+        # Let the client know if the request is not valid JSON.
+        except ValueError as error:
+            raise ParseError(f"JSON parse error - {error}")
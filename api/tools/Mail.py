@@ -1,13 +1,179 @@
 # Import dependencies.
+import atexit
+import logging
 import os
+import queue
+import threading
 from html import escape
-from django.core.mail import send_mail
-from forms.serializers import (
-    FormConfirmationLinkSerializer, FormDisableLinkSerializer
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from forms.models import (
+    FormDisableLink
+)
+from forms.schema import (
+    formSchemas
+)
+from tools.Metrics import (
+    mailDuration
+)
+from tools.Outbox import (
+    Outbox
 )
 from tools.Template import (
     TransactionalTemplate
 )
+from tools.Tracing import (
+    span
+)
+
+# Get a logger to report on mail that could not be delivered.
+logger = logging.getLogger(__name__)
+
+
+class MailQueue:
+    """
+    Queue that delivers emails in the background. Requests only have to put
+    an email on this queue and can then return immediately, while a pool of
+    sender threads takes care of talking to the mail server.
+    """
+
+    def __init__(self, deliver, workers=1):
+        """
+        Constructor for the queue. Accepts the function that delivers a single
+        queued email, and the number of sender threads that should deliver
+        emails concurrently.
+        """
+
+        # Remember how to deliver an email.
+        self.deliver = deliver
+
+        # Remember how many sender threads we should run.
+        self.workers = max(1, workers)
+
+        # This is where all emails wait for delivery.
+        self.messages = queue.Queue()
+
+        # Keep track of the sender threads that we've started.
+        self.threads = []
+
+        # We need a lock to make sure that we only start the senders once.
+        self.lock = threading.Lock()
+
+        # Remember the process that started the senders. Threads do not survive
+        # forking, so a forked process needs to start its own senders.
+        self.pid = None
+
+    def start(self):
+        """
+        Method to start the sender threads if they are not running in this
+        process yet.
+        """
+
+        with self.lock:
+
+            # There is nothing to do if the senders are already running here.
+            if self.pid == os.getpid():
+                return
+
+            # Start a fresh pool of senders for this process.
+            self.pid = os.getpid()
+            self.threads = [
+                threading.Thread(target=self.work, name=f"mail-sender-{i}",
+                                 daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self.threads:
+                thread.start()
+
+    def put(self, message):
+        """
+        Method to queue a single email for delivery.
+        """
+
+        # Make sure that there is someone to deliver the message.
+        self.start()
+
+        # Add the message to the end of the queue.
+        self.messages.put(message)
+
+    def depth(self):
+        """
+        Method to get the number of messages that are still waiting to be
+        delivered.
+        """
+
+        # This is an approximation, as senders may be taking messages off the
+        # queue while we're looking.
+        return self.messages.qsize()
+
+    def stop(self, timeout=None):
+        """
+        Method to gracefully stop the sender threads. All messages that were
+        already queued are delivered before the senders stop.
+        """
+
+        with self.lock:
+
+            # There is nothing to stop if this process never started senders.
+            if self.pid != os.getpid():
+                return
+
+            # Queue one stop signal per sender. Because they're added at the
+            # end of the queue, all messages before them are delivered first.
+            for thread in self.threads:
+                self.messages.put(None)
+
+            # Wait for the senders to finish.
+            for thread in self.threads:
+                thread.join(timeout)
+
+            # Forget about this pool so that it could be started again.
+            self.threads = []
+            self.pid = None
+
+    def work(self):
+        """
+        Method that runs in every sender thread. It keeps delivering messages
+        until it receives a stop signal.
+        """
+
+        while True:
+
+            # Wait for the next message.
+            message = self.messages.get()
+
+            try:
+
+                # A missing message is the signal to stop.
+                if message is None:
+                    return
+
+                # Deliver the message.
+                self.deliver(message)
+
+            # A failing message should never take a sender down with it.
+            except Exception:
+                logger.exception("Failed to deliver mail %s.", message)
+
+            # Always let the queue know that we're done with this message.
+            finally:
+                self.messages.task_done()
+
+
+# Every email is stored in the outbox first, so that it is never lost.
+outbox = Outbox(
+    lease=settings.OUTBOX_LEASE,
+    attempts=settings.OUTBOX_ATTEMPTS,
+    backoff=settings.OUTBOX_BACKOFF,
+)
+
+# Create a single queue that is shared by all mail helpers in this process.
+# It tries to deliver every new email from the outbox right away. Anything it
+# cannot deliver is retried by the `send_outbox` command.
+mailQueue = MailQueue(deliver=outbox.deliverOne, workers=settings.MAIL_WORKERS)
+
+# Make sure that we deliver all queued mail before the process exits.
+atexit.register(mailQueue.stop)
 
 
 class FormConfirmationMail:
@@ -19,32 +185,28 @@ class FormConfirmationMail:
     sending unwanted emails.
     """
 
-    def send(self, user, link):
+    def send(self, user, link, confirmationLink):
         """
-        Method to send the confirmation email.
+        Method to send the confirmation email. The email is rendered and stored
+        in the outbox right away, and then delivered in the background.
         """
 
-        # Create a new confirmation link for this form.
-        confirmationLinkSerializer = FormConfirmationLinkSerializer(data={
-            'formLink': link.pk,
-        })
-
-        # Check if this link is valid.
-        confirmationLinkSerializer.is_valid(raise_exception=True)
-
-        # Save the serializer to get the confirmation link.
-        confirmationURL = confirmationLinkSerializer.save().url()
+        # Store the rendered message and hand it to the background senders.
+        with mailDuration.labels('confirmation').time(), \
+                span('mail.confirmation'):
+            message = outbox.add(self.message(user, link, confirmationLink))
+        mailQueue.put(message)
 
-        # Create a new disable link for this form.
-        disableLinkSerializer = FormDisableLinkSerializer(data={
-            'formLink': link.pk,
-        })
+    def message(self, user, link, confirmationLink):
+        """
+        Method to render the confirmation email.
+        """
 
-        # Check if this link is valid.
-        disableLinkSerializer.is_valid(raise_exception=True)
+        # Get the link that confirms the form.
+        confirmationURL = confirmationLink.url()
 
-        # Save the serializer to get the disabled link.
-        disableURL = disableLinkSerializer.save().url()
+        # Get the disable link for this form.
+        disableURL = FormDisableLink.reusable(link).url()
 
         # Make sure we escape the form's name.
         escapedName = escape(link.form.name)
@@ -82,27 +244,27 @@ class FormConfirmationMail:
                " can disable this form by visiting the following link:\n" \
                f"{disableURL}"
 
-        send_mail(
+        message = EmailMultiAlternatives(
 
             # Construct a confirmation message.
             subject=f"Express delivery of your new '{escapedName}' form.",
 
             # Add the text version.
-            message=text,
-
-            # Add the HTML version.
-            html_message=template.html,
+            body=text,
 
             # Send a single email to the user.
-            recipient_list=[user.email],
+            to=[user.email],
 
             # We can use the default FROM address.
             from_email=None,
-
-            # We do want to know when sending fails.
-            fail_silently=False,
         )
 
+        # Add the HTML version.
+        message.attach_alternative(template.html, 'text/html')
+
+        # Return the message so that it can be delivered.
+        return message
+
 
 class FormResponseMail:
     """
@@ -112,25 +274,32 @@ class FormResponseMail:
 
     def send(self, link, responses):
         """
-        Method to send the response email.
+        Method to send the response email. The email is rendered and stored in
+        the outbox right away, and then delivered in the background.
         """
 
-        # Create a new disable link for this form.
-        disableLinkSerializer = FormDisableLinkSerializer(data={
-            'formLink': link.pk,
-        })
+        # Store the rendered message and hand it to the background senders.
+        with mailDuration.labels('response').time(), \
+                span('mail.response'):
+            message = outbox.add(self.message(link, responses))
+        mailQueue.put(message)
 
-        # Check if this link is valid.
-        disableLinkSerializer.is_valid(raise_exception=True)
+    def message(self, link, responses):
+        """
+        Method to render the response email.
+        """
 
-        # Save the serializer to get the disabled link.
-        disableURL = disableLinkSerializer.save().url()
+        # Get the disable link for this form.
+        disableURL = FormDisableLink.reusable(link).url()
 
         # Make sure we escape the form's name.
         escapedName = escape(link.form.name)
 
+        # Get the schema of the form, which knows the label of every input.
+        schema = formSchemas.get(link.form)
+
         # Get the label with each response. Make sure we escape these messages.
-        labeled = [(link.form.inputs.filter(name=name).first().label, response)
+        labeled = [(schema.label(name), response)
                    for name, response in responses.items()]
 
         # Create the content message for the HTML email.
@@ -171,23 +340,23 @@ class FormResponseMail:
                 " form? You can disable this form by clicking the" \
                 f" following link:\n{disableURL}"
 
-        send_mail(
+        message = EmailMultiAlternatives(
 
             # Add a subject.
             subject=f"New response for the '{escapedName}' form.",
 
             # Add our message.
-            message=text,
-
-            # Add the HTML version.
-            html_message=template.html,
+            body=text,
 
             # Send a single email to the user.
-            recipient_list=[link.form.user.email],
+            to=[link.form.user.email],
 
             # We can use the default FROM address.
             from_email=None,
-
-            # We do want to know when sending fails.
-            fail_silently=False,
         )
+
+        # Add the HTML version.
+        message.attach_alternative(template.html, 'text/html')
+
+        # Return the message so that it can be delivered.
+        return message
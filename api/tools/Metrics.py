@@ -0,0 +1,242 @@
+# Import dependencies.
+import asyncio
+import contextvars
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess
+)
+from pymongo import monitoring
+
+# Most of what we measure takes somewhere between a millisecond and a few
+# seconds.
+LATENCY = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# Rendering a template takes only microseconds.
+RENDERING = (.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005)
+
+# The time it takes to handle a request, per endpoint.
+requestDuration = Histogram(
+    'reachable_request_duration_seconds', "Time spent handling a request.",
+    ['method', 'route', 'status'], buckets=LATENCY)
+
+# The number of database commands that a request needs, per endpoint.
+requestQueries = Histogram(
+    'reachable_request_queries', "Database commands sent per request.",
+    ['route'], buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50))
+
+# The time that the database takes to answer a command.
+queryDuration = Histogram(
+    'reachable_query_duration_seconds', "Time spent on a database command.",
+    ['command', 'collection'], buckets=LATENCY)
+
+# The time it takes to set up a new connection to the mail server.
+smtpConnectDuration = Histogram(
+    'reachable_smtp_connect_duration_seconds',
+    "Time spent connecting and logging in to the mail server.",
+    buckets=LATENCY)
+
+# The time it takes to hand a single email to the mail server.
+smtpSendDuration = Histogram(
+    'reachable_smtp_send_duration_seconds',
+    "Time spent sending a single email to the mail server.",
+    ['outcome'], buckets=LATENCY)
+
+# The time it takes to render an email and store it in the outbox.
+mailDuration = Histogram(
+    'reachable_mail_duration_seconds',
+    "Time spent rendering an email and storing it in the outbox.",
+    ['kind'], buckets=LATENCY)
+
+# The time it takes to render a template.
+templateDuration = Histogram(
+    'reachable_template_duration_seconds', "Time spent rendering a template.",
+    ['template'], buckets=RENDERING)
+
+# The number of times that the details of a form link could be taken from the
+# cache, or had to be built.
+formLinkCacheResults = Counter(
+    'reachable_form_link_cache', "Lookups of form link details in the cache.",
+    ['result'])
+
+# The number of database commands sent for the request that is being handled.
+# This follows the request from thread to thread and into async code.
+queries = contextvars.ContextVar('queries', default=None)
+
+
+class QueryListener(monitoring.CommandListener):
+    """
+    Listener that measures every command that is sent to the database, and
+    counts the commands for the request that sent them.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the listener.
+        """
+
+        # Remember the collection of every command until it has finished.
+        self.collections = {}
+
+    def started(self, event):
+        """
+        Method that is called whenever a command is sent to the database.
+        """
+
+        # Count the command for the current request, if there is one.
+        counter = queries.get()
+        if counter is not None:
+            counter[0] += 1
+
+        # Remember which collection the command was sent to. Only some commands
+        # name their collection.
+        collection = event.command.get(event.command_name)
+        self.collections[event.connection_id, event.request_id] = \
+            collection if isinstance(collection, str) else ''
+
+    def succeeded(self, event):
+        """
+        Method that is called whenever a command succeeds.
+        """
+
+        # Measure the command.
+        self.observe(event)
+
+    def failed(self, event):
+        """
+        Method that is called whenever a command fails.
+        """
+
+        # Measure the command.
+        self.observe(event)
+
+    def observe(self, event):
+        """
+        Method to record how long a command took.
+        """
+
+        # Find the collection that the command was sent to.
+        collection = self.collections.pop(
+            (event.connection_id, event.request_id), '')
+
+        # Record the duration.
+        queryDuration.labels(event.command_name, collection) \
+                     .observe(event.duration_micros / 1e6)
+
+
+# Measure every database client that is created from now on.
+monitoring.register(QueryListener())
+
+
+class MetricsMiddleware:
+    """
+    Middleware that measures how long every request takes, and how many
+    database commands it sends, per endpoint. It works in both sync and async
+    chains, so that async views are not forced onto a thread.
+    """
+
+    # We can handle requests both synchronously and asynchronously.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """
+        Constructor for the middleware.
+        """
+
+        # Remember how to handle the request.
+        self.get_response = get_response
+
+        # Let Django know that we're async when the rest of the chain is, the
+        # same way that Django's own middleware does.
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        """
+        Method to handle and measure a single request.
+        """
+
+        # Handle the request asynchronously if the rest of the chain does.
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        # Count the database commands for this request.
+        counter = [0]
+        token = queries.set(counter)
+
+        # Handle the request, and measure how long it takes.
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            queries.reset(token)
+
+        # Record the measurements.
+        self.observe(request, response, counter,
+                     time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        """
+        Method to handle and measure a single request asynchronously.
+        """
+
+        # Count the database commands for this request. Work that is handed to
+        # the offloader shares the same counter.
+        counter = [0]
+        token = queries.set(counter)
+
+        # Handle the request, and measure how long it takes.
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            queries.reset(token)
+
+        # Record the measurements.
+        self.observe(request, response, counter,
+                     time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, counter, duration):
+        """
+        Method to record the measurements of a single request.
+        """
+
+        # Record the measurements by the endpoint's route, rather than by its
+        # full path, to keep the number of different labels small.
+        route = self.route(request)
+        requestDuration.labels(request.method, route, response.status_code) \
+                       .observe(duration)
+        requestQueries.labels(route).observe(counter[0])
+
+    def route(self, request):
+        """
+        Method to get the route that a request was sent to.
+        """
+
+        # Requests that did not match any endpoint are grouped together.
+        match = getattr(request, 'resolver_match', None)
+        return match.route if match is not None else 'unmatched'
+
+
+def exposition():
+    """
+    Function to get all metrics in the format that Prometheus reads. Returns
+    the metrics and their content type.
+    """
+
+    # Every process writes its own metrics to a shared directory when we run
+    # several processes. In that case, we combine the metrics of all of them.
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    # Otherwise, this process has all of the metrics.
+    else:
+        registry = REGISTRY
+
+    # Return the metrics.
+    return generate_latest(registry), CONTENT_TYPE_LATEST
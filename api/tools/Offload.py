@@ -0,0 +1,107 @@
+# Import dependencies.
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from tools.Profiler import follow
+
+
+class Offloader:
+    """
+    Class to run blocking work, like talking to the database, from async code.
+    The work runs in a bounded pool of threads, so that any number of requests
+    can wait for it without blocking the event loop, while only a limited
+    number of them talk to the database at once.
+    """
+
+    def __init__(self, threads=32):
+        """
+        Constructor for the offloader. Accepts the maximum number of threads
+        that may do blocking work at once.
+        """
+
+        # Remember how many threads we may use.
+        self.threads = max(1, threads)
+
+        # We need a lock to make sure that we only start one pool.
+        self.lock = threading.Lock()
+
+        # Threads do not survive forking, so every process starts its own pool
+        # the first time it needs one.
+        self.executor = None
+        self.pid = None
+
+    def pool(self):
+        """
+        Method to get the pool of threads for this process.
+        """
+
+        with self.lock:
+
+            # Start a fresh pool if this process does not have one yet.
+            if self.pid != os.getpid():
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix='offload')
+                self.pid = os.getpid()
+
+            # Return the pool.
+            return self.executor
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Method to run a blocking function in the pool and wait for its result
+        without blocking the event loop.
+        """
+
+        # Run the function with the same context as the caller, so that it
+        # still knows which request it is working for.
+        context = contextvars.copy_context()
+
+        # Hand the function to the pool and wait for it to finish.
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool(), functools.partial(context.run, self.call, function,
+                                           *args, **kwargs))
+
+    def call(self, function, *args, **kwargs):
+        """
+        Method that runs a function in one of the threads of the pool.
+        """
+
+        # Django keeps a database connection per thread, and only cleans them
+        # up around the requests that it handles itself. We do the same around
+        # the work in our threads, so that none of them keeps a connection of
+        # its own open for longer than the settings allow.
+        close_old_connections()
+        try:
+
+            # Include the work in the profile of the request, if it has one.
+            with follow():
+                return function(*args, **kwargs)
+
+        # Clean up the connection once the work is done, even if it failed.
+        finally:
+            close_old_connections()
+
+    def shutdown(self):
+        """
+        Method to stop the pool once all of its work is done.
+        """
+
+        with self.lock:
+
+            # There is nothing to stop if this process never started a pool.
+            if self.pid != os.getpid():
+                return
+
+            # Wait for the pool to finish.
+            self.executor.shutdown(wait=True)
+            self.executor = None
+            self.pid = None
+
+
+# Create a single offloader that is shared by all async views in this process.
+offloader = Offloader(threads=settings.ASYNC_THREADS)
@@ -0,0 +1,296 @@
+# Import dependencies.
+import logging
+import time
+from datetime import timedelta
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+from pymongo import ReturnDocument
+from forms.models import OutboxMail
+from tools.Metrics import smtpSendDuration
+from tools.Tracing import CLIENT, current, span
+
+# Get a logger to report on mail that could not be delivered.
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Class to store rendered emails in the database and deliver them. Any
+    number of workers, in any number of processes, can deliver emails from the
+    same outbox at once. A worker first claims an email by leasing it for a
+    while, so that no other worker will send the same email.
+    """
+
+    def __init__(self, lease=300, attempts=8, backoff=30):
+        """
+        Constructor for the outbox. Accepts the number of seconds a worker may
+        hold on to a claimed email, the number of delivery attempts before we
+        give up on an email, and the number of seconds to wait before the first
+        retry.
+        """
+
+        # Remember how long a claim lasts.
+        self.lease = timedelta(seconds=lease)
+
+        # Remember how often we should try to deliver an email.
+        self.attempts = attempts
+
+        # Remember how long we should wait before the first retry.
+        self.backoff = backoff
+
+    def add(self, message):
+        """
+        Method to store a single rendered message in the outbox. Returns the
+        primary key of the stored email.
+        """
+
+        # Find the HTML version of the message, if it has one.
+        html = next((content for content, mimetype
+                     in getattr(message, 'alternatives', [])
+                     if mimetype == 'text/html'), None)
+
+        # Store the message so that it survives a restart. We remember the
+        # trace that it was sent in, so that its delivery can join it.
+        return OutboxMail.objects.create(
+            subject=message.subject,
+            body=message.body,
+            html=html,
+            sender=message.from_email,
+            recipients=list(message.to),
+            trace=current(),
+        ).pk
+
+    def claim(self, pk=None):
+        """
+        Method to claim a single email that is ready to be delivered. Claims a
+        specific email if a primary key is provided. Returns the claimed email
+        as a raw document, or None if there was nothing to claim.
+        """
+
+        # Get the current time.
+        now = timezone.now()
+
+        # We can claim emails that are ready to be delivered and emails that
+        # were claimed by a worker that did not finish in time.
+        query = {'$or': [
+            {'status': OutboxMail.PENDING, 'available': {'$lte': now}},
+            {'status': OutboxMail.SENDING, 'leased': {'$lt': now}},
+        ]}
+
+        # Limit the query to a single email if requested.
+        if pk is not None:
+            query['_id'] = pk
+
+        # Atomically claim the email that has waited the longest, so that no
+        # other worker can claim it at the same time.
+        return OutboxMail.objects.mongo_find_one_and_update(
+            query,
+            {
+                '$set': {
+                    'status': OutboxMail.SENDING,
+                    'leased': now + self.lease,
+                    'updated': now,
+                },
+                '$inc': {'attempts': 1},
+            },
+            sort=[('available', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def claimBatch(self, size):
+        """
+        Method to claim up to a number of emails that are ready to be
+        delivered.
+        """
+
+        # Keep claiming emails until we have enough or run out.
+        batch = []
+        while len(batch) < size:
+
+            # Try to claim the next email.
+            document = self.claim()
+            if document is None:
+                break
+            batch.append(document)
+
+        # Return everything we've claimed.
+        return batch
+
+    def deliver(self, documents):
+        """
+        Method to deliver a list of claimed emails over a single connection to
+        the mail server. Returns the number of emails that were delivered, or
+        None if we could not connect to the mail server at all.
+        """
+
+        # There is no need to connect if we have nothing to send.
+        if not documents:
+            return 0
+
+        # Deliver the batch within a span that joins the trace of its first
+        # email, and links to the traces of all others. Connecting to the mail
+        # server happens within it, so that a new connection is part of the
+        # trace of an email rather than a trace of its own.
+        traces = [document.get('trace') for document in documents]
+        with span('smtp.deliver', traces[0], links=traces[1:],
+                  **{'mail.batch': len(documents)}):
+            return self.transmit(documents)
+
+    def transmit(self, documents):
+        """
+        Method to send a list of claimed emails over a single connection to
+        the mail server. Returns the same as deliver().
+        """
+
+        # Keep track of the number of emails that we've delivered.
+        delivered = 0
+
+        # Use a single connection for the entire batch.
+        connection = get_connection(fail_silently=False)
+
+        # If we cannot connect, none of the emails can be delivered. We schedule
+        # a retry for all of them, rather than leaving them claimed until their
+        # lease runs out.
+        try:
+            connection.open()
+        except Exception as error:
+            for document in documents:
+                self.fail(document, error)
+            return None
+
+        # Send every email, and return the connection once we're done.
+        with connection:
+            for document in documents:
+
+                # Try to send this email, and measure how long it takes. The
+                # delivery joins the trace of the request that sent it.
+                start = time.perf_counter()
+                try:
+                    with span('smtp.send', document.get('trace'), CLIENT, **{
+                        'mail.id': str(document['_id']),
+                        'mail.attempt': document.get('attempts'),
+                    }):
+                        self.message(document, connection).send()
+
+                # Schedule a retry if we could not send it.
+                except Exception as error:
+                    smtpSendDuration.labels('failed') \
+                                    .observe(time.perf_counter() - start)
+                    self.fail(document, error)
+
+                # Otherwise, remember that it was delivered.
+                else:
+                    smtpSendDuration.labels('sent') \
+                                    .observe(time.perf_counter() - start)
+                    self.succeed(document)
+                    delivered += 1
+
+        # Report how many emails were delivered.
+        return delivered
+
+    def deliverOne(self, pk):
+        """
+        Method to deliver a single email right away. Does nothing if the email
+        was already claimed by another worker.
+        """
+
+        # Try to claim the email.
+        document = self.claim(pk)
+
+        # Deliver it if it was still available.
+        return self.deliver([document] if document else [])
+
+    def drain(self, size=100):
+        """
+        Method to claim and deliver a batch of emails. Returns the number of
+        emails that were claimed, or 0 if the mail server could not be
+        reached.
+        """
+
+        # Claim a batch of emails.
+        batch = self.claimBatch(size)
+
+        # Deliver them. If the mail server cannot be reached, there is no point
+        # in trying the next batch right away.
+        if self.deliver(batch) is None:
+            return 0
+
+        # Let the caller know if there might be more work to do.
+        return len(batch)
+
+    def message(self, document, connection=None):
+        """
+        Method to construct a message from an email in the outbox.
+        """
+
+        # Construct the plain text version of the message.
+        message = EmailMultiAlternatives(
+            subject=document['subject'],
+            body=document['body'],
+            from_email=document.get('sender'),
+            to=document['recipients'],
+            connection=connection,
+        )
+
+        # Add the HTML version if we have one.
+        if document.get('html'):
+            message.attach_alternative(document['html'], 'text/html')
+
+        # Return the constructed message.
+        return message
+
+    def succeed(self, document):
+        """
+        Method to mark a claimed email as delivered.
+        """
+
+        # Get the current time.
+        now = timezone.now()
+
+        # Only update the email if our claim is still valid.
+        OutboxMail.objects.mongo_update_one(
+            {'_id': document['_id'], 'leased': document['leased']},
+            {'$set': {
+                'status': OutboxMail.SENT,
+                'sent': now,
+                'leased': None,
+                'error': None,
+                'updated': now,
+            }},
+        )
+
+    def fail(self, document, error):
+        """
+        Method to schedule a retry for a claimed email that could not be
+        delivered. Gives up on the email once it has run out of attempts.
+        """
+
+        # Get the current time.
+        now = timezone.now()
+
+        # Let the logs know what went wrong.
+        logger.warning("Failed to deliver mail %s (attempt %s): %s",
+                       document['_id'], document['attempts'], error)
+
+        # Check if we should give up on this email.
+        if document['attempts'] >= self.attempts:
+            update = {'status': OutboxMail.DEAD}
+
+        # Otherwise, we should wait twice as long after every attempt.
+        else:
+            delay = self.backoff * 2 ** (document['attempts'] - 1)
+            update = {
+                'status': OutboxMail.PENDING,
+                'available': now + timedelta(seconds=delay),
+            }
+
+        # Only update the email if our claim is still valid.
+        OutboxMail.objects.mongo_update_one(
+            {'_id': document['_id'], 'leased': document['leased']},
+            {'$set': {
+                **update,
+                'leased': None,
+                'error': repr(error),
+                'updated': now,
+            }},
+        )
@@ -0,0 +1,370 @@
+# Import dependencies.
+import contextvars
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+# The header that asks for a request to be profiled.
+HEADER = 'X-Profile'
+
+# The number of seconds that a signed header stays valid.
+VALIDITY = 300
+
+# The places where the code crosses into another layer, found by the files
+# that the code lives in. Every stack gets an extra frame where it crosses, so
+# that a flame graph shows how much time was spent in every layer. The first
+# layer that matches wins.
+BOUNDARIES = [
+    ('mongo', ('/pymongo/', '/bson/')),
+    ('djongo', ('/djongo/', '/sqlparse/')),
+    ('smtp', ('/smtplib.py', '/tools/Smtp.py')),
+    ('mail', ('/tools/Mail.py', '/tools/Template.py', '/tools/Outbox.py')),
+]
+
+# The profile of the request that is being handled. This follows the request
+# into the threads that the offloader uses.
+current = contextvars.ContextVar('profile', default=None)
+
+
+def signature(path, timestamp):
+    """
+    Function to sign a request to profile a path at a moment in time.
+    """
+
+    # Only someone who knows the secret key can sign a request.
+    return salted_hmac('tools.Profiler', f"{timestamp}:{path}",
+                       algorithm='sha256').hexdigest()
+
+
+def header(path, timestamp=None):
+    """
+    Function to get the value of the header that asks for a request to a path
+    to be profiled.
+    """
+
+    # Sign the request for the current moment, unless told otherwise.
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    return f"{timestamp}:{signature(path, timestamp)}"
+
+
+def verify(path, value):
+    """
+    Function to check if the header asks for a request to a path to be
+    profiled, and was signed recently enough.
+    """
+
+    # The header holds the moment that it was signed and its signature.
+    timestamp, separator, digest = value.partition(':')
+    if not separator or not timestamp.isdigit():
+        return False
+
+    # Old headers cannot be used again.
+    if abs(time.time() - int(timestamp)) > VALIDITY:
+        return False
+
+    # Make sure that the signature is ours.
+    return constant_time_compare(digest, signature(path, timestamp))
+
+
+class Profile:
+    """
+    Class to collect the stacks of the threads that handle a single request.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the profile.
+        """
+
+        # Count how often we saw every stack. Stacks are kept as code objects,
+        # which is cheap, and only turned into text when we write them.
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, frame):
+        """
+        Method to record the stack of a single frame.
+        """
+
+        # Walk from the frame to the start of its thread.
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+
+        # Count the stack from the start of the thread.
+        with self.lock:
+            self.stacks[tuple(reversed(codes))] += 1
+
+    @contextmanager
+    def attached(self):
+        """
+        Method to profile the current thread while the context is open.
+        """
+
+        # Let the sampler watch this thread, and let any work that this thread
+        # hands off know about the profile.
+        ident = threading.get_ident()
+        sampler.watch(ident, self)
+        token = current.set(self)
+
+        # Stop watching the thread once we're done.
+        try:
+            yield self
+        finally:
+            current.reset(token)
+            sampler.unwatch(ident)
+
+    def collapsed(self):
+        """
+        Method to get the stacks in the collapsed format that flame graph tools
+        read: every line holds a stack, with its frames separated by
+        semicolons, and the number of times it was seen.
+        """
+
+        # Turn every stack into text.
+        lines = Counter()
+        for codes, count in self.stacks.items():
+            lines[';'.join(frames(codes))] += count
+
+        # Return the stacks, the most common ones first.
+        return ''.join(f"{stack} {count}\n"
+                       for stack, count in lines.most_common())
+
+    def write(self, directory, name):
+        """
+        Method to write the profile to a directory. Returns the path of the
+        file that was written.
+        """
+
+        # Make sure that the directory exists.
+        os.makedirs(directory, exist_ok=True)
+
+        # Write the stacks to a file that is named after the request.
+        path = os.path.join(directory, f"{name}.folded")
+        with open(path, 'w') as file:
+            file.write(self.collapsed())
+
+        # Let the caller know where to find the profile.
+        return path
+
+
+def boundary(filename):
+    """
+    Function to find the layer that a file belongs to. Returns None for files
+    that are not part of any layer.
+    """
+
+    # Find the first layer that the file matches.
+    for layer, patterns in BOUNDARIES:
+        if any(pattern in filename for pattern in patterns):
+            return layer
+
+    # The file is not part of any layer.
+    return None
+
+
+def frames(codes):
+    """
+    Function to describe every frame of a stack. Adds an extra frame wherever
+    the stack crosses into another layer.
+    """
+
+    # Keep track of the layer of the previous frame.
+    previous = None
+    for code in codes:
+
+        # Mark the moment that we enter another layer.
+        layer = boundary(code.co_filename)
+        if layer is not None and layer != previous:
+            yield f"[{layer}]"
+        previous = layer
+
+        # Describe the frame by its function and where that is defined.
+        yield f"{code.co_name} ({os.path.basename(code.co_filename)}:" \
+              f"{code.co_firstlineno})"
+
+
+class Sampler:
+    """
+    Class that takes a look at the threads that are being profiled at a fixed
+    interval, and records where they are. A single thread does the sampling
+    for all requests in a process, and only while any request is profiled.
+    """
+
+    def __init__(self, interval=0.005):
+        """
+        Constructor for the sampler. Accepts the number of seconds between two
+        samples.
+        """
+
+        # Remember how often we should sample.
+        self.interval = interval
+
+        # Keep track of the profile of every thread that we watch.
+        self.threads = {}
+        self.lock = threading.Lock()
+
+        # This is set whenever there is at least one thread to watch.
+        self.active = threading.Event()
+
+        # Remember the process that started the sampler. Threads do not
+        # survive forking, so a forked process needs to start its own sampler.
+        self.pid = None
+
+    def start(self):
+        """
+        Method to start the sampling thread if it is not running in this
+        process yet. Expects the lock to be held.
+        """
+
+        # There is nothing to do if the sampler is already running here.
+        if self.pid == os.getpid():
+            return
+
+        # Start a fresh sampler for this process.
+        self.pid = os.getpid()
+        threading.Thread(target=self.run, name='profiler', daemon=True).start()
+
+    def watch(self, ident, profile):
+        """
+        Method to start recording the stack of a thread in a profile.
+        """
+
+        with self.lock:
+
+            # Make sure that someone is sampling, and let it know that there
+            # is work to do.
+            self.start()
+            self.threads[ident] = profile
+            self.active.set()
+
+    def unwatch(self, ident):
+        """
+        Method to stop recording the stack of a thread.
+        """
+
+        with self.lock:
+
+            # Forget about the thread, and let the sampler rest if it was the
+            # last one.
+            self.threads.pop(ident, None)
+            if not self.threads:
+                self.active.clear()
+
+    def run(self):
+        """
+        Method that runs in the sampling thread.
+        """
+
+        while True:
+
+            # Wait until there is something to sample, and then for the next
+            # sample.
+            self.active.wait()
+            time.sleep(self.interval)
+
+            # Get the current frame of every thread at once.
+            snapshot = sys._current_frames()
+            with self.lock:
+                watched = list(self.threads.items())
+
+            # Record the stack of every thread that we watch.
+            for ident, profile in watched:
+                frame = snapshot.get(ident)
+                if frame is not None:
+                    profile.add(frame)
+
+
+# Create a single sampler that is shared by all requests in this process.
+sampler = Sampler(interval=settings.PROFILE_INTERVAL / 1e3)
+
+
+@contextmanager
+def follow():
+    """
+    Function to profile the current thread while the context is open, if it
+    is working for a request that is being profiled.
+    """
+
+    # Only profile if the request is profiled.
+    profile = current.get()
+    if profile is None:
+        yield
+        return
+
+    # Otherwise, add this thread to the profile of the request.
+    with profile.attached():
+        yield
+
+
+class ProfilerMiddleware:
+    """
+    Middleware that profiles a request when it is asked to with a signed
+    header, or for a random share of all requests. The profile is written to
+    a directory in a format that flame graph tools can read. The middleware is
+    left out entirely when no directory is configured.
+    """
+
+    def __init__(self, get_response):
+        """
+        Constructor for the middleware.
+        """
+
+        # Only profile when we know where to write the profiles.
+        if not settings.PROFILE_DIRECTORY:
+            raise MiddlewareNotUsed
+
+        # Remember how to handle the request.
+        self.get_response = get_response
+
+    def __call__(self, request):
+        """
+        Method to handle a single request, and profile it if we should.
+        """
+
+        # Check if we're asked to profile this request.
+        signed = verify(request.path, request.headers.get(HEADER, ''))
+
+        # Most requests are not profiled at all.
+        if not signed and random.random() >= settings.PROFILE_RATE:
+            return self.get_response(request)
+
+        # Otherwise, handle the request while we record its stacks.
+        start = time.time()
+        with Profile().attached() as profile:
+            response = self.get_response(request)
+
+        # Write the profile, named after the endpoint and the moment.
+        path = profile.write(settings.PROFILE_DIRECTORY,
+                             self.name(request, start))
+
+        # Let whoever asked for the profile know where to find it.
+        if signed:
+            response[HEADER] = os.path.basename(path)
+
+        # Return the response.
+        return response
+
+    def name(self, request, start):
+        """
+        Method to get the name of the profile of a request.
+        """
+
+        # Name the profile after the endpoint's route rather than its full
+        # path, so that the profiles of an endpoint are easy to find together.
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        route = re.sub(r'[^\w-]+', '-', route).strip('-') or 'root'
+
+        # Make the name unique per moment, process and thread.
+        return f"{route}-{int(start * 1e3)}-{os.getpid()}-" \
+               f"{threading.get_ident()}"
@@ -0,0 +1,321 @@
+# Import dependencies.
+import os
+import smtplib
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.mail.backends import smtp
+from tools.Metrics import smtpConnectDuration
+from tools.Tracing import CLIENT, span
+
+
+class ConnectionPool:
+    """
+    Class to keep authenticated connections to mail servers alive, so that
+    they can be reused for many emails. Setting up a connection costs a TLS
+    handshake and a login, which is far more expensive than sending a single
+    email.
+    """
+
+    def __init__(self, size=4, idle=60, check=1, wait=30):
+        """
+        Constructor for the pool. Accepts the maximum number of connections per
+        mail server, the number of seconds an unused connection may be kept
+        alive, the number of seconds after which an unused connection should be
+        checked before it is reused, and the number of seconds to wait for a
+        connection when all connections to a server are in use.
+        """
+
+        # Remember how the pool should behave.
+        self.size = max(1, size)
+        self.idle = idle
+        self.check = check
+        self.wait = wait
+
+        # We need a lock to safely manage connections from multiple threads.
+        self.lock = threading.Lock()
+
+        # Start out without any connections.
+        self.reset()
+
+    def reset(self):
+        """
+        Method to forget about all connections. Connections cannot be shared
+        with a forked process, so every process needs its own pool.
+        """
+
+        # Remember the process that owns these connections.
+        self.pid = os.getpid()
+
+        # Unused connections per server, with the moment they were last used.
+        self.connections = defaultdict(list)
+
+        # Limit the number of connections per server.
+        self.slots = defaultdict(lambda: threading.BoundedSemaphore(self.size))
+
+    def acquire(self, server, connect):
+        """
+        Method to get a connection to a server. Reuses an unused connection if
+        it is still alive, and otherwise calls the connect function to set up a
+        new one. Returns the connection and whether it was reused.
+        """
+
+        with self.lock:
+
+            # Start with a fresh pool if we're in a forked process.
+            if self.pid != os.getpid():
+                self.reset()
+
+            # Get the slots for this server.
+            slots = self.slots[server]
+
+        # Wait until we're allowed another connection to this server.
+        if not slots.acquire(timeout=self.wait):
+            raise smtplib.SMTPException(
+                f"No connection to {server[0]} available in time.")
+
+        try:
+
+            # Try to reuse one of the unused connections.
+            while True:
+
+                # Take the connection that was used most recently.
+                with self.lock:
+                    if not self.connections[server]:
+                        break
+                    connection, used = self.connections[server].pop()
+
+                # Only reuse the connection if it is still alive.
+                if self.alive(connection, time.monotonic() - used):
+                    return connection, True
+
+                # Otherwise, get rid of it.
+                self.quit(connection)
+
+            # Set up a new connection.
+            connection = connect()
+
+            # Give back the slot if we failed to connect.
+            if connection is None:
+                slots.release()
+
+            # Return the new connection.
+            return connection, False
+
+        # Give back the slot if anything went wrong.
+        except BaseException:
+            slots.release()
+            raise
+
+    def release(self, server, connection):
+        """
+        Method to return a connection to the pool so that it can be reused.
+        """
+
+        with self.lock:
+
+            # Connections from before a fork do not belong in this pool.
+            if self.pid != os.getpid():
+                return
+
+            # Keep the connection around for the next email.
+            self.connections[server].append((connection, time.monotonic()))
+            self.slots[server].release()
+
+    def discard(self, server, connection):
+        """
+        Method to close a connection that should not be reused.
+        """
+
+        # Close the connection.
+        self.quit(connection)
+
+        with self.lock:
+
+            # Connections from before a fork do not belong in this pool.
+            if self.pid != os.getpid():
+                return
+
+            # Make room for a new connection.
+            self.slots[server].release()
+
+    def alive(self, connection, idle):
+        """
+        Method to check if an unused connection can still be used.
+        """
+
+        # Servers close connections that have been unused for too long.
+        if idle > self.idle:
+            return False
+
+        # There is no need to check a connection that was just used.
+        if idle < self.check:
+            return True
+
+        # Otherwise, ask the server if the connection is still alive.
+        try:
+            return connection.noop()[0] == 250
+
+        # Any problem means that we cannot use this connection.
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def quit(self, connection):
+        """
+        Method to close a connection to a server, no matter its state.
+        """
+
+        # Politely close the connection.
+        try:
+            connection.quit()
+
+        # Make sure that the connection is closed if that fails.
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+
+# Create a single pool that is shared by all backends in this process.
+pool = ConnectionPool(
+    size=settings.EMAIL_POOL_SIZE,
+    idle=settings.EMAIL_POOL_IDLE,
+)
+
+
+class PooledEmailBackend(smtp.EmailBackend):
+    """
+    Email backend that borrows its connections from the connection pool rather
+    than setting up a new connection to the mail server for every email.
+    """
+
+    # Remember if the current connection came from the pool.
+    reused = False
+
+    def server(self):
+        """
+        Method to get the identifier of the mail server that this backend
+        connects to. Only connections with the same settings can be shared.
+        """
+
+        # Combine all settings that determine how we connect.
+        return (self.host, self.port, self.username, self.use_ssl,
+                self.use_tls)
+
+    def connect(self):
+        """
+        Method to set up a new authenticated connection to the mail server.
+        """
+
+        # Let the original implementation connect, secure and log in, and
+        # measure how long that takes.
+        with smtpConnectDuration.time(), \
+                span('smtp.connect', kind=CLIENT,
+                     **{'net.peer.name': self.host}):
+            super().open()
+
+        # Take the connection away from this backend so that the pool can
+        # manage it.
+        connection, self.connection = self.connection, None
+        return connection
+
+    def open(self):
+        """
+        Method to make sure that this backend has a connection to the mail
+        server. Returns True if a connection was borrowed from the pool.
+        """
+
+        # There is nothing to do if we already have a connection.
+        if self.connection:
+            return False
+
+        # Borrow a connection from the pool.
+        try:
+            self.connection, self.reused = pool.acquire(self.server(),
+                                                        self.connect)
+
+        # Respect the choice to fail silently.
+        except (smtplib.SMTPException, OSError):
+            if not self.fail_silently:
+                raise
+            return None
+
+        # Let the caller know if we have a connection.
+        return True if self.connection else None
+
+    def close(self):
+        """
+        Method to return the connection to the pool.
+        """
+
+        # There is nothing to do if we don't have a connection.
+        if self.connection is None:
+            return
+
+        # Give the connection back so that it can be reused.
+        pool.release(self.server(), self.connection)
+        self.connection = None
+
+    def discard(self):
+        """
+        Method to close the connection instead of returning it to the pool.
+        """
+
+        # There is nothing to do if we don't have a connection.
+        if self.connection is None:
+            return
+
+        # Make sure that no one uses this connection again.
+        pool.discard(self.server(), self.connection)
+        self.connection = None
+
+    def send_messages(self, email_messages):
+        """
+        Method to send a list of emails over a pooled connection. Returns the
+        number of emails that were sent.
+        """
+
+        # There is nothing to do if we have nothing to send.
+        if not email_messages:
+            return 0
+
+        with self._lock:
+
+            # Make sure that we have a connection.
+            new_conn_created = self.open()
+            if not self.connection or new_conn_created is None:
+                return 0
+
+            # Send all messages, while keeping track of how many were sent.
+            try:
+                num_sent = sum(1 for message in email_messages
+                               if self.sendOne(message))
+
+            # Never return a connection in an unknown state to the pool.
+            except BaseException:
+                self.discard()
+                raise
+
+            # Return the connection if we borrowed it for these messages.
+            if new_conn_created:
+                self.close()
+
+        # Report how many emails were sent.
+        return num_sent
+
+    def sendOne(self, message):
+        """
+        Method to send a single email. Transparently reconnects if the server
+        closed a pooled connection.
+        """
+
+        # Try to send the email over the current connection.
+        try:
+            return self._send(message)
+
+        # The server may have closed a connection that we kept alive for too
+        # long. In that case, we can simply try again with a new connection.
+        except smtplib.SMTPServerDisconnected:
+            if not self.reused:
+                raise
+            self.discard()
+            return self.open() is not None and self._send(message)
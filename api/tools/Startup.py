@@ -0,0 +1,218 @@
+# Import dependencies.
+import hashlib
+import json
+import logging
+import os
+import threading
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.urls import get_resolver
+from tools.Database import database, sharedClient
+
+# Get a logger to report on processes that could not be warmed up.
+logger = logging.getLogger(__name__)
+
+
+class Fingerprints:
+    """
+    Class to remember what the inputs of every startup step looked like the
+    last time that step ran, so that we can skip the step when nothing has
+    changed since.
+    """
+
+    def __init__(self, path):
+        """
+        Constructor for the fingerprints. Accepts the file to keep them in.
+        """
+
+        # Remember where the fingerprints are kept.
+        self.path = path
+
+        # Load the fingerprints from the last time, if there was one.
+        try:
+            with open(path, 'r') as file:
+                self.fingerprints = json.load(file)
+
+        # Otherwise, every step should run.
+        except (OSError, ValueError):
+            self.fingerprints = {}
+
+    def changed(self, step, fingerprint):
+        """
+        Method to check if the inputs of a step have changed since it last ran.
+        """
+
+        # Compare with the fingerprint from the last run.
+        return self.fingerprints.get(step) != fingerprint
+
+    def remember(self, step, fingerprint):
+        """
+        Method to remember the inputs of a step that has just run.
+        """
+
+        # Update the fingerprint.
+        self.fingerprints[step] = fingerprint
+
+        # Write all fingerprints to a new file first, so that we never leave a
+        # partially written file behind.
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w') as file:
+            json.dump(self.fingerprints, file, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
+
+
+def digest(paths, *values):
+    """
+    Function to calculate a single fingerprint for the contents of a list of
+    files. Optionally accepts other values that the fingerprint should
+    include, like settings.
+    """
+
+    # Combine the names and contents of all files, in a fixed order.
+    fingerprint = hashlib.sha1()
+    for path in sorted(set(paths)):
+        fingerprint.update(path.encode())
+        with open(path, 'rb') as file:
+            fingerprint.update(hashlib.sha1(file.read()).digest())
+
+    # Add the other values.
+    for value in values:
+        fingerprint.update(repr(value).encode())
+
+    # Return a readable fingerprint.
+    return fingerprint.hexdigest()
+
+
+def staticSources():
+    """
+    Function to get all static files that would be collected.
+    """
+
+    # Ask every finder for its files, ignoring the same files as collectstatic
+    # does by default.
+    return [storage.path(path) for finder in get_finders()
+            for path, storage in finder.list(['CVS', '.*', '*~'])]
+
+
+def migrationSources():
+    """
+    Function to get all files that determine which migrations we need. Those
+    are the models and migrations of our own apps. The apps that we install
+    only change when the image is rebuilt, along with these files.
+    """
+
+    # Find all apps that are part of this project.
+    sources = []
+    for app in apps.get_app_configs():
+        if not app.path.startswith(str(settings.BASE_DIR)):
+            continue
+
+        # Add the models, and all migrations that were created so far.
+        models = os.path.join(app.path, 'models.py')
+        if os.path.isfile(models):
+            sources.append(models)
+        migrations = os.path.join(app.path, 'migrations')
+        if os.path.isdir(migrations):
+            sources += [os.path.join(migrations, name)
+                        for name in os.listdir(migrations)
+                        if name.endswith('.py')]
+
+    # Return all files.
+    return sources
+
+
+def commandSource(name):
+    """
+    Function to get the file of one of our management commands.
+    """
+
+    # All of our commands live in the forms app.
+    return os.path.join(settings.BASE_DIR, 'forms', 'management', 'commands',
+                        f"{name}.py")
+
+
+def indexSources():
+    """
+    Function to get all files that determine which indexes we need. Those are
+    the declarations of the indexes and of the queries that should use them,
+    the models that they are declared for, and the command that checks them.
+    """
+
+    # Combine the declarations with everything that determines the models.
+    return [os.path.join(settings.BASE_DIR, 'forms', 'indexes.py'),
+            commandSource('ensure_indexes')] + migrationSources()
+
+
+def databaseIdentity():
+    """
+    Function to get the values that identify the database that we use, so
+    that steps that change the database run again for another database.
+    """
+
+    # The server and the name of the database tell them apart.
+    database = settings.DATABASES['default']
+    return (database['CLIENT'].get('host'), database['CLIENT'].get('port'),
+            database['NAME'])
+
+
+
+class Warmup:
+    """
+    Class to prepare a process to serve requests, so that the first requests
+    do not have to wait for connections to be set up and modules to be loaded.
+    Every process has to be warmed up by itself.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the warmup.
+        """
+
+        # We need a lock to make sure that we only warm up once.
+        self.lock = threading.Lock()
+
+        # Remember the process that was warmed up.
+        self.pid = None
+
+    def ready(self):
+        """
+        Method to check if this process has been warmed up.
+        """
+
+        # Processes that were forked after warming up still need to connect.
+        return self.pid == os.getpid()
+
+    def warm(self):
+        """
+        Method to warm up this process if it was not warmed up yet. Returns
+        whether the process is ready to serve requests.
+        """
+
+        with self.lock:
+
+            # There is nothing to do if this process is already warmed up.
+            if self.ready():
+                return True
+
+            # Load all views, and with them the mail template.
+            get_resolver().url_patterns
+
+            # Set up the connections to the database, both Django's and our
+            # own.
+            try:
+                database().command('ping')
+                sharedClient.database().command('ping')
+
+            # We're not ready yet if we cannot reach the database.
+            except Exception:
+                logger.exception("Could not connect to the database.")
+                return False
+
+            # Remember that this process is ready.
+            self.pid = os.getpid()
+            return True
+
+
+# Create a single warmup for this process.
+warmup = Warmup()
@@ -1,5 +1,73 @@
 # Import dependencies.
 import re
+from tools.Metrics import templateDuration
+from tools.Tracing import span
+
+
+class CompiledTemplate:
+    """
+    Class to render a template with placeholders in a single pass. The template
+    is parsed only once into a list of static segments with placeholder slots
+    in between, so that rendering is nothing more than a single join.
+    """
+
+    # All placeholders in a template will look like {{PLACEHOLDER}}.
+    pattern = re.compile(r'{{(\w+)}}')
+
+    def __init__(self, html):
+        """
+        Constructor for the template. Accepts the raw template.
+        """
+
+        # Split the template on its placeholders. This gives us a list where
+        # every odd item is the name of a placeholder, and every even item is
+        # the static content in between.
+        self.segments = self.pattern.split(html)
+
+        # Placeholders are case insensitive.
+        self.slots = [name.lower() for name in self.segments[1::2]]
+
+        # Remember which placeholders should be replaced.
+        self.placeholders = frozenset(self.slots)
+
+    def check(self, placeholders):
+        """
+        Method to make sure that the template has exactly the placeholders that
+        we expect. Raises a KeyError otherwise.
+        """
+
+        # Placeholders are case insensitive.
+        expected = {placeholder.lower() for placeholder in placeholders}
+
+        # Find placeholders that we would not replace and replacements that
+        # do not have a placeholder.
+        missing = self.placeholders - expected
+        unknown = expected - self.placeholders
+
+        # Let the caller know exactly what is wrong.
+        if missing or unknown:
+            raise KeyError(f"Missing replacements: {sorted(missing)}, "
+                           f"unknown placeholders: {sorted(unknown)}")
+
+    def render(self, replacements):
+        """
+        Method to render the template. This requires a dictionary that maps
+        every placeholder to its replacement.
+        """
+
+        # Placeholders are case insensitive.
+        values = {placeholder.lower(): replacement
+                  for placeholder, replacement in replacements.items()}
+
+        # Make sure that we replace every placeholder before we do any work.
+        self.check(values)
+
+        # Fill in the slots between the static segments.
+        parts = self.segments.copy()
+        parts[1::2] = [values[slot] for slot in self.slots]
+
+        # Construct the result in one go.
+        return ''.join(parts)
 
 
 class TransactionalTemplate:
@@ -7,6 +75,12 @@ class TransactionalTemplate:
     Class to configure a transactional HTML email template.
     """
 
+    # These are the placeholders that every transactional email fills in.
+    placeholders = [
+        'preheader', 'title_text', 'title_link', 'content', 'button_text',
+        'button_link', 'disable_link', 'home_link',
+    ]
+
     # Set the HTML property as an empty string by default.
     html = ''
 
@@ -14,25 +88,19 @@ class TransactionalTemplate:
     with open('templates/transactional.html', 'r') as file:
         html = file.read()
 
-    def replace(self, placeholder, replacement):
-        """
-        Method to replace a single placeholder inside the HTML template with
-        content.
-        """
-
-        # All placeholders in the email template will look like {{PLACEHOLDER}}
-        # and we can find and replace them using a regular expression.
-        self.html = re.sub(rf'{{{{{placeholder}}}}}', replacement, self.html,
-                           flags=re.IGNORECASE)
+    # Parse the template only once for all emails, and make sure right away
+    # that it has the placeholders that we expect.
+    compiled = CompiledTemplate(html)
+    compiled.check(placeholders)
 
     def replaceAll(self, replacemenents):
         """
-        Method to replace many placeholders inside the HTML template with
+        Method to replace all placeholders inside the HTML template with
         content. This requires a dictionary that maps placeholders to their
         replacements.
         """
 
-        # Simply call our replace method for each placeholder/replacement pair
-        # in the dictionary.
-        for placeholder, replacement in replacemenents.items():
-            self.replace(placeholder, replacement)
\ No newline at end of file
+        # Render the template in a single pass, and measure how long it takes.
+        with templateDuration.labels('transactional').time(), \
+                span('template.render', template='transactional'):
+            self.html = self.compiled.render(replacemenents)
@@ -0,0 +1,432 @@
+# Import dependencies.
+import asyncio
+import contextvars
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from pymongo import monitoring
+
+# The kinds of spans that we create, as OpenTelemetry numbers them.
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+# The status of a span that failed, as OpenTelemetry numbers it.
+ERROR = 2
+
+# The header that nginx uses to pass on the identifier of a request. Its
+# identifiers have the same shape as trace identifiers.
+HEADER = 'X-Request-ID'
+
+# The shape of a valid trace identifier.
+TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# The span that is currently active. This follows the request from thread to
+# thread and into async code.
+active = contextvars.ContextVar('span', default=None)
+
+
+def value(value):
+    """
+    Function to convert an attribute's value to the shape that OTLP uses.
+    """
+
+    # Booleans are integers too, so we have to check them first.
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+
+    # Everything else is stored as text.
+    return {'stringValue': str(value)}
+
+
+class Span:
+    """
+    Class that represents a single operation in a trace, like handling a
+    request, sending a database command or sending an email.
+    """
+
+    def __init__(self, name, parent=None, kind=INTERNAL, links=(),
+                 attributes=None):
+        """
+        Constructor for the span. Accepts its name, the context of its parent
+        span, its kind, the contexts of spans that it is linked to, and its
+        attributes. Starts a new trace when it has no parent.
+        """
+
+        # Remember what the span is about.
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.links = [link for link in links if link]
+
+        # Join the trace of the parent, or start a new one.
+        self.traceId = parent['traceId'] if parent else secrets.token_hex(16)
+        self.parentId = parent.get('spanId') if parent else None
+        self.spanId = secrets.token_hex(8)
+
+        # Start the clock.
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+    def context(self):
+        """
+        Method to get what another span needs to know to join this trace,
+        even in another process.
+        """
+
+        # The identifiers are enough.
+        return {'traceId': self.traceId, 'spanId': self.spanId}
+
+    def set(self, key, value):
+        """
+        Method to add an attribute to the span.
+        """
+
+        # Overwrite any earlier value.
+        self.attributes[key] = value
+
+    def finish(self, error=None):
+        """
+        Method to end the span and export it.
+        """
+
+        # Stop the clock, and remember what went wrong if anything did.
+        self.end = time.time_ns()
+        self.error = error
+
+        # Hand the span to the exporter.
+        spanExporter().export(self)
+
+    def otlp(self):
+        """
+        Method to get the span in the JSON shape that OTLP uses.
+        """
+
+        # Describe the span.
+        span = {
+            'traceId': self.traceId,
+            'spanId': self.spanId,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': [{'key': key, 'value': value(attribute)}
+                           for key, attribute in self.attributes.items()
+                           if attribute is not None],
+        }
+
+        # Only add what the span has.
+        if self.parentId:
+            span['parentSpanId'] = self.parentId
+        if self.links:
+            span['links'] = [{'traceId': link['traceId'],
+                              'spanId': link['spanId']}
+                             for link in self.links]
+        if self.error is not None:
+            span['status'] = {'code': ERROR, 'message': repr(self.error)}
+
+        # Return the described span.
+        return span
+
+
+class FileExporter:
+    """
+    Class that writes finished spans to a file, in the JSON format that the
+    OpenTelemetry collector reads with its OTLP JSON file receiver. Every
+    process writes to its own file, with a single request per line.
+    """
+
+    def __init__(self, directory, service='reachable-api'):
+        """
+        Constructor for the exporter. Accepts the directory to write to, and
+        the name of the service that the spans belong to.
+        """
+
+        # Remember where to write spans, and on behalf of whom.
+        self.directory = directory
+        self.service = service
+
+        # We need a lock as spans are finished from many threads.
+        self.lock = threading.Lock()
+
+        # Every process opens its own file the first time it needs one.
+        self.file = None
+        self.pid = None
+
+    def export(self, span):
+        """
+        Method to write a single finished span.
+        """
+
+        # Wrap the span the way the OTLP export request does.
+        line = json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [{
+                'key': 'service.name', 'value': value(self.service),
+            }]},
+            'scopeSpans': [{
+                'scope': {'name': 'tools.Tracing'},
+                'spans': [span.otlp()],
+            }],
+        }]}, separators=(',', ':'))
+
+        with self.lock:
+
+            # Open a file for this process if we have not done so yet.
+            if self.pid != os.getpid():
+                os.makedirs(self.directory, exist_ok=True)
+                self.file = open(os.path.join(
+                    self.directory, f"traces-{os.getpid()}.jsonl"), 'a',
+                    buffering=1)
+                self.pid = os.getpid()
+
+            # Write the span on a line of its own.
+            self.file.write(line + '\n')
+
+
+class NullExporter:
+    """
+    Class that drops every span. This is used when tracing is turned off.
+    """
+
+    def export(self, span):
+        """
+        Method that drops a single finished span.
+        """
+
+
+# The single exporter that is shared by all spans in this process. It is only
+# created once it is needed, so that this module can be imported before
+# Django's settings are configured.
+exporter = None
+
+# We need a lock to make sure that we only create one exporter.
+lock = threading.Lock()
+
+
+def spanExporter():
+    """
+    Function to get the exporter that is shared by all spans in this process.
+    """
+
+    # Create the exporter the first time that we need it. We only trace when
+    # we know where to write the spans.
+    global exporter
+    if exporter is None:
+        with lock:
+            if exporter is None:
+                exporter = FileExporter(settings.TRACE_DIRECTORY,
+                                        settings.TRACE_SERVICE) \
+                    if settings.TRACE_DIRECTORY else NullExporter()
+
+    # Return the exporter.
+    return exporter
+
+
+def enabled():
+    """
+    Function to check if spans are recorded at all.
+    """
+
+    # Only when there is somewhere to write them.
+    return not isinstance(spanExporter(), NullExporter)
+
+
+def current():
+    """
+    Function to get the context of the active span, so that work that
+    happens later, or elsewhere, can join its trace. Returns None if there is
+    no active span.
+    """
+
+    # Get the context of the active span if there is one.
+    span = active.get()
+    return span.context() if span is not None else None
+
+
+@contextmanager
+def span(name, parent=None, kind=INTERNAL, links=(), **attributes):
+    """
+    Function to record a span while the context is open. The span is a child
+    of the given parent, or of the active span. Provides the span, or None
+    when tracing is turned off.
+    """
+
+    # Do as little as possible when we don't trace.
+    if not enabled():
+        yield None
+        return
+
+    # Start the span, and make it the active span.
+    recorded = Span(name, parent or current(), kind, links, attributes)
+    token = active.set(recorded)
+
+    # End the span once the context is closed, and remember if it failed.
+    try:
+        yield recorded
+    except BaseException as error:
+        recorded.finish(error)
+        raise
+    else:
+        recorded.finish()
+    finally:
+        active.reset(token)
+
+
+class SpanListener(monitoring.CommandListener):
+    """
+    Listener that records a span for every command that is sent to the
+    database on behalf of a span.
+    """
+
+    def __init__(self):
+        """
+        Constructor for the listener.
+        """
+
+        # Remember the span of every command until it has finished.
+        self.spans = {}
+
+    def started(self, event):
+        """
+        Method that is called whenever a command is sent to the database.
+        """
+
+        # Only record commands that are part of a trace.
+        parent = current() if enabled() else None
+        if parent is None:
+            return
+
+        # Start a span for the command.
+        collection = event.command.get(event.command_name)
+        self.spans[event.connection_id, event.request_id] = Span(
+            f"mongo {event.command_name}", parent, CLIENT, attributes={
+                'db.system': 'mongodb',
+                'db.operation': event.command_name,
+                'db.mongodb.collection': collection
+                if isinstance(collection, str) else None,
+            })
+
+    def succeeded(self, event):
+        """
+        Method that is called whenever a command succeeds.
+        """
+
+        # End the span of the command, if it has one.
+        span = self.spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.finish()
+
+    def failed(self, event):
+        """
+        Method that is called whenever a command fails.
+        """
+
+        # End the span of the command, if it has one, and mark it as failed.
+        span = self.spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.finish(event.failure)
+
+
+# Trace every database client that is created from now on.
+monitoring.register(SpanListener())
+
+
+class TracingMiddleware:
+    """
+    Middleware that records a span for every request. The request joins the
+    trace that nginx started for it, so that its logs and spans can be found
+    together. It works in both sync and async chains, and is left out
+    entirely when tracing is turned off.
+    """
+
+    # We can handle requests both synchronously and asynchronously.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """
+        Constructor for the middleware.
+        """
+
+        # Only trace when we know where to write the spans.
+        if not enabled():
+            raise MiddlewareNotUsed
+
+        # Remember how to handle the request.
+        self.get_response = get_response
+
+        # Let Django know that we're async when the rest of the chain is, the
+        # same way that Django's own middleware does.
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        """
+        Method to handle a single request within a span.
+        """
+
+        # Handle the request asynchronously if the rest of the chain does.
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        # Handle the request within its span.
+        with self.start(request) as recorded:
+            response = self.get_response(request)
+            self.describe(recorded, request, response)
+
+        # Let the client know which trace to look for.
+        response[HEADER] = recorded.traceId
+        return response
+
+    async def __acall__(self, request):
+        """
+        Method to handle a single request asynchronously within a span.
+        """
+
+        # Handle the request within its span.
+        with self.start(request) as recorded:
+            response = await self.get_response(request)
+            self.describe(recorded, request, response)
+
+        # Let the client know which trace to look for.
+        response[HEADER] = recorded.traceId
+        return response
+
+    def start(self, request):
+        """
+        Method to start the span of a request.
+        """
+
+        # Use the identifier that nginx gave the request as the trace
+        # identifier, if it has the right shape.
+        identifier = request.headers.get(HEADER, '').lower()
+        parent = {'traceId': identifier} if TRACE_ID.match(identifier) \
+            else None
+
+        # Record the span while the request is handled.
+        return span(request.method, parent, SERVER, **{
+            'http.method': request.method,
+            'http.target': request.path,
+        })
+
+    def describe(self, recorded, request, response):
+        """
+        Method to describe the span of a request once it has been handled.
+        """
+
+        # Name the span after the endpoint's route rather than its full path,
+        # so that the spans of an endpoint are easy to find together.
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        recorded.name = f"{request.method} {route}"
+        recorded.set('http.route', route)
+        recorded.set('http.status_code', response.status_code)